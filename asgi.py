@@ -7,10 +7,12 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
 django.setup()
 
 import chat.routing   # noqa: E402
+from chat.lifespan import lifespan_app   # noqa: E402
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
         URLRouter(chat.routing.websocket_urlpatterns)
     ),
+    "lifespan": lifespan_app,
 }) 
\ No newline at end of file
@@ -1,11 +1,17 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 import logging
+import time
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from .models import Room, Message
+from .history import InvalidCursor, fetch_history, serialize_row
+from .flowcontrol import InboundLimiter, OutboundBuffer, get_flow_config, get_user_buckets
+from .persistence import get_persister
+from .presence import get_presence, get_presence_config
+from .rooms import room_cache
+from .wslog import get_ws_logger
+from . import encoding
 
 logger = logging.getLogger(__name__)
+ws_log = get_ws_logger()
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -15,44 +21,95 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.group_name = f"chat_{self.room_name}"
             self.user = self.scope["user"]
             
-            # 打印调试信息
-            print(f"WebSocket连接: 用户尝试连接到房间 {self.room_name}")
-            logger.info(f"连接参数: url_route={self.scope.get('url_route')}, path={self.scope.get('path')}")
+            # 房间在连接生命周期内不变，只解析一次；不存在的房间直接拒绝连接
+            self.room = await self.get_room()
+            if self.room is None:
+                ws_log.event("reject", logging.WARNING, room=self.room_name, reason="unknown_room")
+                await self.close()
+                return
+            
+            # 入站限流与出站背压
+            config = get_flow_config()
+            user_key = self.user.pk if self.user.is_authenticated else None
+            self.limiter = InboundLimiter(user_key, config, get_user_buckets())
+            # 所有出站帧都经过出站队列；发送任务异常退出时关闭连接
+            self.outbox = OutboundBuffer(self.send, config, on_error=self.close)
+            # 心跳至少间隔半个心跳周期才续期，更频繁的心跳直接忽略
+            self.heartbeat_interval = get_presence_config()["HEARTBEAT_INTERVAL"] / 2
             
             # 添加到组
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
             
-            print(f"用户已连接到房间: {self.room_name}")
+            ws_log.event("connect", room=self.room_name, user=self.user, path=self.scope.get("path"))
             
             # 发送欢迎消息
-            await self.send(text_data=json.dumps({
+            self.outbox.push(encoding.dumps({
                 "message": f"欢迎来到聊天室 #{self.room_name}!",
                 "username": "系统",
             }))
+            
+            # 登记在线状态：登录用户按用户计数，匿名连接各自计数
+            self.presence_member = str(self.user.pk) if self.user.is_authenticated else self.channel_name
+            count, first = await get_presence().join(self.room_name, self.presence_member, self.channel_name)
+            self.presence_joined = True
+            self.next_heartbeat = time.monotonic() + self.heartbeat_interval
+            if first:
+                # 用户的第一个连接才向房间推送增量
+                await self.broadcast_presence("join", count)
+            else:
+                # 同一用户的其他连接已在房间中，人数不变，只告知本连接
+                self.outbox.push(self.presence_frame("sync", count))
         except Exception as e:
-            logger.error(f"连接时出错: {e}")
-            print(f"连接错误: {e}")
+            logger.error("连接时出错: %s", e)
 
     async def disconnect(self, code):
         """处理WebSocket断开连接"""
-        print(f"WebSocket断开: code={code}")
+        ws_log.event("disconnect", room=getattr(self, "room_name", None), code=code)
         try:
+            if hasattr(self, "outbox"):
+                self.outbox.close()
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            if getattr(self, "presence_joined", False):
+                count, last = await get_presence().leave(self.room_name, self.presence_member, self.channel_name)
+                if last:
+                    await self.broadcast_presence("leave", count)
         except Exception as e:
-            logger.error(f"断开连接时出错: {e}")
+            logger.error("断开连接时出错: %s", e)
 
     async def receive(self, text_data):
         """接收WebSocket消息"""
-        print(f"收到消息: {text_data}")
+        ws_log.sampled("receive", room=self.room_name, size=len(text_data))
         try:
-            data = json.loads(text_data)
+            if self.limiter.oversized(text_data):
+                await self.reject_inbound("oversized", "消息过长")
+                return
+            
+            data = encoding.loads(text_data)
+            
+            # 心跳：续期在线状态（不计入限流，但过于频繁的心跳不访问在线状态存储）
+            if 'heartbeat' in data:
+                now = time.monotonic()
+                if getattr(self, "presence_joined", False) and now >= self.next_heartbeat:
+                    self.next_heartbeat = now + self.heartbeat_interval
+                    count, expired = await get_presence().heartbeat(
+                        self.room_name, self.presence_member, self.channel_name,
+                    )
+                    if expired:
+                        # 过期的用户不会断开，由续期的连接推送新人数
+                        await self.broadcast_presence("expire", count)
+                return
+            
+            if not self.limiter.allow():
+                await self.reject_inbound("rate_limited", "发送过于频繁，请稍后再试")
+                return
             
             # 检查是否是加载历史记录的请求
             if 'load_history' in data:
-                # 加载并发送历史消息
+                # 加载并发送历史消息，优先使用游标分页
                 page = data.get('page', 1)
-                await self.send_message_history(page)
+                before = data.get('before')
+                await self.send_message_history(page, before)
                 return
                 
             # 正常的消息处理
@@ -63,89 +120,114 @@ class ChatConsumer(AsyncWebsocketConsumer):
             if self.user.is_authenticated:
                 await self.save_message(message)
             
-            print(f"将消息广播到群组 {self.group_name}: {message}")
-            
-            # 发送消息到组
+            # 发送消息到组：帧只在发送方编码一次，接收方直接转发
             await self.channel_layer.group_send(
                 self.group_name,
                 {
                     "type": "chat_message",
-                    "message": message,
-                    "username": username,
+                    "frame": encoding.dumps({
+                        "message": message,
+                        "username": username,
+                    }),
                 },
             )
         except Exception as e:
-            logger.error(f"处理消息时出错: {e}")
-            print(f"处理消息出错: {e}")
-            await self.send(text_data=json.dumps({
+            logger.error("处理消息时出错: %s", e)
+            self.outbox.push(encoding.dumps({
                 "error": f"处理消息失败: {str(e)}",
                 "username": "系统",
             }))
 
     async def chat_message(self, event):
         """将消息发送到WebSocket"""
-        print(f"发送消息到客户端: {event}")
+        ws_log.sampled("deliver", room=self.room_name, channel=self.channel_name)
         try:
-            await self.send(text_data=json.dumps({
-                "message": event["message"],
-                "username": event["username"],
-            }))
+            frame = event.get("frame")
+            if frame is None:
+                # 兼容未预编码的事件
+                frame = encoding.dumps({
+                    "message": event["message"],
+                    "username": event["username"],
+                })
+            self.outbox.push(frame)
         except Exception as e:
-            logger.error(f"发送消息到客户端时出错: {e}")
-            print(f"发送消息出错: {e}")
+            logger.error("发送消息到客户端时出错: %s", e)
     
-    @database_sync_to_async
-    def save_message(self, content):
-        """将消息保存到数据库"""
+    async def presence_event(self, event):
+        """将在线状态增量转发到WebSocket"""
         try:
-            # 获取或创建房间
-            room, _ = Room.objects.get_or_create(name=self.room_name, defaults={'owner': self.user})
-            
-            # 创建消息
-            Message.objects.create(
-                room=room,
-                user=self.user,
-                content=content
-            )
+            self.outbox.push(event["frame"])
         except Exception as e:
-            logger.error(f"保存消息时出错: {e}")
+            logger.error("发送在线状态到客户端时出错: %s", e)
+    
+    def presence_frame(self, action, count):
+        """编码在线状态帧（只包含变化的成员和最新人数，过期清理不带成员）"""
+        if action == "expire":
+            return encoding.dumps({"presence": action, "count": count})
+        username = self.user.username if self.user.is_authenticated else "匿名用户"
+        return encoding.dumps({
+            "presence": action,
+            "username": username,
+            "count": count,
+        })
+    
+    async def broadcast_presence(self, action, count):
+        """向房间推送加入/离开/过期增量"""
+        await self.channel_layer.group_send(
+            self.group_name,
+            {
+                "type": "presence_event",
+                "frame": self.presence_frame(action, count),
+            },
+        )
+    
+    async def reject_inbound(self, reason, error):
+        """通知客户端消息被限流或超长"""
+        ws_log.sampled("limited", logging.INFO, room=self.room_name, user=self.user, reason=reason)
+        self.outbox.push(encoding.dumps({
+            "error": error,
+            "username": "系统",
+        }))
+    
+    async def save_message(self, content):
+        """将消息保存到数据库（按配置同步写入或批量延迟写入）"""
+        await get_persister().save(self.room, self.user, content)
+    
+    @database_sync_to_async
+    def get_room(self):
+        """通过进程内缓存解析当前房间"""
+        return room_cache.get(self.room_name)
     
     @database_sync_to_async
-    def get_message_history(self, page=1, per_page=20):
+    def get_message_history(self, page=1, before=None):
         """获取消息历史记录"""
         try:
-            # 获取房间
-            room = Room.objects.get(name=self.room_name)
-            
-            # 计算分页
-            start = (page - 1) * per_page
-            end = page * per_page
-            
-            # 获取消息记录
-            messages = Message.objects.filter(room=room).order_by('-timestamp')[start:end]
+            # 获取消息记录（从新到旧），整页只有一条查询
+            rows, is_end, next_cursor = fetch_history(self.room, before=before, page=page)
             
             # 返回按时间正序排列的消息（从旧到新）
-            return [msg.to_json() for msg in reversed(messages)], messages.count() < per_page
-        except Room.DoesNotExist:
-            return [], True
+            return [serialize_row(row) for row in reversed(rows)], is_end, next_cursor
+        except InvalidCursor:
+            raise
         except Exception as e:
-            logger.error(f"获取消息历史记录时出错: {e}")
-            return [], True
+            logger.error("获取消息历史记录时出错: %s", e)
+            return [], True, None
     
-    async def send_message_history(self, page=1):
+    async def send_message_history(self, page=1, before=None):
         """发送消息历史记录到客户端"""
         try:
-            messages, is_end = await self.get_message_history(page)
+            messages, is_end, next_cursor = await self.get_message_history(page, before)
             
-            await self.send(text_data=json.dumps({
+            self.outbox.push(encoding.dumps({
                 "history": True,
                 "messages": messages,
                 "page": page,
-                "is_end": is_end
+                "is_end": is_end,
+                "next_cursor": next_cursor,
             }))
         except Exception as e:
-            logger.error(f"发送历史记录时出错: {e}")
-            await self.send(text_data=json.dumps({
+            logger.error("发送历史记录时出错: %s", e)
+            self.outbox.push(encoding.dumps({
                 "error": f"获取历史记录失败: {str(e)}",
                 "username": "系统",
             })) 
\ No newline at end of file
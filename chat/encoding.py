@@ -0,0 +1,31 @@
+"""WebSocket 帧的 JSON 编解码，启动时选择后端。"""
+import json
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+
+def _json_dumps(obj):
+    return json.dumps(obj)
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj).decode("utf-8")
+
+
+def _select_backend(name):
+    """根据 ``settings.CHAT_JSON_BACKEND``（auto/json/orjson）选择编解码函数"""
+    if name == "orjson" and orjson is None:
+        raise ImportError("CHAT_JSON_BACKEND 为 orjson，但未安装 orjson")
+    if name in ("auto", "orjson") and orjson is not None:
+        return "orjson", _orjson_dumps, orjson.loads
+    if name not in ("auto", "json"):
+        raise ValueError(f"未知的 JSON 后端: {name}")
+    return "json", _json_dumps, json.loads
+
+
+BACKEND, dumps, loads = _select_backend(getattr(settings, "CHAT_JSON_BACKEND", "auto"))
@@ -0,0 +1,268 @@
+"""WebSocket 入站限流与出站背压。"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    # 单条入站消息的最大字节数
+    "MAX_MESSAGE_BYTES": 4096,
+    # 每个连接的令牌桶：每秒补充的令牌数与桶容量（突发上限）
+    "CONNECTION_RATE": 5,
+    "CONNECTION_BURST": 10,
+    # 每个用户（跨连接、同一进程内）的令牌桶
+    "USER_RATE": 10,
+    "USER_BURST": 20,
+    # 每个连接待发送帧的上限，超过后按策略处理
+    "OUTBOUND_QUEUE_LIMIT": 100,
+    # 每个连接待发送数据的字节上限（按字符计），超过后丢弃最旧的帧
+    "OUTBOUND_MAX_BYTES": 1024 * 1024,
+    # 每个连接的发送速率（每秒字节数）与突发上限，0 表示不限速
+    "OUTBOUND_RATE": 256 * 1024,
+    "OUTBOUND_BURST": 512 * 1024,
+    # drop: 丢弃最旧的帧；coalesce: 将待发送帧合并为一个 batch 帧
+    "OUTBOUND_POLICY": "drop",
+}
+
+# 进程内计数器
+counters = {
+    "rate_limited": 0,   # 因令牌不足被拒绝的入站消息
+    "oversized": 0,      # 超过大小上限被拒绝的入站消息
+    "dropped": 0,        # 因出站积压被丢弃的帧
+    "coalesced": 0,      # 被合并进 batch 帧的帧
+    "send_failed": 0,    # 发送任务异常退出的连接
+}
+
+
+def get_flow_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, "CHAT_RATE_LIMIT", {})}
+
+
+class TokenBucket:
+    """令牌桶，``rate`` 为每秒补充的令牌数，``capacity`` 为突发上限"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount=1):
+        self._refill(time.monotonic())
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def reserve(self, amount):
+        """消耗令牌，返回需要等待的秒数（0 表示已消耗）；超过容量的请求按容量计"""
+        self._refill(time.monotonic())
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0
+        return (amount - self.tokens) / self.rate
+
+    def refund(self, amount=1):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def idle(self, now):
+        """桶已回满，与新建的桶等价，可以回收"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class UserBuckets:
+    """按用户划分的令牌桶，数量超过阈值时回收已回满的桶"""
+
+    def __init__(self, rate, capacity, prune_threshold=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.prune_threshold = prune_threshold
+        self._buckets = {}
+
+    def consume(self, key, amount=1):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.prune_threshold:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+        return bucket.consume(amount)
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [k for k, b in self._buckets.items() if b.idle(now)]:
+            del self._buckets[key]
+
+
+class InboundLimiter:
+    """单个连接的入站检查：大小上限、连接令牌桶、用户令牌桶"""
+
+    def __init__(self, user_key, config, user_buckets):
+        self.max_bytes = config["MAX_MESSAGE_BYTES"]
+        self.bucket = TokenBucket(config["CONNECTION_RATE"], config["CONNECTION_BURST"])
+        self.user_key = user_key
+        self.user_buckets = user_buckets
+
+    def oversized(self, text_data):
+        """消息是否超过大小上限（在解析 JSON 之前调用）"""
+        length = len(text_data)
+        # UTF-8 每个字符最多 4 字节，只有可能超限时才真正编码
+        if length > self.max_bytes or (
+            length * 4 > self.max_bytes and len(text_data.encode("utf-8")) > self.max_bytes
+        ):
+            counters["oversized"] += 1
+            return True
+        return False
+
+    def allow(self):
+        """依次消耗连接和用户的令牌，任一不足则拒绝"""
+        if not self.bucket.consume():
+            counters["rate_limited"] += 1
+            return False
+        if self.user_key is not None and not self.user_buckets.consume(self.user_key):
+            self.bucket.refund()
+            counters["rate_limited"] += 1
+            return False
+        return True
+
+
+def _frame_size(item):
+    if isinstance(item, list):
+        return sum(len(frame) for frame in item)
+    return len(item)
+
+
+class OutboundBuffer:
+    """连接的出站帧队列，连接的所有出站帧都经过这里。
+
+    帧先入队再由后台任务发送，消费者的事件处理不会因为某个慢客户端阻塞在
+    ``send`` 上，从而持续从 Channel Layer 取走消息。Daphne 等服务器的
+    ``send`` 不施加背压，写缓冲会在服务器内无限增长，因此发送按
+    ``OUTBOUND_RATE`` 限速，积压留在本队列中，按帧数和字节数计量：
+    帧数超过 ``OUTBOUND_QUEUE_LIMIT`` 时按策略丢弃最旧的帧或合并为一个
+    ``{"batch": [...]}`` 帧；字节数超过 ``OUTBOUND_MAX_BYTES`` 时丢弃最旧的帧。
+    发送任务异常退出时记录错误并调用 ``on_error``（通常是关闭连接）。
+    """
+
+    def __init__(self, send, config, on_error=None):
+        policy = config["OUTBOUND_POLICY"]
+        if policy not in ("drop", "coalesce"):
+            raise ValueError(f"未知的出站背压策略: {policy}")
+        self._send = send
+        self._on_error = on_error
+        self.limit = config["OUTBOUND_QUEUE_LIMIT"]
+        self.max_bytes = config["OUTBOUND_MAX_BYTES"]
+        self.policy = policy
+        rate = config["OUTBOUND_RATE"]
+        self._pace = TokenBucket(rate, config["OUTBOUND_BURST"]) if rate else None
+        # 元素为已编码的帧，或待合并为 batch 帧的帧列表
+        self._frames = deque()
+        self.pending_bytes = 0
+        self.failed = False
+        # 连接断开后不再接受新帧，避免为已关闭的连接重新启动发送任务
+        self._closed = False
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def push(self, frame):
+        if self._closed or self.failed:
+            return
+        if len(self._frames) >= self.limit:
+            if self.policy == "coalesce":
+                merged = []
+                for item in self._frames:
+                    merged.extend(item if isinstance(item, list) else [item])
+                counters["coalesced"] += len(merged)
+                self._frames.clear()
+                self._frames.append(merged)
+            else:
+                self._drop_oldest()
+        last = self._frames[-1] if self._frames else None
+        if isinstance(last, list):
+            # 合并帧同样受上限约束，超出时丢弃其中最旧的帧
+            if len(last) >= self.limit:
+                self._drop_oldest()
+            last.append(frame)
+        else:
+            self._frames.append(frame)
+        self.pending_bytes += len(frame)
+        # 字节数超限时丢弃最旧的帧，但总保留刚入队的帧
+        while self.pending_bytes > self.max_bytes and self.pending_bytes > len(frame):
+            self._drop_oldest()
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _drop_oldest(self):
+        head = self._frames[0]
+        if isinstance(head, list):
+            frame = head.pop(0)
+            if not head:
+                self._frames.popleft()
+        else:
+            frame = self._frames.popleft()
+        self.pending_bytes -= len(frame)
+        counters["dropped"] += 1
+
+    async def _run(self):
+        try:
+            await self._drain()
+        except Exception as e:
+            counters["send_failed"] += 1
+            logger.error("出站发送任务异常退出，关闭连接: %s", e)
+            self.failed = True
+            self._frames.clear()
+            self.pending_bytes = 0
+            if self._on_error is not None:
+                try:
+                    await self._on_error()
+                except Exception as close_error:
+                    logger.debug("关闭连接失败: %s", close_error)
+
+    async def _drain(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._frames:
+                item = self._frames[0]
+                size = _frame_size(item)
+                if self._pace is not None:
+                    delay = self._pace.reserve(size)
+                    if delay:
+                        # 等待期间新帧继续入队，由上限和策略约束积压
+                        await asyncio.sleep(delay)
+                        continue
+                self._frames.popleft()
+                self.pending_bytes -= size
+                if isinstance(item, list):
+                    item = '{"batch":[' + ",".join(item) + "]}"
+                await self._send(text_data=item)
+
+    def close(self):
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._frames.clear()
+        self.pending_bytes = 0
+
+
+_user_buckets = None
+
+
+def get_user_buckets():
+    global _user_buckets
+    if _user_buckets is None:
+        config = get_flow_config()
+        _user_buckets = UserBuckets(config["USER_RATE"], config["USER_BURST"])
+    return _user_buckets
@@ -0,0 +1,81 @@
+"""聊天历史记录的游标（keyset）分页工具。"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+from .models import Message
+
+# 每页历史消息数量
+HISTORY_PAGE_SIZE = 20
+
+
+class InvalidCursor(ValueError):
+    """客户端提交的游标无法解析。"""
+
+
+def encode_cursor(timestamp, message_id):
+    """将 (timestamp, id) 编码为对客户端不透明的游标字符串"""
+    raw = f"{timestamp.isoformat()}|{message_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (timestamp, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        timestamp, _, message_id = raw.rpartition("|")
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (AttributeError, TypeError, ValueError, binascii.Error) as e:
+        raise InvalidCursor(f"无效的历史记录游标: {cursor!r}") from e
+
+
+# 历史记录只需要这几列，避免逐行加载 User 对象
+HISTORY_FIELDS = ('id', 'user__username', 'content', 'timestamp')
+
+
+def serialize_row(row):
+    """将 ``values()`` 行转换为与 ``Message.to_json`` 相同的结构"""
+    return {
+        'id': row['id'],
+        'username': row['user__username'],
+        'message': row['content'],
+        'timestamp': row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def fetch_history(room, before=None, page=1, per_page=HISTORY_PAGE_SIZE):
+    """获取一页历史消息。
+
+    提供 ``before`` 游标时按 ``(timestamp, id)`` 做 keyset 分页，翻到多深的
+    历史代价都与第一页相同；仅为兼容旧客户端，在没有游标且 ``page > 1`` 时
+    才退回 OFFSET 分页。
+
+    整页只执行一条 SQL：通过 JOIN 取用户名，并多取一行来判断是否已到末尾，
+    不再额外执行 ``count()``。``room`` 可以是 ``Room`` 实例或其主键。
+
+    返回 ``(rows, is_end, next_cursor)``，``rows`` 为按时间倒序（从新到旧）的
+    ``values()`` 字典。
+    """
+    queryset = (
+        Message.objects.filter(room=room)
+        .order_by('-timestamp', '-id')
+        .values(*HISTORY_FIELDS)
+    )
+
+    if before:
+        timestamp, message_id = decode_cursor(before)
+        queryset = queryset.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id)
+        )
+        start = 0
+    else:
+        start = (max(int(page), 1) - 1) * per_page
+    rows = list(queryset[start:start + per_page + 1])
+
+    is_end = len(rows) <= per_page
+    rows = rows[:per_page]
+    next_cursor = None if is_end else encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+    return rows, is_end, next_cursor
@@ -0,0 +1,23 @@
+"""ASGI lifespan 处理：服务关闭前写完延迟写入的聊天消息。
+
+Daphne 不发送 lifespan 事件，此时由 ``persistence`` 注册的 atexit 钩子兜底。
+"""
+import logging
+
+from .persistence import shutdown_persister
+
+logger = logging.getLogger(__name__)
+
+
+async def lifespan_app(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            try:
+                await shutdown_persister()
+            except Exception as e:
+                logger.error("关闭消息写入器时出错: %s", e)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,244 @@
+"""聊天 WebSocket 路径的压测/基准命令。
+
+在独立的测试数据库中创建 N 个房间 × M 个客户端，通过 Channels 的
+``WebsocketCommunicator`` 直接驱动 ``ChatConsumer``，统计吞吐、扇出延迟、
+每条消息的数据库查询数和每个连接的内存占用，并以 JSON 输出结果，
+便于在不同版本间对比回归。
+
+示例::
+
+    python manage.py bench_chat --rooms 5 --clients 20 --messages 5 --output bench.json
+"""
+import asyncio
+import json
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+
+import channels
+import django
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from chat import encoding
+from chat.models import Room
+from chat.persistence import get_persister
+from chat.rooms import room_cache
+from chat.routing import websocket_urlpatterns
+
+
+class QueryCounter:
+    """统计所有数据库连接（包括 sync_to_async 线程中的连接）执行的查询数"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, conn):
+        if self not in conn.execute_wrappers:
+            conn.execute_wrappers.append(self)
+
+    def on_connection_created(self, sender, connection, **kwargs):
+        self.install(connection)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = "对聊天 WebSocket 路径进行基准测试，并以 JSON 输出结果"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=5, help="房间数量")
+        parser.add_argument("--clients", type=int, default=20, help="每个房间的客户端数量")
+        parser.add_argument("--messages", type=int, default=5, help="每个客户端发送的消息数量")
+        parser.add_argument("--timeout", type=float, default=30.0, help="等待消息送达的超时时间（秒）")
+        parser.add_argument(
+            "--layer",
+            choices=["memory", "default"],
+            default="memory",
+            help="memory: 使用大容量 InMemoryChannelLayer；default: 使用 settings 中配置的 Channel Layer（例如本地 Redis）",
+        )
+        parser.add_argument("--output", help="结果 JSON 文件路径，默认输出到标准输出")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        # 压测客户端按设计会突发发送，放开入站限流以免限流器影响测量
+        overrides = {
+            "CHAT_RATE_LIMIT": {
+                **getattr(settings, "CHAT_RATE_LIMIT", {}),
+                "CONNECTION_RATE": 1e9, "CONNECTION_BURST": 1e9,
+                "USER_RATE": 1e9, "USER_BURST": 1e9,
+            },
+        }
+        if options["layer"] == "memory":
+            overrides["CHANNEL_LAYERS"] = {
+                "default": {
+                    "BACKEND": "channels.layers.InMemoryChannelLayer",
+                    "CONFIG": {"capacity": 100_000},
+                }
+            }
+        try:
+            with override_settings(**overrides):
+                result = self.run_benchmark(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=False)
+
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+            self.stdout.write(f"结果已写入 {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def run_benchmark(self, options):
+        rooms, users = self.create_fixtures(options["rooms"], options["clients"])
+        room_cache.clear()
+
+        counter = QueryCounter()
+        for conn in connections.all():
+            counter.install(conn)
+        connection_created.connect(counter.on_connection_created)
+        try:
+            metrics = asyncio.run(self.drive(rooms, users, counter, options))
+        finally:
+            connection_created.disconnect(counter.on_connection_created)
+
+        return {
+            "config": {
+                "rooms": options["rooms"],
+                "clients_per_room": options["clients"],
+                "messages_per_client": options["messages"],
+                "layer": options["layer"],
+                "json_backend": encoding.BACKEND,
+                "persistence_mode": get_persister().mode,
+            },
+            "environment": {
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "django": django.get_version(),
+                "channels": channels.__version__,
+                "database": connection.vendor,
+            },
+            "results": metrics,
+        }
+
+    def create_fixtures(self, room_count, clients_per_room):
+        users = User.objects.bulk_create(
+            User(username=f"bench_user_{i}") for i in range(room_count * clients_per_room)
+        )
+        owner = users[0]
+        rooms = Room.objects.bulk_create(
+            Room(name=f"bench_room_{i}", owner=owner) for i in range(room_count)
+        )
+        # 按房间分组用户
+        grouped = [
+            users[i * clients_per_room:(i + 1) * clients_per_room] for i in range(room_count)
+        ]
+        return rooms, grouped
+
+    async def drive(self, rooms, users, counter, options):
+        application = URLRouter(websocket_urlpatterns)
+        messages_per_client = options["messages"]
+        clients_per_room = options["clients"]
+
+        # 1. 建立连接，并测量每个连接的内存占用
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        clients = []
+        for room, room_users in zip(rooms, users):
+            for user in room_users:
+                communicator = WebsocketCommunicator(application, f"/ws/chat/{room.name}/")
+                communicator.scope["user"] = user
+                connected, _ = await communicator.connect()
+                if not connected:
+                    raise RuntimeError(f"无法连接到房间 {room.name}")
+                await communicator.receive_from()  # 欢迎消息
+                clients.append(communicator)
+        memory_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        # 2. 并发发送消息，接收方记录扇出延迟
+        expected_per_client = clients_per_room * messages_per_client
+        latencies = []
+        delivered = 0
+        deadline = time.perf_counter() + options["timeout"]
+
+        async def receiver(communicator):
+            nonlocal delivered
+            received = 0
+            while received < expected_per_client:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                try:
+                    frame = await communicator.receive_from(timeout=remaining)
+                except asyncio.TimeoutError:
+                    return
+                data = encoding.loads(frame)
+                text = data.get("message", "")
+                if not text.startswith("bench "):
+                    continue
+                sent_at = int(text.split()[2])
+                latencies.append((time.perf_counter_ns() - sent_at) / 1e6)
+                received += 1
+                delivered += 1
+
+        async def sender(communicator):
+            for seq in range(messages_per_client):
+                await communicator.send_to(text_data=encoding.dumps({
+                    "message": f"bench {seq} {time.perf_counter_ns()}",
+                }))
+
+        queries_before = counter.count
+        started = time.perf_counter()
+        receivers = [asyncio.ensure_future(receiver(c)) for c in clients]
+        await asyncio.gather(*(sender(c) for c in clients))
+        await asyncio.gather(*receivers)
+        elapsed = time.perf_counter() - started
+        await get_persister().close()
+        queries = counter.count - queries_before
+
+        for communicator in clients:
+            await communicator.disconnect()
+
+        sent = len(clients) * messages_per_client
+        expected = len(clients) * expected_per_client
+        return {
+            "connections": len(clients),
+            "messages_sent": sent,
+            "deliveries_expected": expected,
+            "deliveries": delivered,
+            "elapsed_seconds": round(elapsed, 4),
+            "messages_per_second": round(sent / elapsed, 2) if elapsed else None,
+            "deliveries_per_second": round(delivered / elapsed, 2) if elapsed else None,
+            "fanout_latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies) if latencies else None,
+            },
+            "db_queries_total": queries,
+            "db_queries_per_message": round(queries / sent, 3) if sent else None,
+            "memory_per_connection_bytes": round((memory_after - memory_before) / len(clients)) if clients else None,
+        }
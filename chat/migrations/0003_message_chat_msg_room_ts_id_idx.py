@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'timestamp', 'id'], name='chat_msg_room_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-17 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_room_stats(apps, schema_editor):
+    Room = apps.get_model('chat', 'Room')
+    RoomStats = apps.get_model('chat', 'RoomStats')
+    rooms = Room.objects.annotate(
+        message_count=models.Count('messages'),
+        last_message_at=models.Max('messages__timestamp'),
+    )
+    RoomStats.objects.bulk_create(
+        RoomStats(room_id=room.pk, message_count=room.message_count, last_message_at=room.last_message_at)
+        for room in rooms
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_chat_msg_room_ts_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomStats',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='chat.room')),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_room_stats, migrations.RunPython.noop),
+    ]
@@ -9,6 +9,15 @@ class Room(models.Model):
     def __str__(self):
         return self.name
 
+class RoomStats(models.Model):
+    """房间活动统计（反范式），在消息保存时更新，避免列表页做聚合查询"""
+    room = models.OneToOneField(Room, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.room_id}: {self.message_count}'
+
 class Message(models.Model):
     room = models.ForeignKey(Room, related_name='messages', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='messages', on_delete=models.CASCADE)
@@ -17,6 +26,10 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # 历史记录 keyset 分页: WHERE room = ? AND (timestamp, id) < (?, ?)
+            models.Index(fields=['room', 'timestamp', 'id'], name='chat_msg_room_ts_id_idx'),
+        ]
     
     def __str__(self):
         return f'{self.user.username}: {self.content[:20]}'
@@ -0,0 +1,203 @@
+"""聊天消息持久化：同步写入或批量延迟写入（write-behind）。"""
+import asyncio
+import atexit
+import logging
+from dataclasses import dataclass
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Room, Message
+from .stats import record_bulk
+
+logger = logging.getLogger(__name__)
+
+# 持久化模式
+MODE_SYNC = "sync"          # 每条消息单独写入（默认，与原行为一致）
+MODE_BATCHED = "batched"    # 进入队列，按数量或时间阈值 bulk_create
+
+DEFAULT_CONFIG = {
+    "MODE": MODE_SYNC,
+    "BATCH_SIZE": 100,
+    "FLUSH_INTERVAL": 0.5,
+    "MAX_QUEUE": 10000,
+}
+
+# 队列中的停止标记
+_STOP = object()
+
+
+@dataclass
+class PendingMessage:
+    """等待写入数据库的消息"""
+    room: Room
+    user: object
+    content: str
+
+
+class MessagePersister:
+    """按进程（事件循环）维护的消息写入器。
+
+    ``batched`` 模式下消息先进入 asyncio 队列，后台任务在累计 ``batch_size``
+    条或等待 ``flush_interval`` 秒后用一次 ``bulk_create`` 写入。正在攒批的
+    消息保存在 ``self._batch`` 中，``close()``（ASGI lifespan 关闭时调用）或
+    进程退出时的 ``flush_pending_sync`` 会把它与队列中的剩余消息一起写完。
+    ``save(..., durable=True)`` 可强制单条同步写入。
+
+    队列最多容纳 ``max_queue`` 条消息（0 表示不限制）。数据库跟不上时
+    ``save`` 等待队列腾出空间，发送方的消息处理随之放慢，内存不会无限增长。
+    """
+
+    def __init__(self, mode=MODE_SYNC, batch_size=100, flush_interval=0.5, max_queue=10000):
+        if mode not in (MODE_SYNC, MODE_BATCHED):
+            raise ValueError(f"未知的消息持久化模式: {mode}")
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.loop = None
+        self._queue = None
+        self._worker = None
+        # 已从队列取出、尚未写入的消息
+        self._batch = []
+        # 统计信息：刷新次数、写入消息总数、最近一次批量大小、丢弃的消息数、因队列已满而等待的次数
+        self.stats = {"flushes": 0, "messages": 0, "last_batch": 0, "dropped": 0, "queue_full": 0}
+
+    async def save(self, room, user, content, durable=False):
+        """保存一条消息；``durable=True`` 时等待其落盘后再返回"""
+        item = PendingMessage(room, user, content)
+        if durable or self.mode == MODE_SYNC:
+            await database_sync_to_async(self._flush)([item])
+            return
+        self._ensure_worker()
+        if self._queue.full():
+            self.stats["queue_full"] += 1
+        await self._queue.put(item)
+
+    async def close(self):
+        """停止后台任务，并等待队列中剩余的消息写入完成"""
+        if self._worker is None:
+            return
+        await self._queue.put(_STOP)
+        await self._worker
+        self._worker = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and self.loop is loop:
+            return
+        self.loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        """后台写入循环：按数量或时间阈值批量刷新，收到停止标记后退出"""
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = self._batch = [item]
+            deadline = self.loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - self.loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await database_sync_to_async(self._flush)(batch)
+
+    def _drain(self):
+        """取出队列中尚未写入的全部消息"""
+        batch = []
+        while self._queue is not None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                batch.append(item)
+        return batch
+
+    def _flush(self, batch):
+        """将一批消息写入数据库，返回写入条数"""
+        try:
+            if len(batch) == 1:
+                written = self._save_one(batch[0])
+            else:
+                try:
+                    messages = [self._build(item) for item in batch]
+                    with transaction.atomic():
+                        Message.objects.bulk_create(messages)
+                        record_bulk(messages)
+                    written = len(messages)
+                except IntegrityError as e:
+                    # 例如入队后用户或房间已被删除：逐条重试，只丢弃出错的消息
+                    logger.warning("批量写入消息失败，改为逐条写入: %s", e)
+                    written = sum(self._save_one(item) for item in batch)
+        except Exception as e:
+            logger.error("保存消息时出错: %s", e)
+            self.stats["dropped"] += len(batch)
+            written = 0
+        finally:
+            # 写入结束后才清空，退出时不会重复写入或漏写这一批
+            if batch is self._batch:
+                self._batch = []
+
+        if written:
+            self.stats["flushes"] += 1
+            self.stats["messages"] += written
+            self.stats["last_batch"] = written
+            logger.debug("消息写入完成: 本批 %d 条", written)
+        return written
+
+    @staticmethod
+    def _build(item):
+        return Message(room=item.room, user=item.user, content=item.content)
+
+    def _save_one(self, item):
+        """单条写入（post_save 信号会同时更新房间统计），失败时丢弃该条并返回 0"""
+        try:
+            with transaction.atomic():
+                self._build(item).save()
+        except IntegrityError as e:
+            logger.error("丢弃无法保存的消息 (room=%s): %s", getattr(item.room, "pk", item.room), e)
+            self.stats["dropped"] += 1
+            return 0
+        return 1
+
+    def flush_pending_sync(self):
+        """进程退出时同步写入正在攒批与队列中剩余的消息（事件循环已停止）"""
+        batch = self._batch + self._drain()
+        self._batch = []
+        if batch:
+            self._flush(batch)
+
+
+_persister = None
+
+
+def get_persister():
+    """返回当前进程的消息写入器，配置来自 ``settings.CHAT_MESSAGE_PERSISTENCE``"""
+    global _persister
+    if _persister is None:
+        config = {**DEFAULT_CONFIG, **getattr(settings, "CHAT_MESSAGE_PERSISTENCE", {})}
+        _persister = MessagePersister(
+            mode=config["MODE"],
+            batch_size=config["BATCH_SIZE"],
+            flush_interval=config["FLUSH_INTERVAL"],
+            max_queue=config["MAX_QUEUE"],
+        )
+        if _persister.mode == MODE_BATCHED:
+            atexit.register(_persister.flush_pending_sync)
+    return _persister
+
+
+async def shutdown_persister():
+    """服务关闭时写完剩余消息（由 ASGI lifespan 调用）"""
+    if _persister is not None:
+        await _persister.close()
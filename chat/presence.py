@@ -0,0 +1,211 @@
+"""聊天室在线状态（presence）跟踪。
+
+在线状态按用户计数：同一用户的多个连接（多个标签页、多台设备）只算一人。
+每个连接在房间内登记一条带过期时间的记录，客户端定期发送心跳续期，超过
+TTL 未续期的记录自动失效；用户的最后一个连接失效或断开后才算离开。
+``join``/``leave`` 返回 ``(人数, 是否变化)``，只有用户的第一个连接加入和
+最后一个连接离开时才需要向房间广播增量。过期失效的用户没有离开事件，
+``heartbeat`` 返回 ``(人数, 过期移除的人数)``，由续期的连接代为广播新人数，
+同一批过期只报告一次。提供两种存储：
+
+- ``RedisPresence``：使用 Channel Layer 所在的 Redis，每个房间一个有序集合
+  （成员为用户，分数为其连接中最晚的过期时间），每个用户一个连接有序集合，
+  加入/离开由 Lua 脚本原子完成，适合多进程/多节点部署；
+- ``InMemoryPresence``：进程内字典，适合单进程部署和开发环境。
+
+进程内存储读取人数为 O(1)，Redis 使用 ``ZCOUNT``（O(log N)），多个房间的
+人数在同一个 pipeline 中读取。
+"""
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+DEFAULT_CONFIG = {
+    # auto: Channel Layer 为 Redis 时使用 Redis，否则使用进程内存储
+    "BACKEND": "auto",
+    # 记录在最后一次心跳后的存活时间（秒）
+    "TTL": 90,
+    # 客户端心跳间隔（秒），应小于 TTL
+    "HEARTBEAT_INTERVAL": 30,
+}
+
+
+class InMemoryPresence:
+    """进程内在线状态存储"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # room -> {member: {channel_name: expires_at}}
+        self._rooms = {}
+        # room -> 下一次清理过期记录的时间
+        self._next_sweep = {}
+        # room -> 清理时移除、尚未报告的用户数
+        self._expired = {}
+
+    async def join(self, room, member, channel):
+        now = time.monotonic()
+        connections = self._rooms.setdefault(room, {}).setdefault(member, {})
+        first = not any(expires > now for expires in connections.values())
+        connections[channel] = now + self.ttl
+        return self._count(room), first
+
+    async def heartbeat(self, room, member, channel):
+        # 记录已过期时重新登记
+        count, _ = await self.join(room, member, channel)
+        return count, self._expired.pop(room, 0)
+
+    async def leave(self, room, member, channel):
+        members = self._rooms.get(room)
+        if members is None or member not in members:
+            return self._count(room), False
+        connections = members[member]
+        connections.pop(channel, None)
+        now = time.monotonic()
+        last = not any(expires > now for expires in connections.values())
+        if last:
+            del members[member]
+            if not members:
+                del self._rooms[room]
+                self._next_sweep.pop(room, None)
+                self._expired.pop(room, None)
+        return self._count(room), last
+
+    async def count(self, room):
+        return self._count(room)
+
+    async def counts(self, rooms):
+        return {room: self._count(room) for room in rooms}
+
+    def _count(self, room):
+        members = self._rooms.get(room)
+        if not members:
+            return 0
+        now = time.monotonic()
+        # 每个 TTL 周期最多清理一次过期记录，均摊后读取仍为 O(1)
+        if now >= self._next_sweep.get(room, 0):
+            expired = 0
+            for member in list(members):
+                connections = members[member]
+                for channel in [c for c, expires in connections.items() if expires <= now]:
+                    del connections[channel]
+                if not connections:
+                    del members[member]
+                    expired += 1
+            if expired:
+                self._expired[room] = self._expired.get(room, 0) + expired
+            self._next_sweep[room] = now + self.ttl
+        return len(members)
+
+
+# KEYS: 房间用户集合, 用户连接集合; ARGV: member, channel, now, expires, key_ttl
+# 返回 {是否为该用户的第一个连接, 房间人数, 过期移除的用户数}
+_JOIN_SCRIPT = """
+local expired = redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+local first = redis.call('ZCARD', KEYS[2]) == 0
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return {first and 1 or 0, redis.call('ZCARD', KEYS[1]), expired}
+"""
+
+# KEYS: 房间用户集合, 用户连接集合; ARGV: member, channel, now
+# 返回 {是否为该用户的最后一个连接, 房间人数}
+_LEAVE_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+local last = 0
+if redis.call('ZCARD', KEYS[2]) == 0 then
+    last = redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('DEL', KEYS[2])
+end
+return {last, redis.call('ZCOUNT', KEYS[1], ARGV[3], '+inf')}
+"""
+
+
+class RedisPresence:
+    """基于 Channel Layer Redis 连接的在线状态存储"""
+
+    def __init__(self, layer, ttl):
+        self.layer = layer
+        self.ttl = ttl
+
+    def _key(self, room):
+        return f"{self.layer.prefix}:presence:{room}"
+
+    def _index(self, room):
+        # 同一房间的所有键都按房间键选择连接，保证脚本在同一个 Redis 上执行
+        return self.layer.consistent_hash(self._key(room))
+
+    def _connection(self, room):
+        return self.layer.connection(self._index(room))
+
+    async def _join(self, room, member, channel):
+        key = self._key(room)
+        now = time.time()
+        return await self._connection(room).eval(
+            _JOIN_SCRIPT, 2, key, f"{key}:{member}",
+            member, channel, now, now + self.ttl, int(self.ttl) + 1,
+        )
+
+    async def join(self, room, member, channel):
+        first, count, _ = await self._join(room, member, channel)
+        return count, bool(first)
+
+    async def heartbeat(self, room, member, channel):
+        # 过期记录由执行清理的那次脚本报告，不会被多个连接重复广播
+        _, count, expired = await self._join(room, member, channel)
+        return count, expired
+
+    async def leave(self, room, member, channel):
+        key = self._key(room)
+        last, count = await self._connection(room).eval(
+            _LEAVE_SCRIPT, 2, key, f"{key}:{member}", member, channel, time.time(),
+        )
+        return count, bool(last)
+
+    async def count(self, room):
+        # 只统计未过期的用户，过期记录在下一次 join 时清理
+        key = self._key(room)
+        return await self._connection(room).zcount(key, time.time(), "+inf")
+
+    async def counts(self, rooms):
+        # 按 Redis 连接分组，每个连接一个 pipeline，而不是每个房间一次往返
+        now = time.time()
+        groups = {}
+        for room in rooms:
+            groups.setdefault(self._index(room), []).append(room)
+        result = {}
+        for index, group in groups.items():
+            pipe = self.layer.connection(index).pipeline(transaction=False)
+            for room in group:
+                pipe.zcount(self._key(room), now, "+inf")
+            result.update(zip(group, await pipe.execute()))
+        return {room: result[room] for room in rooms}
+
+
+def get_presence_config():
+    return {**DEFAULT_CONFIG, **getattr(settings, "CHAT_PRESENCE", {})}
+
+
+_presence = None
+
+
+def get_presence():
+    """返回当前进程的在线状态存储，配置来自 ``settings.CHAT_PRESENCE``"""
+    global _presence
+    if _presence is None:
+        config = get_presence_config()
+        backend = config["BACKEND"]
+        layer = get_channel_layer()
+        if backend == "auto":
+            backend = "redis" if hasattr(layer, "consistent_hash") else "memory"
+        if backend == "redis":
+            _presence = RedisPresence(layer, config["TTL"])
+        elif backend == "memory":
+            _presence = InMemoryPresence(config["TTL"])
+        else:
+            raise ValueError(f"未知的在线状态存储: {backend}")
+    return _presence
@@ -0,0 +1,53 @@
+"""聊天室查询缓存。"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Room
+
+
+class RoomCache:
+    """进程内按房间名缓存 ``Room`` 的 LRU 缓存。
+
+    只缓存存在的房间；房间改名或删除时由 ``chat.signals`` 中的信号处理函数
+    调用 ``invalidate``。缓存是进程本地的，多进程部署时其他进程中的条目会
+    保留到被淘汰为止。
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._rooms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """按名称返回房间，不存在时返回 ``None``（需在同步上下文中调用）"""
+        with self._lock:
+            room = self._rooms.get(name)
+            if room is not None:
+                self._rooms.move_to_end(name)
+                return room
+
+        room = Room.objects.filter(name=name).first()
+        if room is None:
+            return None
+
+        with self._lock:
+            self._rooms[name] = room
+            self._rooms.move_to_end(name)
+            while len(self._rooms) > self.maxsize:
+                self._rooms.popitem(last=False)
+        return room
+
+    def invalidate(self, room):
+        """移除与该房间（按主键）相关的全部条目，改名后旧名称同样失效"""
+        with self._lock:
+            for name in [n for n, r in self._rooms.items() if r.pk == room.pk]:
+                del self._rooms[name]
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+
+
+room_cache = RoomCache(getattr(settings, "CHAT_ROOM_CACHE_SIZE", 1024))
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Message, Room, RoomStats
+from .rooms import room_cache
+from .stats import bump_stats_version, record_messages
+
+
+@receiver(post_save, sender=Room)
+def invalidate_room_on_save(sender, instance, created, **kwargs):
+    """新房间创建统计记录；房间改名后使缓存中的旧条目失效"""
+    if created:
+        RoomStats.objects.get_or_create(room=instance)
+    else:
+        room_cache.invalidate(instance)
+    bump_stats_version()
+
+
+@receiver(post_delete, sender=Room)
+def invalidate_room_on_delete(sender, instance, **kwargs):
+    """房间删除后使缓存失效"""
+    room_cache.invalidate(instance)
+    bump_stats_version()
+
+
+@receiver(post_save, sender=Message)
+def update_room_stats(sender, instance, created, **kwargs):
+    """单条保存的消息更新房间统计（批量写入由持久化模块自行汇总）"""
+    if created:
+        record_messages(instance.room_id, 1, instance.timestamp)
@@ -49,6 +49,8 @@ document.addEventListener("DOMContentLoaded", () => {
   
   // 当前历史记录页码
   let currentHistoryPage = 1;
+  // 下一页历史记录的游标（由服务器返回，优先于页码使用）
+  let historyCursor = null;
   // 是否已经加载完所有历史记录
   let historyEnded = false;
   // 是否正在加载
@@ -58,6 +60,11 @@ document.addEventListener("DOMContentLoaded", () => {
   loadingIndicator.className = "chat-message message-system";
   loadingIndicator.innerHTML = `<div><i class="bi bi-arrow-repeat loading-icon"></i> 正在加载历史消息...</div>`;
 
+  // 在线人数显示
+  const onlineCount = document.getElementById("online-count");
+  // 心跳定时器
+  let heartbeatTimer = null;
+
   // 格式化时间的辅助函数
   function getCurrentTime() {
     const now = new Date();
@@ -138,10 +145,14 @@ document.addEventListener("DOMContentLoaded", () => {
     log.insertBefore(loadingIndicator, log.firstChild);
     
     // 请求历史记录
-    chatSocket.send(JSON.stringify({
+    const request = {
       load_history: true,
       page: currentHistoryPage
-    }));
+    };
+    if (historyCursor) {
+      request.before = historyCursor;
+    }
+    chatSocket.send(JSON.stringify(request));
   }
   
   // 检测滚动到顶部，加载更多历史记录
@@ -163,6 +174,12 @@ document.addEventListener("DOMContentLoaded", () => {
     
     // 添加历史记录按钮
     addHistoryButton();
+
+    // 定期发送心跳，维持在线状态
+    const interval = (window.roomData && window.roomData.heartbeatInterval) || 30;
+    heartbeatTimer = setInterval(() => {
+      chatSocket.send(JSON.stringify({ heartbeat: true }));
+    }, interval * 1000);
   };
 
   chatSocket.onerror = function(e) {
@@ -170,54 +187,79 @@ document.addEventListener("DOMContentLoaded", () => {
     updateStatus("连接错误", true);
   };
   
+  // 处理一个服务器帧；batch 帧中的每一项也按单独的帧处理
+  function handleFrame(data) {
+    if (data.history) {
+      // 移除加载指示器
+      if (log.contains(loadingIndicator)) {
+        log.removeChild(loadingIndicator);
+      }
+      
+      // 处理历史记录
+      const messages = data.messages;
+      historyEnded = data.is_end;
+      historyCursor = data.next_cursor || null;
+      currentHistoryPage++;
+      
+      if (messages.length === 0) {
+        // 没有更多历史记录
+        historyEnded = true;
+        
+        // 显示提示
+        const noMoreHistory = document.createElement("div");
+        noMoreHistory.className = "chat-message message-system";
+        noMoreHistory.innerHTML = `<div>没有更多历史消息了</div>`;
+        log.insertBefore(noMoreHistory, log.firstChild);
+      } else {
+        // 添加历史消息，从旧到新
+        for (const msg of messages) {
+          addMessage(msg, true);
+        }
+      }
+      
+      // 如果已经到达历史记录末尾，移除加载按钮
+      if (historyEnded) {
+        const buttonContainer = document.getElementById("history-button-container");
+        if (buttonContainer) {
+          log.removeChild(buttonContainer);
+        }
+      }
+      
+      isLoading = false;
+    } else if (data.presence) {
+      // 在线状态增量：只更新人数，不重新拉取成员列表
+      if (onlineCount) {
+        onlineCount.textContent = data.count;
+      }
+    } else if (data.error) {
+      // 历史记录请求出错时也要结束加载状态，否则之后无法再加载
+      if (isLoading) {
+        isLoading = false;
+        if (log.contains(loadingIndicator)) {
+          log.removeChild(loadingIndicator);
+        }
+      }
+      addMessage({
+        system: true,
+        message: `错误: ${data.error}`
+      });
+    } else {
+      addMessage(data);
+    }
+  }
+
   chatSocket.onmessage = function (e) {
     console.log("收到消息:", e.data);
     try {
       const data = JSON.parse(e.data);
       
-      if (data.history) {
-        // 移除加载指示器
-        if (log.contains(loadingIndicator)) {
-          log.removeChild(loadingIndicator);
+      // 客户端处理过慢时，服务器会把积压的帧合并为一个 batch 帧
+      if (data.batch) {
+        for (const item of data.batch) {
+          handleFrame(item);
         }
-        
-        // 处理历史记录
-        const messages = data.messages;
-        historyEnded = data.is_end;
-        currentHistoryPage++;
-        
-        if (messages.length === 0) {
-          // 没有更多历史记录
-          historyEnded = true;
-          
-          // 显示提示
-          const noMoreHistory = document.createElement("div");
-          noMoreHistory.className = "chat-message message-system";
-          noMoreHistory.innerHTML = `<div>没有更多历史消息了</div>`;
-          log.insertBefore(noMoreHistory, log.firstChild);
-        } else {
-          // 添加历史消息，从旧到新
-          for (const msg of messages) {
-            addMessage(msg, true);
-          }
-        }
-        
-        // 如果已经到达历史记录末尾，移除加载按钮
-        if (historyEnded) {
-          const buttonContainer = document.getElementById("history-button-container");
-          if (buttonContainer) {
-            log.removeChild(buttonContainer);
-          }
-        }
-        
-        isLoading = false;
-      } else if (data.error) {
-        addMessage({
-          system: true,
-          message: `错误: ${data.error}`
-        });
       } else {
-        addMessage(data);
+        handleFrame(data);
       }
     } catch (error) {
       console.error("解析消息时出错:", error);
@@ -225,6 +267,9 @@ document.addEventListener("DOMContentLoaded", () => {
   };
 
   chatSocket.onclose = function(e) {
+    if (heartbeatTimer) {
+      clearInterval(heartbeatTimer);
+    }
     updateStatus(`连接已关闭 (代码: ${e.code})`, true);
     console.error("WebSocket连接关闭. 代码:", e.code, "原因:", e.reason || "未知");
     
@@ -0,0 +1,49 @@
+"""房间活动统计与聊天室列表缓存版本。"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import RoomStats
+
+# 聊天室列表的缓存版本号，房间创建、修改或删除时递增，旧的分页缓存随之失效。
+# 新消息不递增版本：列表中的消息数和排序最多滞后 CACHE_TIMEOUT 秒，
+# 否则每条消息都会让所有分页缓存失效，活跃时缓存等于没有
+STATS_VERSION_KEY = "chat:room_stats_version"
+
+
+def stats_version():
+    """返回当前统计版本号"""
+    return cache.get_or_set(STATS_VERSION_KEY, 1, timeout=None)
+
+
+def bump_stats_version():
+    try:
+        cache.incr(STATS_VERSION_KEY)
+    except ValueError:
+        cache.set(STATS_VERSION_KEY, 2, timeout=None)
+
+
+def record_messages(room_id, count, last_message_at):
+    """为房间累加消息数并更新最后消息时间
+
+    写入可能乱序（批量落库与逐条保存并存），最后消息时间只向前推进。
+    """
+    latest = Value(last_message_at)
+    updated = RoomStats.objects.filter(room_id=room_id).update(
+        message_count=F('message_count') + count,
+        # 部分数据库上 GREATEST 遇到 NULL 返回 NULL
+        last_message_at=Greatest(Coalesce('last_message_at', latest), latest),
+    )
+    if not updated:
+        RoomStats.objects.create(room_id=room_id, message_count=count, last_message_at=last_message_at)
+
+
+def record_bulk(messages):
+    """``bulk_create`` 不会触发 ``post_save``，按房间汇总后更新统计"""
+    grouped = defaultdict(list)
+    for message in messages:
+        grouped[message.room_id].append(message.timestamp)
+    for room_id, timestamps in grouped.items():
+        record_messages(room_id, len(timestamps), max(timestamps))
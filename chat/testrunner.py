@@ -0,0 +1,13 @@
+"""测试运行器：项目根目录本身带有 ``__init__.py``，需要固定测试发现的顶层目录"""
+from pathlib import Path
+
+from django.test.runner import DiscoverRunner
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+class ProjectTestRunner(DiscoverRunner):
+    """``python manage.py test`` 默认以项目目录为顶层发现测试"""
+
+    def __init__(self, top_level=None, **kwargs):
+        super().__init__(top_level=top_level or str(PROJECT_DIR), **kwargs)
@@ -0,0 +1,295 @@
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .flowcontrol import DEFAULT_CONFIG as FLOW_DEFAULTS, OutboundBuffer
+from .history import InvalidCursor, encode_cursor, fetch_history
+from .models import Message, Room, RoomStats
+from .persistence import MODE_BATCHED, MessagePersister, PendingMessage
+from .presence import InMemoryPresence
+from .stats import record_messages, stats_version
+
+
+class FetchHistoryTests(TestCase):
+    """历史记录 keyset 分页：每页一条 SQL，翻页不跳过、不重复"""
+
+    PER_PAGE = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='x')
+        cls.room = Room.objects.create(name='lobby', owner=cls.user)
+        other = Room.objects.create(name='other', owner=cls.user)
+        base = timezone.now() - timedelta(hours=1)
+        for i in range(11):
+            message = Message.objects.create(room=cls.room, user=cls.user, content=f'm{i}')
+            # m3..m7 共用同一时间戳，且跨越页边界
+            offset = 3 if 3 <= i <= 7 else i
+            Message.objects.filter(pk=message.pk).update(timestamp=base + timedelta(seconds=offset))
+        Message.objects.create(room=other, user=cls.user, content='elsewhere')
+
+    def expected_ids(self):
+        return list(
+            Message.objects.filter(room=self.room)
+            .order_by('-timestamp', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def test_pages_with_cursor(self):
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            with self.assertNumQueries(1):
+                rows, is_end, next_cursor = fetch_history(self.room, before=cursor, per_page=self.PER_PAGE)
+            pages += 1
+            seen.extend(row['id'] for row in rows)
+            if is_end:
+                self.assertIsNone(next_cursor)
+                break
+            self.assertEqual(len(rows), self.PER_PAGE)
+            self.assertIsNotNone(next_cursor)
+            cursor = next_cursor
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, self.expected_ids())
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_rows_carry_username(self):
+        rows, is_end, next_cursor = fetch_history(self.room.pk, per_page=20)
+        self.assertTrue(is_end)
+        self.assertIsNone(next_cursor)
+        self.assertEqual(len(rows), 11)
+        self.assertEqual({row['user__username'] for row in rows}, {'alice'})
+
+    def test_exact_multiple_of_page_size(self):
+        ids = self.expected_ids()
+        message = Message.objects.get(pk=ids[8])
+        cursor = encode_cursor(message.timestamp, message.pk)
+        with self.assertNumQueries(1):
+            rows, is_end, next_cursor = fetch_history(self.room, before=cursor, per_page=2)
+        self.assertEqual([row['id'] for row in rows], ids[9:11])
+        self.assertTrue(is_end)
+        self.assertIsNone(next_cursor)
+
+    def test_malformed_cursor(self):
+        for cursor in ('not base64 !!', encode_cursor(timezone.now(), 1)[:-3], 'Zm9vYmFy'):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    fetch_history(self.room, before=cursor)
+
+
+class MessagePersisterTests(TransactionTestCase):
+    """批量写入：出错的行不连累整批，退出时写完正在攒批的消息"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('bob', password='x')
+        self.room = Room.objects.create(name='batch', owner=self.user)
+        self.persister = MessagePersister(mode=MODE_BATCHED)
+
+    def pending(self, content, user=None):
+        return PendingMessage(self.room, user or self.user, content)
+
+    def test_bad_row_only_drops_itself(self):
+        # 入队后用户已被删除的消息会违反外键约束
+        ghost = User(pk=999999, username='ghost')
+        batch = [self.pending('a'), self.pending('b', ghost), self.pending('c')]
+
+        written = self.persister._flush(batch)
+
+        self.assertEqual(written, 2)
+        self.assertEqual(self.persister.stats['dropped'], 1)
+        self.assertEqual(
+            sorted(Message.objects.filter(room=self.room).values_list('content', flat=True)),
+            ['a', 'c'],
+        )
+        self.room.stats.refresh_from_db()
+        self.assertEqual(self.room.stats.message_count, 2)
+
+    def test_exit_flush_includes_in_flight_batch(self):
+        self.persister._batch = [self.pending('in-flight-1'), self.pending('in-flight-2')]
+
+        self.persister.flush_pending_sync()
+
+        self.assertEqual(self.persister._batch, [])
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 2)
+
+    def test_full_queue_waits_for_writer(self):
+        persister = MessagePersister(mode=MODE_BATCHED, batch_size=1, max_queue=1)
+
+        async def run():
+            for content in ('a', 'b', 'c'):
+                await persister.save(self.room, self.user, content)
+            self.assertLessEqual(persister._queue.qsize(), 1)
+            await persister.close()
+
+        async_to_sync(run)()
+
+        self.assertGreater(persister.stats['queue_full'], 0)
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 3)
+
+
+class InMemoryPresenceTests(TestCase):
+    """在线状态按用户计数：只有第一个连接加入和最后一个连接离开时才有增量"""
+
+    def setUp(self):
+        self.presence = InMemoryPresence(ttl=60)
+
+    def call(self, method, *args):
+        return async_to_sync(getattr(self.presence, method))(*args)
+
+    def test_multiple_connections_count_once(self):
+        self.assertEqual(self.call('join', 'lobby', '1', 'c1'), (1, True))
+        self.assertEqual(self.call('join', 'lobby', '1', 'c2'), (1, False))
+        self.assertEqual(self.call('join', 'lobby', '2', 'c3'), (2, True))
+
+        self.assertEqual(self.call('leave', 'lobby', '1', 'c1'), (2, False))
+        self.assertEqual(self.call('leave', 'lobby', '1', 'c2'), (1, True))
+        # 重复断开不会再次产生离开增量
+        self.assertEqual(self.call('leave', 'lobby', '1', 'c2'), (1, False))
+        self.assertEqual(self.call('counts', ['lobby', 'empty']), {'lobby': 1, 'empty': 0})
+
+    def test_expired_connections_are_swept(self):
+        presence = InMemoryPresence(ttl=0)
+        async_to_sync(presence.join)('lobby', '1', 'c1')
+        self.assertEqual(async_to_sync(presence.count)('lobby'), 0)
+        # 过期后重新加入视为第一个连接
+        self.assertEqual(async_to_sync(presence.join)('lobby', '1', 'c2'), (0, True))
+
+    def test_heartbeat_reports_expired_members_once(self):
+        self.call('join', 'lobby', '1', 'c1')
+        self.call('join', 'lobby', '2', 'c2')
+        # 用户 2 的连接过期且没有断开
+        self.presence._rooms['lobby']['2']['c2'] = 0
+        self.presence._next_sweep['lobby'] = 0
+        self.assertEqual(self.call('heartbeat', 'lobby', '1', 'c1'), (1, 1))
+        self.assertEqual(self.call('heartbeat', 'lobby', '1', 'c1'), (1, 0))
+
+
+@override_settings(CHAT_ROOM_INDEX={'PER_PAGE': 2}, CHAT_PRESENCE={'BACKEND': 'memory'})
+class RoomIndexCacheTests(TestCase):
+    """聊天室列表按规范化页码缓存，新消息不使缓存失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('carol', password='x')
+        for name in ('a', 'b', 'c'):
+            Room.objects.create(name=name, owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_page_parameter_is_normalized(self):
+        self.client.get(reverse('index'), {'page': '1'})
+        for page in ('01', 'abc', '-3', ''):
+            with self.subTest(page=page), self.assertNumQueries(2):
+                # 只剩会话和用户查询，页面来自缓存
+                response = self.client.get(reverse('index'), {'page': page})
+            self.assertEqual(response.context['page']['number'], 1)
+
+        self.client.get(reverse('index'), {'page': '2'})
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('index'), {'page': '999'})
+        self.assertEqual(response.context['page']['number'], 2)
+
+    def test_new_message_keeps_version(self):
+        version = stats_version()
+        Message.objects.create(room=Room.objects.get(name='a'), user=self.user, content='hi')
+        self.assertEqual(stats_version(), version)
+
+
+class RoomStatsTests(TestCase):
+    """乱序写入的统计不会让最后消息时间倒退"""
+
+    def test_last_message_at_only_moves_forward(self):
+        user = User.objects.create_user('erin', password='x')
+        room = Room.objects.create(name='stats', owner=user)
+        RoomStats.objects.filter(room=room).delete()
+        now = timezone.now()
+        record_messages(room.pk, 2, now)
+        record_messages(room.pk, 1, now - timedelta(minutes=5))
+        stats = RoomStats.objects.get(room=room)
+        self.assertEqual(stats.message_count, 3)
+        self.assertEqual(stats.last_message_at, now)
+
+        RoomStats.objects.filter(room=room).update(last_message_at=None)
+        record_messages(room.pk, 1, now)
+        self.assertEqual(RoomStats.objects.get(room=room).last_message_at, now)
+
+
+class OutboundBufferTests(TestCase):
+    """出站队列按帧数和字节数计量积压，发送任务失败时关闭连接"""
+
+    def config(self, **overrides):
+        return {**FLOW_DEFAULTS, **overrides}
+
+    def test_byte_limit_drops_oldest(self):
+        async def scenario():
+            sent = []
+
+            async def send(text_data):
+                sent.append(text_data)
+
+            # 突发上限只够第一帧，其余帧留在队列中
+            buffer = OutboundBuffer(send, self.config(OUTBOUND_MAX_BYTES=10, OUTBOUND_RATE=1, OUTBOUND_BURST=4))
+            for frame in ('aaaa', 'bbbb', 'cccc', 'dddd'):
+                buffer.push(frame)
+            await asyncio.sleep(0.01)
+            self.assertLessEqual(buffer.pending_bytes, 10)
+            queued = list(buffer._frames)
+            buffer.close()
+            return sent, queued
+
+        sent, queued = async_to_sync(scenario)()
+        # 超出字节上限的最旧帧在发送前就被丢弃
+        self.assertEqual(sent, ['cccc'])
+        self.assertEqual(queued, ['dddd'])
+
+    def test_push_after_close_is_dropped(self):
+        async def scenario():
+            sent = []
+
+            async def send(text_data):
+                sent.append(text_data)
+
+            buffer = OutboundBuffer(send, self.config())
+            buffer.push('a')
+            await asyncio.sleep(0)
+            buffer.close()
+            # 断开后到达的广播帧不会重新启动发送任务
+            buffer.push('b')
+            await asyncio.sleep(0.01)
+            return buffer, sent
+
+        buffer, sent = async_to_sync(scenario)()
+        self.assertEqual(sent, ['a'])
+        self.assertIsNone(buffer._task)
+        self.assertEqual(buffer.pending_bytes, 0)
+
+    def test_send_failure_closes_connection(self):
+        async def scenario():
+            closed = asyncio.Event()
+
+            async def send(text_data):
+                raise RuntimeError('socket gone')
+
+            async def on_error():
+                closed.set()
+
+            buffer = OutboundBuffer(send, self.config(), on_error=on_error)
+            buffer.push('x')
+            await asyncio.wait_for(closed.wait(), 1)
+            buffer.push('y')
+            return buffer
+
+        with self.assertLogs('chat.flowcontrol', 'ERROR'):
+            buffer = async_to_sync(scenario)()
+        self.assertTrue(buffer.failed)
+        self.assertEqual(buffer.pending_bytes, 0)
@@ -2,8 +2,15 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import F
+from asgiref.sync import async_to_sync
 from .models import Room
 from .forms import RoomForm
+from .presence import get_presence, get_presence_config
+from .stats import stats_version
 
 def signup_view(request):
     if request.method == "POST":
@@ -29,10 +36,63 @@ def login_view(request):
         form = AuthenticationForm()
     return render(request, "chat/login.html", {"form": form})
 
+def _room_index_page(page_number, per_page):
+    """查询一页聊天室及其统计，返回可缓存的纯数据"""
+    rooms = (
+        Room.objects.select_related("stats")
+        .order_by(F("stats__last_message_at").desc(nulls_last=True), "name")
+    )
+    paginator = Paginator(rooms, per_page)
+    page = paginator.get_page(page_number)
+    items = []
+    for r in page.object_list:
+        stats = getattr(r, "stats", None)
+        items.append({
+            "name": r.name,
+            "message_count": stats.message_count if stats else 0,
+            "last_message_at": stats.last_message_at if stats else None,
+        })
+    return {
+        "rooms": items,
+        "number": page.number,
+        "num_pages": paginator.num_pages,
+        "has_previous": page.has_previous(),
+        "has_next": page.has_next(),
+    }
+
+def _page_number(value):
+    """把查询参数规范为正整数页码，无效值按第一页处理"""
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
 @login_required
 def index(request):
-    rooms = Room.objects.all()
-    return render(request, "chat/index.html", {"rooms": rooms})
+    config = getattr(settings, "CHAT_ROOM_INDEX", {})
+    per_page = config.get("PER_PAGE", 20)
+    timeout = config.get("CACHE_TIMEOUT", 300)
+    prefix = f"chat:room_index:{stats_version()}:{per_page}"
+    
+    # 缓存键只使用规范化后的页码，任意查询参数不会产生新的缓存条目
+    page_number = _page_number(request.GET.get("page"))
+    num_pages = cache.get(f"{prefix}:num_pages")
+    if num_pages is not None:
+        page_number = min(page_number, num_pages)
+    
+    # 按统计版本缓存每一页，统计未变化时不访问数据库
+    page = cache.get(f"{prefix}:{page_number}")
+    if page is None:
+        page = _room_index_page(page_number, per_page)
+        cache.set_many({
+            f"{prefix}:{page['number']}": page,
+            f"{prefix}:num_pages": page["num_pages"],
+        }, timeout)
+    
+    # 在线人数直接读取在线状态存储，无需扫描连接
+    counts = async_to_sync(get_presence().counts)([r["name"] for r in page["rooms"]])
+    rooms = [{**r, "online_count": counts.get(r["name"], 0)} for r in page["rooms"]]
+    return render(request, "chat/index.html", {"rooms": rooms, "page": page})
 
 @login_required
 def room_create(request):
@@ -50,4 +110,7 @@ def room_create(request):
 @login_required
 def room(request, room_name):
     room = get_object_or_404(Room, name=room_name)
-    return render(request, "chat/room.html", {"room_name": room.name}) 
\ No newline at end of file
+    return render(request, "chat/room.html", {
+        "room_name": room.name,
+        "heartbeat_interval": get_presence_config()["HEARTBEAT_INTERVAL"],
+    }) 
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""WebSocket 热路径日志：按级别开关、惰性格式化，并对逐条消息事件采样。"""
+import logging
+import random
+
+from django.conf import settings
+
+DEFAULT_CONFIG = {
+    # chat.ws 日志级别；逐条消息事件使用 DEBUG，默认不输出
+    "LEVEL": "INFO",
+    # 逐条消息事件（收到消息、向成员推送）的采样比例，0~1
+    "SAMPLE_RATE": 0.01,
+}
+
+
+class _Fields:
+    """仅在日志真正输出时才格式化为 ``key=value`` 文本"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join(f"{key}={value}" for key, value in self.fields.items())
+
+
+class WebSocketLogger:
+    """结构化事件日志。
+
+    ``event`` 用于连接级事件（每个连接常数次）；``sampled`` 用于逐条消息、
+    逐个接收者的事件，先检查级别再按比例采样，被过滤时不做任何格式化。
+    事件名与字段同时通过 ``extra`` 的 ``ws_event``/``ws_fields`` 提供给
+    结构化的日志处理器。
+    """
+
+    def __init__(self, logger, sample_rate=0.0):
+        self.logger = logger
+        self.sample_rate = sample_rate
+
+    def event(self, event, level=logging.INFO, **fields):
+        if self.logger.isEnabledFor(level):
+            self._emit(level, event, fields)
+
+    def sampled(self, event, level=logging.DEBUG, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        self._emit(level, event, fields)
+
+    def _emit(self, level, event, fields):
+        self.logger.log(
+            level,
+            "%s %s",
+            event,
+            _Fields(fields),
+            extra={"ws_event": event, "ws_fields": fields},
+        )
+
+
+def get_ws_logger():
+    """按 ``settings.CHAT_WS_LOGGING`` 创建 ``chat.ws`` 事件日志"""
+    config = {**DEFAULT_CONFIG, **getattr(settings, "CHAT_WS_LOGGING", {})}
+    logger = logging.getLogger("chat.ws")
+    logger.setLevel(config["LEVEL"])
+    return WebSocketLogger(logger, float(config["SAMPLE_RATE"]))
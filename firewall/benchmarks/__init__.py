@@ -0,0 +1 @@
+"""防火墙性能基准脚本。"""
@@ -0,0 +1,80 @@
+"""规则索引基准。
+
+运行方式（在 ``firewall/`` 目录下）::
+
+    python -m benchmarks.bench_index --rules 2000 --blacklist 5000
+
+分别测量 ``FirewallEngine.evaluate``（索引）与 ``FirewallEngine.evaluate_linear``
+（线性扫描）的单包耗时。两者判决一致性由 ``tests/test_index.py`` 的差分测试覆盖。
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import List
+
+from firewall.engine import FirewallEngine
+from firewall.rules import AddressPattern, FirewallRule, MatchAction, MatchProtocol, PacketInfo
+
+def timing_engine(rng: random.Random, rules: int, blacklist: int) -> FirewallEngine:
+    """贴近实际的规则集：黑名单为大量具体地址，规则带有具体的网段与端口。"""
+
+    engine = FirewallEngine(log_limit=1)
+    for i in range(blacklist):
+        ip = f"203.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"
+        engine.add_blacklist(AddressPattern(ip if i % 2 else f"{ip}/32"))
+    for i in range(rules):
+        engine.add_rule(
+            FirewallRule(
+                name=f"rule-{i}",
+                action=MatchAction.DENY,
+                protocol=rng.choice(list(MatchProtocol)),
+                src_ip=f"10.{rng.randrange(256)}.{rng.randrange(256)}.0/24",
+                dst_port=f"{rng.randrange(1, 30000)}-{rng.randrange(30000, 65536)}",
+            )
+        )
+    return engine
+
+
+def timing_packets(rng: random.Random, count: int) -> List[PacketInfo]:
+    return [
+        PacketInfo(
+            MatchProtocol.TCP,
+            f"192.168.{rng.randrange(256)}.{rng.randrange(256)}",
+            rng.randrange(1024, 65536),
+            "127.0.0.1",
+            rng.randrange(1, 65536),
+        )
+        for _ in range(count)
+    ]
+
+
+def timed(func, packets: List[PacketInfo]) -> float:
+    start = time.perf_counter()
+    for packet in packets:
+        func(packet)
+    return (time.perf_counter() - start) / len(packets) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=2000)
+    parser.add_argument("--blacklist", type=int, default=5000)
+    parser.add_argument("--packets", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = timing_engine(rng, args.rules, args.blacklist)
+    packets = timing_packets(rng, args.packets)
+    engine.evaluate(packets[0])  # 预先构建索引
+    indexed = timed(engine.evaluate, packets)
+    linear = timed(engine.evaluate_linear, packets[: max(1, args.packets // 10)])
+    print(f"rules={args.rules} blacklist={args.blacklist}")
+    print(f"indexed  {indexed:10.1f} us/packet")
+    print(f"linear   {linear:10.1f} us/packet")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""内容特征匹配基准：PayloadMatcher 与逐条 ``re.search`` 对比。
+
+运行方式（在 ``firewall/`` 目录下）::
+
+    python -m benchmarks.bench_payload --patterns 200 --size 4096
+
+基线为原有方式：每条规则各自调用 ``payload_text()`` 解码负载并 ``search``。
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import string
+import time
+
+from firewall.payload import PayloadMatcher
+from firewall.rules import MatchProtocol, PacketInfo
+
+
+def build_patterns(count: int, rng: random.Random) -> list:
+    patterns = []
+    for i in range(count):
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(8))
+        patterns.append(word if i % 3 else f"{word}[0-9]+")
+    return patterns
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patterns", type=int, default=200)
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    patterns = build_patterns(args.patterns, rng)
+    payload = "".join(rng.choice(string.ascii_letters + " \r\n") for _ in range(args.size)).encode()
+    packet = PacketInfo(MatchProtocol.TCP, "10.0.0.1", 40000, "127.0.0.1", 8000, payload)
+
+    compiled = [re.compile(p) for p in patterns]
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        loop_hits = {i for i, regex in enumerate(compiled) if regex.search(packet.payload_text())}
+    loop = (time.perf_counter() - start) / args.iterations * 1e6
+
+    matcher = PayloadMatcher(list(enumerate(patterns)))
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        matcher_hits = matcher.hits(packet.payload)
+    combined = (time.perf_counter() - start) / args.iterations * 1e6
+
+    assert loop_hits == matcher_hits, (loop_hits, matcher_hits)
+    print(f"patterns={args.patterns} payload={args.size} bytes")
+    print(f"per-rule loop  {loop:10.1f} us/chunk")
+    print(f"matcher        {combined:10.1f} us/chunk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""TCP 转发吞吐基准：在回环地址上对比直连、stream 模式与 buffered 模式。
+
+运行方式（在 ``firewall/`` 目录下）::
+
+    python -m benchmarks.bench_proxy --megabytes 256
+
+后端在连接建立后发送指定大小的数据并关闭，客户端经代理读完全部数据，
+统计下载吞吐。每种模式分别测量检测全部数据与只检测前 4 KiB（快速通道）
+两种配置，分片日志使用 ``flow`` 模式以免日志输出主导结果。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from firewall.engine import FirewallEngine
+from firewall.proxy import FirewallService, ProxyConfig
+from firewall.rules import MatchAction
+
+BACKEND_PORT = 18500
+PROXY_PORT = 18501
+BLOCK = b"x" * (1 << 20)
+
+
+async def serve_bulk(total: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    remaining = total
+    while remaining > 0:
+        block = BLOCK if remaining >= len(BLOCK) else BLOCK[:remaining]
+        writer.write(block)
+        await writer.drain()
+        remaining -= len(block)
+    writer.close()
+
+
+async def download(port: int, total: int) -> float:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    started = time.perf_counter()
+    received = 0
+    while True:
+        data = await reader.read(1 << 18)
+        if not data:
+            break
+        received += len(data)
+    elapsed = time.perf_counter() - started
+    writer.close()
+    if received != total:
+        raise RuntimeError(f"received {received} of {total} bytes")
+    return elapsed
+
+
+async def measure(total: int, config: Optional[ProxyConfig]) -> float:
+    backend = await asyncio.start_server(
+        lambda r, w: serve_bulk(total, r, w), "127.0.0.1", BACKEND_PORT
+    )
+    service = None
+    port = BACKEND_PORT
+    if config is not None:
+        engine = FirewallEngine(default_action=MatchAction.ALLOW)
+        engine.logger.setLevel(logging.WARNING)
+        service = FirewallService(engine, config, asyncio.get_running_loop())
+        await service.start()
+        port = PROXY_PORT
+    try:
+        return await download(port, total)
+    finally:
+        if service is not None:
+            await service.stop()
+        backend.close()
+        await backend.wait_closed()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=128)
+    parser.add_argument("--read-size", type=int, default=65536, help="buffered 模式的读缓冲区大小")
+    args = parser.parse_args()
+    total = args.megabytes << 20
+
+    base = dict(
+        listen_host="127.0.0.1",
+        listen_port=PROXY_PORT,
+        target_port=BACKEND_PORT,
+        chunk_log="flow",
+    )
+    scenarios = [
+        ("direct", None),
+        ("stream, inspect all", ProxyConfig(**base)),
+        ("stream, inspect 4 KiB", ProxyConfig(**base, inspect_limit=4096)),
+        ("buffered, inspect all", ProxyConfig(**base, tcp_mode="buffered", read_size=args.read_size)),
+        (
+            "buffered, inspect 4 KiB",
+            ProxyConfig(**base, tcp_mode="buffered", read_size=args.read_size, inspect_limit=4096),
+        ),
+    ]
+    print(f"payload={args.megabytes} MiB buffered read_size={args.read_size}")
+    for name, config in scenarios:
+        elapsed = asyncio.run(measure(total, config))
+        print(f"{name:26s} {args.megabytes / elapsed:10.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
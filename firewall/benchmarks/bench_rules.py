@@ -0,0 +1,97 @@
+"""规则匹配微基准：1k 条规则下单个数据包的判决耗时。
+
+运行方式（在 ``firewall/`` 目录下）::
+
+    python -m benchmarks.bench_rules --rules 1000 --packets 2000
+
+对比两种路径：
+- ``compiled``：``FirewallRule.matches``，条件已预编译为整数比较；
+- ``parse-per-packet``：每次匹配都重新解析条件字符串（旧实现的开销）。
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from firewall.rules import (
+    FirewallRule,
+    MatchAction,
+    MatchProtocol,
+    PacketInfo,
+    _match_ip,
+    _match_port,
+)
+
+
+def build_rules(count: int, seed: int = 0) -> List[FirewallRule]:
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        rules.append(
+            FirewallRule(
+                name=f"rule-{i}",
+                action=MatchAction.DENY,
+                protocol=rng.choice(list(MatchProtocol)),
+                src_ip=f"10.{rng.randrange(256)}.{rng.randrange(256)}.0/24",
+                dst_port=f"{rng.randrange(1, 30000)}-{rng.randrange(30000, 65536)},{rng.randrange(1, 1024)}",
+            )
+        )
+    return rules
+
+
+def build_packets(count: int, seed: int = 1) -> List[PacketInfo]:
+    rng = random.Random(seed)
+    return [
+        PacketInfo(
+            MatchProtocol.TCP,
+            f"192.168.{rng.randrange(256)}.{rng.randrange(256)}",
+            rng.randrange(1024, 65536),
+            "127.0.0.1",
+            rng.randrange(1, 65536),
+        )
+        for _ in range(count)
+    ]
+
+
+def parse_per_packet(rule: FirewallRule, packet: PacketInfo) -> bool:
+    if rule.protocol is not MatchProtocol.ANY and packet.protocol is not rule.protocol:
+        return False
+    return (
+        _match_ip(packet.src_ip, rule.src_ip)
+        and _match_ip(packet.dst_ip, rule.dst_ip)
+        and _match_port(packet.src_port, rule.src_port)
+        and _match_port(packet.dst_port, rule.dst_port)
+    )
+
+
+def run(rules: List[FirewallRule], packets: List[PacketInfo], match: Callable[[FirewallRule, PacketInfo], bool]) -> float:
+    """返回每个数据包的平均耗时（微秒），数据包均不命中任何规则以覆盖全部规则。"""
+
+    start = time.perf_counter()
+    for packet in packets:
+        for rule in rules:
+            if match(rule, packet):
+                break
+    return (time.perf_counter() - start) / len(packets) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--packets", type=int, default=2000)
+    args = parser.parse_args()
+
+    rules = build_rules(args.rules)
+    packets = build_packets(args.packets)
+    compiled = run(rules, packets, FirewallRule.matches)
+    baseline = run(rules, packets[: max(1, args.packets // 10)], parse_per_packet)
+    print(f"rules={args.rules} packets={args.packets}")
+    print(f"compiled          {compiled:10.1f} us/packet")
+    print(f"parse-per-packet  {baseline:10.1f} us/packet")
+    print(f"speedup           {baseline / compiled:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
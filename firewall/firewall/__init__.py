@@ -3,6 +3,7 @@
 from .engine import FirewallEngine, FirewallLogRecord
 from .proxy import FirewallService, ProxyConfig
 from .rules import FirewallRule, MatchAction, MatchProtocol
+from .upstream import UpstreamTarget
 
 __all__ = [
     "FirewallEngine",
@@ -12,4 +13,5 @@ __all__ = [
     "FirewallRule",
     "MatchAction",
     "MatchProtocol",
+    "UpstreamTarget",
 ]
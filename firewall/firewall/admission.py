@@ -0,0 +1,143 @@
+"""连接准入控制：并发上限、按源 IP 的新建连接速率与连接超时。"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class AdmissionController:
+    """在规则判决之前对新连接做准入检查。
+
+    ``max_connections`` 为全局并发上限，``max_per_ip`` 为单个源 IP 的并发
+    上限，``rate_per_ip``/``burst_per_ip`` 为单个源 IP 新建连接的令牌桶
+    （每秒补充数与桶容量）；取 0 表示不限制。
+    """
+
+    # 令牌桶数量超过该值时回收已回满的桶
+    PRUNE_THRESHOLD = 10000
+
+    def __init__(
+        self,
+        max_connections: int = 0,
+        max_per_ip: int = 0,
+        rate_per_ip: float = 0.0,
+        burst_per_ip: int = 0,
+    ) -> None:
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.rate_per_ip = rate_per_ip
+        self.burst_per_ip = burst_per_ip or max(1, int(rate_per_ip))
+        self.active = 0
+        self._per_ip: Dict[str, int] = {}
+        # ip -> [令牌数, 上次补充时间]
+        self._buckets: Dict[str, List[float]] = {}
+        self.counters = {"admitted": 0, "global_limit": 0, "ip_limit": 0, "rate_limit": 0}
+
+    def admit(self, ip: str) -> Optional[str]:
+        """放行时登记连接并返回 ``None``，否则返回拒绝原因。"""
+
+        if self.max_connections and self.active >= self.max_connections:
+            return self._reject("global_limit")
+        if self.max_per_ip and self._per_ip.get(ip, 0) >= self.max_per_ip:
+            return self._reject("ip_limit")
+        if self.rate_per_ip and not self._consume(ip):
+            return self._reject("rate_limit")
+        self.active += 1
+        self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+        self.counters["admitted"] += 1
+        return None
+
+    def release(self, ip: str) -> None:
+        self.active -= 1
+        count = self._per_ip.get(ip, 0) - 1
+        if count > 0:
+            self._per_ip[ip] = count
+        else:
+            self._per_ip.pop(ip, None)
+
+    def _reject(self, reason: str) -> str:
+        self.counters[reason] += 1
+        return reason
+
+    def _consume(self, ip: str) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(ip)
+        if bucket is None:
+            if len(self._buckets) >= self.PRUNE_THRESHOLD:
+                self._prune(now)
+            bucket = self._buckets[ip] = [float(self.burst_per_ip), now]
+        else:
+            bucket[0] = min(self.burst_per_ip, bucket[0] + (now - bucket[1]) * self.rate_per_ip)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True
+        return False
+
+    def _prune(self, now: float) -> None:
+        full = [
+            ip
+            for ip, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate_per_ip >= self.burst_per_ip
+        ]
+        for ip in full:
+            del self._buckets[ip]
+        # 仍然过多时（大量源地址同时活跃）按创建顺序丢弃最早的一半，
+        # 避免之后每个新地址都触发一次全表扫描
+        excess = len(self._buckets) - self.PRUNE_THRESHOLD // 2
+        if excess > 0:
+            for ip in list(itertools.islice(self._buckets, excess)):
+                del self._buckets[ip]
+
+    def stats(self) -> dict:
+        return {"active": self.active, "sources": len(self._per_ip), **self.counters}
+
+
+class ConnectionTimer:
+    """单个连接的空闲超时与总时长限制，``touch`` 只记录时间，不重建定时器。"""
+
+    __slots__ = ("idle", "total", "on_timeout", "last_activity", "started", "_handle", "_loop")
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        idle: float,
+        total: float,
+        on_timeout: Callable[[str], None],
+    ) -> None:
+        self._loop = loop
+        self.idle = idle
+        self.total = total
+        self.on_timeout = on_timeout
+        self.started = self.last_activity = loop.time()
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._schedule()
+
+    def touch(self) -> None:
+        self.last_activity = self._loop.time()
+
+    def _schedule(self) -> None:
+        deadlines = []
+        if self.idle:
+            deadlines.append(self.last_activity + self.idle)
+        if self.total:
+            deadlines.append(self.started + self.total)
+        if deadlines:
+            self._handle = self._loop.call_at(min(deadlines), self._check)
+
+    def _check(self) -> None:
+        self._handle = None
+        now = self._loop.time()
+        if self.total and now >= self.started + self.total:
+            self.on_timeout("connection time limit")
+        elif self.idle and now >= self.last_activity + self.idle:
+            self.on_timeout("idle timeout")
+        else:
+            self._schedule()
+
+    def cancel(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
@@ -0,0 +1,173 @@
+"""无界面运行：从规则文件加载规则，处理信号并在规则文件变化时热加载。"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import signal
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from .engine import FirewallEngine
+from .proxy import FirewallService, ProxyConfig
+from .rules import MatchAction
+from .workers import WorkerPool
+
+
+def load_rule_file(path: Path) -> dict:
+    """读取 JSON 或 YAML（需要 PyYAML）规则文件，返回 ``FirewallEngine.restore`` 可用的快照。
+
+    文件内容可以是规则字典的列表，也可以是含 ``rules``/``whitelist``/
+    ``blacklist``/``default_action`` 的映射（与 ``FirewallEngine.snapshot`` 格式相同）。
+    """
+
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml  # type: ignore[import-untyped]
+        except ImportError as exc:
+            raise RuntimeError("PyYAML is required to read YAML rule files") from exc
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if data is None:
+        data = []
+    if isinstance(data, list):
+        data = {"rules": data}
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a list of rules or a mapping")
+    snapshot = {
+        "rules": list(data.get("rules") or []),
+        "whitelist": list(data.get("whitelist") or []),
+        "blacklist": list(data.get("blacklist") or []),
+    }
+    if "default_action" in data:
+        snapshot["default_action"] = data["default_action"]
+    return snapshot
+
+
+class FirewallDaemon:
+    """无界面运行防火墙。
+
+    规则文件在启动时加载（失败则不启动）；收到 SIGHUP 或轮询发现文件变化
+    （``watch_interval`` 秒一次，0 表示不轮询）时重新读取，并以
+    ``FirewallEngine.restore`` 整体替换规则集：新规则集完全解析成功后才
+    生效，已建立的连接不中断，之后的判决使用新规则；读取或解析失败时保留
+    原规则集。``workers`` 大于 0 时以 ``WorkerPool`` 多进程运行，新规则集由
+    它推送给各工作进程。SIGINT/SIGTERM 停止服务。
+    """
+
+    def __init__(
+        self,
+        engine: FirewallEngine,
+        config: ProxyConfig,
+        rules_path: Optional[Path] = None,
+        workers: int = 0,
+        watch_interval: float = 2.0,
+    ) -> None:
+        self.engine = engine
+        self.config = config
+        self.rules_path = Path(rules_path) if rules_path is not None else None
+        self.workers = workers
+        self.watch_interval = watch_interval
+        # 规则文件未指定默认动作时使用启动时的默认动作
+        self.default_action: MatchAction = engine.default_action
+        self.service: Optional[FirewallService] = None
+        self.pool: Optional[WorkerPool] = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self._stopped: Optional[asyncio.Event] = None
+        self._file_state: Optional[Tuple[int, int]] = None
+
+    def load_rules(self) -> None:
+        """读取规则文件并整体替换引擎的规则集，失败时抛出异常且规则集不变。"""
+
+        if self.rules_path is None:
+            return
+        state = self._stat()
+        snapshot = load_rule_file(self.rules_path)
+        snapshot.setdefault("default_action", self.default_action.value)
+        self.engine.restore(snapshot)
+        self._file_state = state
+        self.engine.logger.info(
+            "loaded %d rules from %s (whitelist %d, blacklist %d)",
+            len(self.engine.rules),
+            self.rules_path,
+            len(self.engine.whitelist),
+            len(self.engine.blacklist),
+        )
+
+    def reload(self) -> bool:
+        """热加载规则文件，返回是否成功；失败只记录错误。"""
+
+        try:
+            self.load_rules()
+        except Exception as exc:  # 任何解析错误都不应中断服务
+            self.reload_errors += 1
+            # 记下失败的文件状态，文件再次变化前不重复尝试
+            self._file_state = self._stat()
+            self.engine.logger.error("failed to reload rules from %s: %s", self.rules_path, exc)
+            return False
+        self.reloads += 1
+        return True
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        assert self.rules_path is not None
+        try:
+            info = self.rules_path.stat()
+        except OSError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def stop(self) -> None:
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def run(self) -> None:
+        """启动服务并运行到收到停止信号或调用 ``stop``。"""
+
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self.load_rules()
+        if self.workers > 0:
+            self.pool = WorkerPool(self.engine, self.config, self.workers)
+            self.pool.start()
+        else:
+            self.service = FirewallService(self.engine, self.config, loop)
+            await self.service.start()
+        installed = self._install_signal_handlers(loop)
+        watch = self.rules_path is not None and self.watch_interval > 0
+        try:
+            while not self._stopped.is_set():
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stopped.wait(), self.watch_interval if watch else None)
+                if watch and not self._stopped.is_set() and self._stat() not in (self._file_state, None):
+                    self.reload()
+        finally:
+            for signum in installed:
+                loop.remove_signal_handler(signum)
+            if self.service is not None:
+                await self.service.stop()
+                self.service = None
+            if self.pool is not None:
+                self.pool.stop()
+                self.pool = None
+            self.engine.flush_logs(timeout=5.0)
+
+    def _install_signal_handlers(self, loop: asyncio.AbstractEventLoop) -> list:
+        handlers: List[Tuple[signal.Signals, Callable[[], object]]] = [
+            (signal.SIGINT, self.stop),
+            (signal.SIGTERM, self.stop),
+        ]
+        if hasattr(signal, "SIGHUP") and self.rules_path is not None:
+            handlers.append((signal.SIGHUP, self.reload))
+        installed = []
+        for signum, handler in handlers:
+            try:
+                loop.add_signal_handler(signum, handler)
+            except (NotImplementedError, RuntimeError):
+                # Windows 等平台不支持，SIGINT 仍由 asyncio.run 转为 KeyboardInterrupt
+                continue
+            installed.append(signum)
+        return installed
@@ -1,14 +1,21 @@
 """防火墙规则引擎实现。"""
 from __future__ import annotations
 
-from collections import deque
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
+import json
 import logging
 from pathlib import Path
-from typing import Deque, Iterable, List, Optional, Tuple
+from time import perf_counter
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
 
+from .export import JsonlExporter
+from .index import RuleIndex
+from .logbuffer import LogRingBuffer
+from .logpipe import BufferedFileHandler, LogPipeline
+from .metrics import MetricsRegistry
 from .rules import AddressPattern, FirewallRule, MatchAction, PacketInfo
+from .verdict import VerdictCache
 
 
 @dataclass(slots=True)
@@ -36,12 +43,30 @@ class FirewallLogRecord:
 class FirewallEngine:
     """管理规则、白名单和黑名单，并对数据包进行判决。"""
 
-    def __init__(self, default_action: MatchAction = MatchAction.DENY, log_limit: int = 1000) -> None:
+    def __init__(
+        self,
+        default_action: MatchAction = MatchAction.DENY,
+        log_limit: int = 1000,
+        verdict_cache_size: int = 4096,
+        log_queue_size: int = 8192,
+        log_payload_bytes: int = 0,
+        metrics: bool = True,
+    ) -> None:
         self.rules: List[FirewallRule] = []
         self.whitelist: List[AddressPattern] = []
         self.blacklist: List[AddressPattern] = []
         self.default_action = default_action
-        self._log: Deque[FirewallLogRecord] = deque(maxlen=log_limit)
+        # 规则集代数：规则、名单或默认动作变化时递增，使索引与判决缓存失效
+        self.generation = 0
+        # 规则索引与构建时的代数，规则集变化后的首次判决时重建；GUI 线程修改规则时
+        # 事件循环线程可能正在构建，只有代数仍一致的索引才会被保存和使用
+        self._index: Optional[Tuple[int, RuleIndex]] = None
+        self.verdict_cache = VerdictCache(verdict_cache_size)
+        self._change_listeners: List[Callable[[], None]] = []
+        # 判决计数与耗时；为 None 时不统计
+        self.metrics: Optional[MetricsRegistry] = MetricsRegistry() if metrics else None
+        # 最近的日志按列存储，负载默认不保留（log_payload_bytes 为保留的前缀长度）
+        self._log = LogRingBuffer(log_limit, FirewallLogRecord, log_payload_bytes)
         self.logger = logging.getLogger("simple_firewall")
         if not self.logger.handlers:
             self.logger.setLevel(logging.INFO)
@@ -49,6 +74,9 @@ class FirewallEngine:
             formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
             handler.setFormatter(formatter)
             self.logger.addHandler(handler)
+        # 逐包日志经后台线程批量输出，事件循环中只做入队
+        self.log_pipeline = LogPipeline(capacity=log_queue_size)
+        self.log_pipeline.add_sink(self._write_log_batch)
 
     # 规则管理
     def add_rule(self, rule: FirewallRule, index: Optional[int] = None) -> None:
@@ -56,16 +84,19 @@ class FirewallEngine:
             self.rules.append(rule)
         else:
             self.rules.insert(index, rule)
+        self.invalidate_index()
 
     def remove_rule(self, name: str) -> bool:
         for i, rule in enumerate(self.rules):
             if rule.name == name:
                 del self.rules[i]
+                self.invalidate_index()
                 return True
         return False
 
     def clear_rules(self) -> None:
         self.rules.clear()
+        self.invalidate_index()
 
     def extend_rules(self, rules: Iterable[FirewallRule]) -> None:
         for rule in rules:
@@ -74,21 +105,120 @@ class FirewallEngine:
     # 白名单黑名单
     def add_whitelist(self, pattern: AddressPattern) -> None:
         self.whitelist.append(pattern)
+        self.invalidate_index()
 
     def add_blacklist(self, pattern: AddressPattern) -> None:
         self.blacklist.append(pattern)
+        self.invalidate_index()
 
     def clear_whitelist(self) -> None:
         self.whitelist.clear()
+        self.invalidate_index()
 
     def clear_blacklist(self) -> None:
         self.blacklist.clear()
+        self.invalidate_index()
 
     def set_default_action(self, action: MatchAction) -> None:
         self.default_action = action
+        self.invalidate_index()
+
+    def invalidate_index(self) -> None:
+        """规则集已变化；直接修改 ``rules``/名单列表或规则字段后需手动调用。"""
+
+        self.generation += 1
+        self._index = None
+        for listener in self._change_listeners:
+            listener()
+
+    def add_change_listener(self, listener: Callable[[], None]) -> None:
+        """规则集每次变化后调用 ``listener``（在修改规则的线程中）。"""
+
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: Callable[[], None]) -> None:
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+
+    def snapshot(self) -> dict:
+        """导出规则、名单与默认动作，结果可 JSON 序列化，用于同步到其他进程。"""
+
+        return {
+            "default_action": self.default_action.value,
+            "rules": [rule.as_dict() for rule in self.rules],
+            "whitelist": [item.as_dict() for item in self.whitelist],
+            "blacklist": [item.as_dict() for item in self.blacklist],
+        }
+
+    def restore(self, snapshot: dict) -> None:
+        """整体替换为 ``snapshot`` 描述的规则集；解析失败时原规则集保持不变。"""
+
+        default_action = MatchAction(snapshot.get("default_action", self.default_action.value))
+        rules = [_rule_from_dict(item) for item in snapshot.get("rules", [])]
+        whitelist = [AddressPattern(item.get("ip"), item.get("port")) for item in snapshot.get("whitelist", [])]
+        blacklist = [AddressPattern(item.get("ip"), item.get("port")) for item in snapshot.get("blacklist", [])]
+        self.rules, self.whitelist, self.blacklist = rules, whitelist, blacklist
+        self.default_action = default_action
+        self.invalidate_index()
 
     # 判决逻辑
     def evaluate(self, packet: PacketInfo) -> Tuple[MatchAction, Optional[FirewallRule], str]:
+        metrics = self.metrics
+        if metrics is None:
+            return self._evaluate(packet)
+        count = metrics.evaluations
+        metrics.evaluations = count + 1
+        if count % metrics.latency_sample:
+            verdict = self._evaluate(packet)
+        else:
+            hits = self.verdict_cache.hits
+            started = perf_counter()
+            verdict = self._evaluate(packet)
+            metrics.observe_latency(verdict, perf_counter() - started, self.verdict_cache.hits != hits)
+        metrics.count_verdict(verdict)
+        return verdict
+
+    def _evaluate(self, packet: PacketInfo) -> Tuple[MatchAction, Optional[FirewallRule], str]:
+        generation = self.generation
+        key = VerdictCache.key(packet)
+        cached = self.verdict_cache.get(key, generation)
+        if cached is not None:
+            return cached
+
+        built = self._index
+        if built is not None and built[0] == generation:
+            index = built[1]
+        else:
+            index = RuleIndex(self.rules, self.whitelist, self.blacklist)
+            # 构建期间规则集又发生变化时不保存，下一次判决按新规则集重建
+            if self.generation == generation:
+                self._index = (generation, index)
+        source, rule, cacheable = index.lookup(packet)
+        verdict: Tuple[MatchAction, Optional[FirewallRule], str]
+        if source is None:
+            verdict = (self.default_action, None, "default")
+        elif rule is not None:
+            verdict = (rule.action, rule, source)
+        else:
+            action = MatchAction.ALLOW if source == "whitelist" else MatchAction.DENY
+            verdict = (action, None, source)
+        if cacheable:
+            self.verdict_cache.put(key, verdict, generation)
+        return verdict
+
+    def cache_stats(self) -> dict:
+        """判决缓存的命中/未命中计数。"""
+
+        return self.verdict_cache.stats()
+
+    def metrics_snapshot(self) -> dict:
+        """判决相关指标的快照，未启用指标时为空字典。"""
+
+        return self.metrics.snapshot() if self.metrics is not None else {}
+
+    def evaluate_linear(self, packet: PacketInfo) -> Tuple[MatchAction, Optional[FirewallRule], str]:
+        """不使用索引的线性首个命中判决，作为索引结果的参照实现。"""
+
         for item in self.whitelist:
             if item.matches(packet):
                 return MatchAction.ALLOW, None, "whitelist"
@@ -102,15 +232,32 @@ class FirewallEngine:
 
     # 日志
     def log_packet(self, record: FirewallLogRecord) -> None:
-        self._log.append(record)
-        self.logger.info(
-            "%s %s -> %s by %s (%s)",
-            record.action.value,
-            f"{record.packet.src_ip}:{record.packet.src_port}",
-            f"{record.packet.dst_ip}:{record.packet.dst_port}",
-            record.rule_name,
-            record.message,
-        )
+        self._log.append(record.timestamp, record.packet, record.action, record.rule_name, record.message)
+        if record.packet.payload:
+            # 排队中的记录不应继续持有负载
+            record = replace(record, packet=replace(record.packet, payload=b""))
+        self.log_pipeline.submit(record)
+
+    def _write_log_batch(self, records: List[FirewallLogRecord]) -> None:
+        """在日志线程中把一批记录交给 logger，整批结束后再刷新处理器。"""
+
+        logger = self.logger
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        for record in records:
+            packet = record.packet
+            logger.info(
+                "%s %s:%s -> %s:%s by %s (%s)",
+                record.action.value,
+                packet.src_ip,
+                packet.src_port,
+                packet.dst_ip,
+                packet.dst_port,
+                record.rule_name,
+                record.message,
+            )
+        for handler in logger.handlers:
+            handler.flush()
 
     def create_log_record(
         self,
@@ -123,34 +270,67 @@ class FirewallEngine:
         self.log_packet(record)
         return record
 
-    def recent_logs(self) -> List[FirewallLogRecord]:
-        return list(self._log)
+    def recent_logs(self) -> Sequence[FirewallLogRecord]:
+        """返回最近日志的只读视图，记录在访问时才构造。"""
+
+        return self._log.view()
 
     def export_logs(self, path: Path) -> None:
         path.parent.mkdir(parents=True, exist_ok=True)
         with path.open("w", encoding="utf-8") as f:
             for record in self._log:
-                f.write(str(record.as_dict()) + "\n")
+                f.write(json.dumps(record.as_dict(), ensure_ascii=False) + "\n")
+
+    def attach_exporter(self, exporter: JsonlExporter) -> None:
+        """将日志持续导出到 ``exporter``（在日志线程中写入）。"""
+
+        self.log_pipeline.add_sink(exporter)
+
+    def detach_exporter(self, exporter: JsonlExporter) -> None:
+        """停止导出并关闭 ``exporter``。
+
+        已提交的记录先写入 ``exporter``；移除 sink 后再等待一次，日志线程中
+        可能仍持有旧 sink 列表的批次写完后才关闭。``JsonlExporter`` 自身也在
+        锁内检查是否已关闭。
+        """
+
+        self.flush_logs()
+        self.log_pipeline.remove_sink(exporter)
+        self.flush_logs()
+        exporter.close()
+
+    def log_stats(self) -> dict:
+        """日志管线的排队、写出与丢弃计数。"""
+
+        return self.log_pipeline.stats()
+
+    def flush_logs(self, timeout: Optional[float] = None) -> None:
+        """等待已提交的日志全部写出。"""
+
+        self.log_pipeline.flush(timeout)
 
     def attach_file_logger(self, path: Path) -> None:
-        file_handler = logging.FileHandler(path, encoding="utf-8")
+        file_handler = BufferedFileHandler(path, encoding="utf-8")
         file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
         self.logger.addHandler(file_handler)
 
     def load_rules_from_dicts(self, items: Iterable[dict]) -> None:
         for item in items:
-            rule = FirewallRule(
-                name=item.get("name", "rule"),
-                action=MatchAction(item.get("action", MatchAction.DENY.value)),
-                protocol=MatchProtocol(item.get("protocol", MatchProtocol.ANY.value)),
-                src_ip=item.get("src_ip"),
-                src_port=item.get("src_port"),
-                dst_ip=item.get("dst_ip"),
-                dst_port=item.get("dst_port"),
-                pattern=item.get("pattern"),
-                description=item.get("description", ""),
-            )
-            self.add_rule(rule)
+            self.add_rule(_rule_from_dict(item))
+
+
+def _rule_from_dict(item: dict) -> FirewallRule:
+    return FirewallRule(
+        name=item.get("name", "rule"),
+        action=MatchAction(item.get("action", MatchAction.DENY.value)),
+        protocol=MatchProtocol(item.get("protocol", MatchProtocol.ANY.value)),
+        src_ip=item.get("src_ip"),
+        src_port=item.get("src_port"),
+        dst_ip=item.get("dst_ip"),
+        dst_port=item.get("dst_port"),
+        pattern=item.get("pattern"),
+        description=item.get("description", ""),
+    )
 
 
 # 避免循环导入
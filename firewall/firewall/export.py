@@ -0,0 +1,160 @@
+"""日志的流式 JSON Lines 导出与读取。"""
+from __future__ import annotations
+
+import gzip
+import json
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Iterator, List, Optional, Sequence, Tuple
+
+_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+
+class JsonlExporter:
+    """把日志记录增量写入按大小/时间轮转的 JSON Lines 分段文件。
+
+    作为 ``LogPipeline`` 的 sink 在日志线程中运行，每批记录写入一次。分段
+    文件名为 ``{prefix}-{首条记录时间}-{序号}.jsonl``，超过 ``max_bytes`` 或
+    打开超过 ``max_seconds`` 秒后轮转；``compress`` 为真时轮转出的分段压缩为
+    ``.jsonl.gz``。写入、轮转与关闭在同一把锁内进行，关闭后到达的批次被丢弃。
+    分段按首条记录时间排列，``read_exported_logs`` 据此按文件名
+    跳过时间范围之外的分段；分段内记录的时间不保证单调（批次之间可能交错）。
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        prefix: str = "firewall",
+        max_bytes: int = 64 * 1024 * 1024,
+        max_seconds: float = 3600,
+        compress: bool = True,
+    ) -> None:
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compress = compress
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file: Optional[IO[str]] = None
+        self._path: Optional[Path] = None
+        self._opened_at: Optional[datetime] = None
+        self._size = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.segments = 0
+        self.records = 0
+
+    def __call__(self, records: List) -> None:
+        self.write_batch(records)
+
+    def write_batch(self, records: Sequence) -> None:
+        if not records:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._write(records)
+
+    def _write(self, records: Sequence) -> None:
+        first = records[0].timestamp
+        if self._file is not None and self._should_rotate(first):
+            self._rotate()
+        if self._file is None:
+            self._open(first)
+        data = "".join(json.dumps(record.as_dict(), ensure_ascii=False) + "\n" for record in records)
+        self._file.write(data)  # type: ignore[union-attr]
+        self._file.flush()  # type: ignore[union-attr]
+        self._size += len(data.encode("utf-8"))
+        self.records += len(records)
+
+    def _should_rotate(self, now: datetime) -> bool:
+        if self._size >= self.max_bytes:
+            return True
+        return self._opened_at is not None and (now - self._opened_at).total_seconds() >= self.max_seconds
+
+    def _open(self, started: datetime) -> None:
+        while True:
+            name = f"{self.prefix}-{started:{_TIME_FORMAT}}-{self._sequence:04d}.jsonl"
+            self._sequence += 1
+            path = self.directory / name
+            if not path.exists() and not path.with_suffix(".jsonl.gz").exists():
+                break
+        self._path = path
+        self._file = path.open("w", encoding="utf-8")
+        self._opened_at = started
+        self._size = 0
+        self.segments += 1
+
+    def rotate(self) -> None:
+        """关闭当前分段（按配置压缩），下一批记录写入新分段。"""
+
+        with self._lock:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        path = self._path
+        self._file = None
+        self._path = None
+        if self.compress and path is not None:
+            compressed = path.with_suffix(".jsonl.gz")
+            with path.open("rb") as src, gzip.open(compressed, "wb") as dst:
+                while chunk := src.read(1 << 20):
+                    dst.write(chunk)
+            path.unlink()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._rotate()
+
+
+def list_segments(directory: Path, prefix: str = "firewall") -> List[Tuple[datetime, Path]]:
+    """按起始时间返回导出目录中的分段文件。"""
+
+    pattern = re.compile(rf"^{re.escape(prefix)}-(\d{{8}}T\d{{6}})-(\d+)\.jsonl(\.gz)?$")
+    segments = []
+    for path in Path(directory).iterdir():
+        match = pattern.match(path.name)
+        if match:
+            started = datetime.strptime(match.group(1), _TIME_FORMAT)
+            segments.append((started, int(match.group(2)), path))
+    segments.sort(key=lambda item: (item[0], item[1]))
+    return [(started, path) for started, _, path in segments]
+
+
+def read_exported_logs(
+    directory: Path,
+    prefix: str = "firewall",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[dict]:
+    """逐行读取导出的日志，只返回 ``start <= timestamp <= end`` 的记录。
+
+    是否打开分段只看文件名中的时间：起始时间晚于 ``end``、或下一分段起始
+    时间早于 ``start`` 的分段不会被打开；分段内逐条过滤，不假设记录有序。
+    """
+
+    segments = list_segments(directory, prefix)
+    for i, (started, path) in enumerate(segments):
+        if end is not None and started > end:
+            break
+        if start is not None and i + 1 < len(segments) and segments[i + 1][0] < start:
+            continue
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                timestamp = datetime.fromisoformat(item["timestamp"])
+                if end is not None and timestamp > end:
+                    continue
+                if start is not None and timestamp < start:
+                    continue
+                yield item
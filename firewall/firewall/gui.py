@@ -5,6 +5,7 @@ import asyncio
 import threading
 import tkinter as tk
 from concurrent.futures import Future
+from dataclasses import replace
 from tkinter import messagebox, simpledialog, ttk
 from typing import Any, Coroutine, Optional
 
@@ -136,7 +137,9 @@ class FirewallApp:
     # 防火墙控制
     def _collect_config(self) -> Optional[ProxyConfig]:
         try:
-            return ProxyConfig(
+            # 保留界面上未暴露的配置项（检测窗口等）
+            return replace(
+                self.config,
                 listen_host=self.listen_host_var.get(),
                 listen_port=int(self.listen_port_var.get()),
                 target_host=self.target_host_var.get(),
@@ -0,0 +1,212 @@
+"""规则索引：在规则集变化时构建，用位图快速筛选候选规则。"""
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .payload import PayloadMatcher
+from .rules import (
+    AddressPattern,
+    FirewallRule,
+    IPCondition,
+    MatchProtocol,
+    PacketInfo,
+    PortCondition,
+    _ip_key,
+)
+
+
+class _IPIndex:
+    """IP 维度索引。
+
+    每条规则对应位图中的一位。CIDR 条件按 ``(version, mask)`` 分组存入哈希表
+    （等价于按前缀长度分层的前缀树），查询时对每个出现过的前缀长度做一次
+    按位与和字典查找；非 CIDR 条件按字符串精确查找。
+    """
+
+    __slots__ = ("wildcard", "exact", "prefixes")
+
+    def __init__(self) -> None:
+        self.wildcard = 0
+        self.exact: Dict[str, int] = {}
+        self.prefixes: List[Tuple[int, int, Dict[int, int]]] = []
+
+    def add(self, bit: int, cond: Optional[IPCondition]) -> None:
+        if cond is None:
+            self.wildcard |= bit
+        elif cond.text is not None:
+            self.exact[cond.text] = self.exact.get(cond.text, 0) | bit
+        elif cond.valid:
+            for version, mask, table in self.prefixes:
+                if version == cond.version and mask == cond.mask:
+                    break
+            else:
+                table = {}
+                self.prefixes.append((cond.version, cond.mask, table))
+            table[cond.network] = table.get(cond.network, 0) | bit
+
+    def lookup(self, value: str) -> int:
+        bits = self.wildcard
+        if self.exact:
+            bits |= self.exact.get(value, 0)
+        if self.prefixes:
+            key = _ip_key(value)
+            if key is not None:
+                version, address = key
+                for prefix_version, mask, table in self.prefixes:
+                    if prefix_version == version:
+                        bits |= table.get(address & mask, 0)
+        return bits
+
+
+class _PortIndex:
+    """端口维度索引：把所有区间端点切分为互不重叠的基本区间，每段预计算位图。"""
+
+    __slots__ = ("wildcard", "bounds", "masks", "_events")
+
+    def __init__(self) -> None:
+        self.wildcard = 0
+        self.bounds: List[int] = []
+        self.masks: List[int] = []
+        self._events: Dict[int, int] = {}
+
+    def add(self, bit: int, cond: Optional[PortCondition]) -> None:
+        if cond is None:
+            self.wildcard |= bit
+            return
+        # 同一条件内的区间已合并且互不重叠，起点置位、终点后一位清位即可
+        for start, end in zip(cond.starts, cond.ends):
+            self._events[start] = self._events.get(start, 0) ^ bit
+            self._events[end + 1] = self._events.get(end + 1, 0) ^ bit
+
+    def build(self) -> None:
+        running = 0
+        for point in sorted(self._events):
+            running ^= self._events[point]
+            self.bounds.append(point)
+            self.masks.append(running)
+        self._events = {}
+
+    def lookup(self, value: int) -> int:
+        index = bisect_right(self.bounds, value) - 1
+        if index < 0:
+            return self.wildcard
+        return self.wildcard | self.masks[index]
+
+
+class _AddressIndex:
+    """白名单/黑名单索引（源 IP + 源端口），只关心是否存在命中项。"""
+
+    __slots__ = ("ip", "port", "empty")
+
+    def __init__(self, patterns: Sequence[AddressPattern]) -> None:
+        self.ip = _IPIndex()
+        self.port = _PortIndex()
+        self.empty = not patterns
+        for i, pattern in enumerate(patterns):
+            bit = 1 << i
+            self.ip.add(bit, pattern._ip_cond)
+            self.port.add(bit, pattern._port_cond)
+        self.port.build()
+
+    def matches(self, packet: PacketInfo) -> bool:
+        if self.empty:
+            return False
+        bits = self.ip.lookup(packet.src_ip)
+        return bool(bits and bits & self.port.lookup(packet.src_port))
+
+
+class RuleIndex:
+    """白名单、黑名单与规则列表的组合索引。
+
+    每个维度（协议、源/目的 IP、源/目的端口）各返回一个“可能命中”的规则
+    位图，按位与后从最低位（优先级最高、即列表中最靠前的规则）开始逐个确认，
+    因此与线性首个命中语义完全一致。带内容特征的规则在确认阶段才匹配负载，
+    且每个数据包只调用一次 ``PayloadMatcher``，得到全部命中特征的规则。
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[FirewallRule],
+        whitelist: Sequence[AddressPattern],
+        blacklist: Sequence[AddressPattern],
+    ) -> None:
+        self.rules = list(rules)
+        self.whitelist = _AddressIndex(whitelist)
+        self.blacklist = _AddressIndex(blacklist)
+        self.protocols: Dict[MatchProtocol, int] = {protocol: 0 for protocol in MatchProtocol}
+        self.src_ip = _IPIndex()
+        self.dst_ip = _IPIndex()
+        self.src_port = _PortIndex()
+        self.dst_port = _PortIndex()
+        any_bits = 0
+        for i, rule in enumerate(self.rules):
+            bit = 1 << i
+            if rule.protocol is MatchProtocol.ANY:
+                any_bits |= bit
+            else:
+                self.protocols[rule.protocol] |= bit
+            self.src_ip.add(bit, rule._src_ip_cond)
+            self.dst_ip.add(bit, rule._dst_ip_cond)
+            self.src_port.add(bit, rule._src_port_cond)
+            self.dst_port.add(bit, rule._dst_port_cond)
+        self.src_port.build()
+        self.dst_port.build()
+        self.payload_matcher = PayloadMatcher(
+            [(i, rule.pattern) for i, rule in enumerate(self.rules) if rule.pattern]
+        )
+        # ANY 协议的数据包只会命中 ANY 规则
+        for protocol in MatchProtocol:
+            if protocol is not MatchProtocol.ANY:
+                self.protocols[protocol] |= any_bits
+        self.protocols[MatchProtocol.ANY] = any_bits
+
+    def candidates(self, packet: PacketInfo) -> int:
+        """返回协议、IP、端口条件均满足的规则位图。"""
+
+        bits = self.protocols.get(packet.protocol, 0)
+        if bits:
+            bits &= self.src_ip.lookup(packet.src_ip)
+        if bits:
+            bits &= self.dst_ip.lookup(packet.dst_ip)
+        if bits:
+            bits &= self.src_port.lookup(packet.src_port)
+        if bits:
+            bits &= self.dst_port.lookup(packet.dst_port)
+        return bits
+
+    def first_match(self, packet: PacketInfo) -> Tuple[Optional[FirewallRule], bool]:
+        """返回首个命中的规则，以及判决是否依赖负载内容（途经带内容特征的候选规则）。"""
+
+        bits = self.candidates(packet)
+        payload_dependent = False
+        hits: Optional[Set[int]] = None
+        while bits:
+            lowest = bits & -bits
+            position = lowest.bit_length() - 1
+            rule = self.rules[position]
+            if not rule.pattern:
+                return rule, payload_dependent
+            payload_dependent = True
+            if hits is None:
+                hits = self.payload_matcher.hits(packet.payload)
+            if position in hits:
+                return rule, True
+            bits ^= lowest
+        return None, payload_dependent
+
+    def lookup(self, packet: PacketInfo) -> Tuple[Optional[str], Optional[FirewallRule], bool]:
+        """返回 ``(来源, 规则, 可缓存)``。
+
+        来源为 whitelist/blacklist/rule，未命中时为 ``None``；判决与负载无关时
+        才可按五元组缓存。
+        """
+
+        if self.whitelist.matches(packet):
+            return "whitelist", None, True
+        if self.blacklist.matches(packet):
+            return "blacklist", None, True
+        rule, payload_dependent = self.first_match(packet)
+        if rule is not None:
+            return "rule", rule, not payload_dependent
+        return None, None, not payload_dependent
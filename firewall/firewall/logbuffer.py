@@ -0,0 +1,261 @@
+"""按列存储的定长日志环形缓冲区。"""
+from __future__ import annotations
+
+import socket
+import sys
+from array import array
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .rules import MatchAction, MatchProtocol, PacketInfo, _ip_key
+
+_PROTOCOLS = list(MatchProtocol)
+_PROTOCOL_IDS = {protocol: i for i, protocol in enumerate(_PROTOCOLS)}
+_ACTIONS = list(MatchAction)
+_ACTION_IDS = {action: i for i, action in enumerate(_ACTIONS)}
+# IP 列中 IPv4 直接存整数，其他地址存 _STRING_BASE + 字符串表编号
+_STRING_BASE = 1 << 32
+
+# 每条记录占用的列字节数：序号 8 + 时间戳 8 + 两个 IP 16 + 两个端口 4 + 协议/动作 2 + 规则/消息编号 8
+ROW_BYTES = 46
+# 序号列中表示槽位正在写入或尚未写入
+_WRITING = -1
+
+
+class LogRingBuffer:
+    """防火墙日志的列式环形缓冲区。
+
+    每个字段一个预分配的 ``array`` 列：时间戳、IPv4 地址（整数）、端口、
+    协议/动作编号以及规则名与消息在字符串表中的编号，每条记录固定
+    ``ROW_BYTES`` 字节，另加可选的截断负载。规则名、消息和非 IPv4 地址
+    通过带引用计数的字符串表去重：记录被覆盖时释放不再被引用的字符串，
+    编号回收复用，表的大小只取决于存活记录，写入始终为 O(1)。
+
+    同一时刻只有一个线程写入：单进程运行时为事件循环线程，多进程运行时
+    为父进程中收集工作进程日志的线程。读取方（如 GUI 线程、导出）通过
+    ``view`` 取得快照视图，访问时才构造 ``FirewallLogRecord``。每个槽位记录
+    所存记录的序号，写入期间标记为 ``_WRITING``；读取前后各核对一次序号，
+    读到写了一半或已被覆盖的记录时丢弃。
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        make_record: Callable[[datetime, PacketInfo, MatchAction, str, str], Any],
+        payload_bytes: int = 0,
+    ) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.payload_bytes = payload_bytes
+        self._make_record = make_record
+        self._seq = array("q", [_WRITING]) * capacity
+        self._ts = array("d", [0.0]) * capacity
+        self._src_ip = array("Q", [0]) * capacity
+        self._dst_ip = array("Q", [0]) * capacity
+        self._src_port = array("H", [0]) * capacity
+        self._dst_port = array("H", [0]) * capacity
+        self._protocol = array("B", [0]) * capacity
+        self._action = array("B", [0]) * capacity
+        self._rule = array("I", [0]) * capacity
+        self._message = array("I", [0]) * capacity
+        self._payloads: Optional[List[bytes]] = [b""] * capacity if payload_bytes > 0 else None
+        self._string_ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+        # 每个编号被存活记录引用的次数，归零的编号进入空闲列表
+        self._string_refs = array("I")
+        self._free_ids: List[int] = []
+        self._string_bytes = 0
+        self._payload_bytes = 0
+        # 累计写入的记录数，序号 seq 的记录位于 seq % capacity
+        self.written = 0
+
+    def __len__(self) -> int:
+        return min(self.written, self.capacity)
+
+    def memory_bytes(self) -> int:
+        """列存储、字符串表与负载占用的字节数（估算）。"""
+
+        total = self.capacity * ROW_BYTES + self._string_bytes + self._payload_bytes
+        total += sys.getsizeof(self._string_ids) + sys.getsizeof(self._strings)
+        total += self._string_refs.itemsize * len(self._string_refs)
+        if self._payloads is not None:
+            total += sys.getsizeof(self._payloads)
+        return total
+
+    # 写入
+    def _intern(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            return self._add_string(value)
+        self._string_refs[string_id] += 1
+        return string_id
+
+    def _add_string(self, value: str) -> int:
+        if self._free_ids:
+            string_id = self._free_ids.pop()
+            self._strings[string_id] = value
+            self._string_refs[string_id] = 1
+        else:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_refs.append(1)
+        self._string_ids[value] = string_id
+        self._string_bytes += sys.getsizeof(value)
+        return string_id
+
+    def _free_string(self, string_id: int) -> None:
+        value = self._strings[string_id]
+        del self._string_ids[value]
+        self._strings[string_id] = ""
+        self._free_ids.append(string_id)
+        self._string_bytes -= sys.getsizeof(value)
+
+    def _release(self, string_id: int) -> None:
+        refs = self._string_refs[string_id] - 1
+        self._string_refs[string_id] = refs
+        if not refs:
+            self._free_string(string_id)
+
+    def _replace(self, old_id: int, value: str) -> int:
+        """覆盖记录时替换字符串引用；与被覆盖的字符串相同时不改动计数。"""
+
+        if self._strings[old_id] == value:
+            return old_id
+        string_id = self._intern(value)
+        self._release(old_id)
+        return string_id
+
+    def _pack_ip(self, value: str) -> int:
+        key = _ip_key(value)
+        if key is not None and key[0] == 4:
+            return key[1]
+        return _STRING_BASE + self._intern(value)
+
+    def _replace_ip(self, old: int, value: str) -> int:
+        key = _ip_key(value)
+        if key is not None and key[0] == 4:
+            if old >= _STRING_BASE:
+                self._release(old - _STRING_BASE)
+            return key[1]
+        if old >= _STRING_BASE:
+            return _STRING_BASE + self._replace(old - _STRING_BASE, value)
+        return _STRING_BASE + self._intern(value)
+
+    def append(self, timestamp: datetime, packet: PacketInfo, action: MatchAction, rule_name: str, message: str) -> None:
+        seq = self.written
+        slot = seq % self.capacity
+        self._seq[slot] = _WRITING
+        if seq < self.capacity:
+            self._src_ip[slot] = self._pack_ip(packet.src_ip)
+            self._dst_ip[slot] = self._pack_ip(packet.dst_ip)
+            self._rule[slot] = self._intern(rule_name)
+            self._message[slot] = self._intern(message)
+        else:
+            # 覆盖旧记录：先登记新字符串再释放旧字符串，相同的字符串不会被移出后重新加入
+            self._src_ip[slot] = self._replace_ip(self._src_ip[slot], packet.src_ip)
+            self._dst_ip[slot] = self._replace_ip(self._dst_ip[slot], packet.dst_ip)
+            self._rule[slot] = self._replace(self._rule[slot], rule_name)
+            self._message[slot] = self._replace(self._message[slot], message)
+        self._ts[slot] = timestamp.timestamp()
+        self._src_port[slot] = packet.src_port
+        self._dst_port[slot] = packet.dst_port
+        self._protocol[slot] = _PROTOCOL_IDS[packet.protocol]
+        self._action[slot] = _ACTION_IDS[action]
+        if self._payloads is not None:
+            payload = packet.payload[: self.payload_bytes]
+            self._payload_bytes += len(payload) - len(self._payloads[slot])
+            self._payloads[slot] = payload
+        self._seq[slot] = seq
+        self.written = seq + 1
+
+    def clear(self) -> None:
+        self.written = 0
+        self._seq = array("q", [_WRITING]) * self.capacity
+        self._string_ids.clear()
+        self._strings.clear()
+        self._string_refs = array("I")
+        self._free_ids.clear()
+        self._string_bytes = 0
+        self._payload_bytes = 0
+        if self._payloads is not None:
+            self._payloads = [b""] * self.capacity
+
+    # 读取
+    def _unpack_ip(self, value: int) -> str:
+        if value >= _STRING_BASE:
+            return self._strings[value - _STRING_BASE]
+        return socket.inet_ntoa(value.to_bytes(4, "big"))
+
+    def record(self, seq: int) -> Any:
+        """按序号构造一条记录；记录已被覆盖或尚未写入时抛出 ``IndexError``。"""
+
+        if seq < 0:
+            raise IndexError(seq)
+        slot = seq % self.capacity
+        if self._seq[slot] != seq:
+            raise IndexError(seq)
+        try:
+            packet = PacketInfo(
+                _PROTOCOLS[self._protocol[slot]],
+                self._unpack_ip(self._src_ip[slot]),
+                self._src_port[slot],
+                self._unpack_ip(self._dst_ip[slot]),
+                self._dst_port[slot],
+                self._payloads[slot] if self._payloads is not None else b"",
+            )
+            result = self._make_record(
+                datetime.fromtimestamp(self._ts[slot]),
+                packet,
+                _ACTIONS[self._action[slot]],
+                self._strings[self._rule[slot]],
+                self._strings[self._message[slot]],
+            )
+        except (IndexError, ValueError, OSError):
+            # 读取期间字符串编号被回收或地址列被改写
+            result = None
+        # 读取期间槽位开始写入或已被覆盖时丢弃
+        if result is None or self._seq[slot] != seq:
+            raise IndexError(seq)
+        return result
+
+    def view(self) -> "LogView":
+        return LogView(self, max(0, self.written - self.capacity), self.written)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.view())
+
+
+class LogView(Sequence):
+    """环形缓冲区在某一时刻的只读视图，元素在访问时才构造。"""
+
+    __slots__ = ("_buffer", "_start", "_stop")
+
+    def __init__(self, buffer: LogRingBuffer, start: int, stop: int) -> None:
+        self._buffer = buffer
+        self._start = start
+        self._stop = stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return LogView(self._buffer, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._buffer.record(self._start + index)
+
+    def __iter__(self) -> Iterator[Any]:
+        # 跳过迭代过程中被覆盖的记录
+        for seq in range(max(self._start, self._buffer.written - self._buffer.capacity), self._stop):
+            try:
+                yield self._buffer.record(seq)
+            except IndexError:
+                continue
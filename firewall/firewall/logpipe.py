@@ -0,0 +1,144 @@
+"""日志输出管线：把逐包日志的格式化与写盘移出事件循环。"""
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional
+
+Sink = Callable[[List[Any]], None]
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """逐条写入但不立即刷盘的文件处理器，由 ``LogPipeline`` 在每批结束后统一 ``flush``。"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:  # pragma: no cover - 与 logging 的错误处理保持一致
+            self.handleError(record)
+
+
+class LogPipeline:
+    """有界环形缓冲 + 后台写线程。
+
+    ``submit`` 只在缓冲区追加一条记录，不做格式化和 I/O，缓冲区满时丢弃
+    新记录并计数；后台线程每攒满 ``batch_size`` 条或每隔 ``flush_interval``
+    秒取出一批，依次交给各个 sink（如 logger 输出、文件导出）。
+    """
+
+    def __init__(
+        self,
+        capacity: int = 8192,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+    ) -> None:
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: Deque[Any] = deque()
+        self._sinks: List[Sink] = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    def add_sink(self, sink: Sink) -> None:
+        self._sinks = [*self._sinks, sink]
+
+    def remove_sink(self, sink: Sink) -> None:
+        self._sinks = [item for item in self._sinks if item != sink]
+
+    def submit(self, item: Any) -> bool:
+        """放入一条待输出的日志；缓冲区已满时返回 ``False``。"""
+
+        if self._closed:
+            # 管线已关闭（如解释器退出阶段），直接同步输出
+            self._emit([item])
+            return True
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            return False
+        self._buffer.append(item)
+        self.submitted += 1
+        if self._thread is None:
+            self._start()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(target=self._run, name="firewall-log-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+            if self._closed and not self._buffer:
+                return
+
+    def _emit(self, batch: List[Any]) -> None:
+        for sink in self._sinks:
+            try:
+                sink(batch)
+            except Exception:  # pragma: no cover - 单个 sink 出错不影响其他输出
+                self.errors += 1
+                logging.getLogger("simple_firewall").exception("log sink failed")
+
+    def _drain(self) -> None:
+        buffer = self._buffer
+        while buffer:
+            batch: List[Any] = []
+            while buffer and len(batch) < self.batch_size:
+                batch.append(buffer.popleft())
+            self._emit(batch)
+            with self._written:
+                self.written += len(batch)
+                self.batches += 1
+                self._written.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """等待当前缓冲区中的记录全部写出。"""
+
+        thread = self._thread
+        if thread is None:
+            return
+        target = self.submitted
+        self._wakeup.set()
+        with self._written:
+            self._written.wait_for(lambda: self.written >= target or not thread.is_alive(), timeout)
+
+    def close(self) -> None:
+        """写出剩余记录并停止后台线程。"""
+
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._wakeup.set()
+            thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._buffer),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
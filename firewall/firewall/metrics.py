@@ -0,0 +1,300 @@
+"""运行指标：规则命中、判决计数、转发字节、活动连接与判决耗时直方图。"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+# 判决耗时直方图的桶上界（秒）：1 微秒到 10 毫秒
+LATENCY_BUCKETS = (
+    1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2,
+)
+
+
+class Histogram:
+    """固定桶的直方图，``counts`` 比 ``buckets`` 多一项（超出最大上界）。"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        return {"buckets": list(self.buckets), "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class MetricsRegistry:
+    """进程内的指标计数器。
+
+    计数在事件循环线程中更新，``snapshot`` 可在其他线程调用。每次判决都按
+    （命中的规则或 ``whitelist``/``blacklist``/``default``，动作）计数；判决
+    耗时每 ``latency_sample`` 次采样一次（计时本身的开销与一次缓存命中的
+    判决相当），按命中的规则分别统计，命中判决缓存的判决单独计入 ``cached``。
+    """
+
+    def __init__(self, latency_sample: int = 16, buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.latency_sample = max(1, latency_sample)
+        self.buckets = tuple(buckets)
+        self.evaluations = 0
+        # (id(规则) 或来源名, MatchAction) -> 次数
+        self.verdicts: Dict[tuple, int] = {}
+        # id(规则) -> 规则，保持引用使 id 在快照前不被复用
+        self._rules: Dict[int, Any] = {}
+        self.bytes: Dict[str, Dict[str, int]] = {}
+        self.connections = {"active": 0, "total": 0}
+        self.cached_latency = Histogram(self.buckets)
+        self.rule_latency: Dict[Union[int, str], Histogram] = {}
+
+    def count_verdict(self, verdict: tuple) -> None:
+        action, rule, source = verdict
+        key = (id(rule) if rule else source, action)
+        verdicts = self.verdicts
+        count = verdicts.get(key)
+        if count is None:
+            if rule:
+                self._rules[key[0]] = rule
+            count = 0
+        verdicts[key] = count + 1
+
+    def observe_latency(self, verdict: tuple, seconds: float, cached: bool) -> None:
+        if cached:
+            self.cached_latency.observe(seconds)
+            return
+        rule, source = verdict[1], verdict[2]
+        key = id(rule) if rule else source
+        histogram = self.rule_latency.get(key)
+        if histogram is None:
+            if rule:
+                self._rules[key] = rule
+            histogram = self.rule_latency[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def add_bytes(self, protocol: str, direction: str, size: int) -> None:
+        counters = self.bytes.get(protocol)
+        if counters is None:
+            counters = self.bytes[protocol] = {}
+        counters[direction] = counters.get(direction, 0) + size
+
+    def connection_opened(self) -> None:
+        self.connections["active"] += 1
+        self.connections["total"] += 1
+
+    def connection_closed(self) -> None:
+        self.connections["active"] -= 1
+
+    def _series(self, key: Union[int, str], names: Dict[str, str]) -> str:
+        """把内部键换成跨进程一致的序列标识，并在 ``names`` 中记下对应的规则名。"""
+
+        if isinstance(key, str):
+            names[key] = key
+            return key
+        rule = self._rules[key]
+        series = rule_series_id(rule)
+        names[series] = rule.name
+        return series
+
+    def snapshot(self) -> dict:
+        names: Dict[str, str] = {}
+        rule_hits: Dict[str, int] = {}
+        actions: Dict[str, int] = {}
+        for (key, action), count in list(self.verdicts.items()):
+            series = self._series(key, names)
+            rule_hits[series] = rule_hits.get(series, 0) + count
+            actions[action.value] = actions.get(action.value, 0) + count
+        rules: Dict[str, dict] = {}
+        for key, histogram in list(self.rule_latency.items()):
+            data = histogram.snapshot()
+            series = self._series(key, names)
+            if series in rules:
+                # 内容相同的规则共用一个序列
+                _merge_into(rules[series], data)
+            else:
+                rules[series] = data
+        return {
+            "rule_hits": rule_hits,
+            "rule_names": names,
+            "actions": actions,
+            "bytes": {protocol: dict(counters) for protocol, counters in list(self.bytes.items())},
+            "connections": dict(self.connections),
+            "evaluate": {
+                "cached": self.cached_latency.snapshot(),
+                "rules": rules,
+            },
+        }
+
+    def slowest_rules(self, limit: int = 10) -> List[tuple]:
+        """按采样的累计判决耗时降序返回 ``(规则名, 采样次数, 累计秒数)``，用于调整规则顺序。
+
+        同名的不同规则各占一行。
+        """
+
+        rows = [
+            (self._rules[key].name if isinstance(key, int) else key, h.count, h.sum)
+            for key, h in list(self.rule_latency.items())
+        ]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+
+def rule_series_id(rule: Any) -> str:
+    """由规则内容得到的序列标识，在各工作进程与重新加载之间保持一致。"""
+
+    text = json.dumps(rule.as_dict(), sort_keys=True, ensure_ascii=False)
+    return "rule-" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def merge_snapshots(snapshots: Iterable[dict]) -> dict:
+    """合并多个进程的 ``snapshot``：数值与直方图计数逐项相加，标签取首次出现的值。"""
+
+    merged: dict = {}
+    for snapshot in snapshots:
+        _merge_into(merged, snapshot)
+    return merged
+
+
+def _merge_into(target: dict, source: dict) -> None:
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge_into(target.setdefault(key, {}), value)
+        elif key == "buckets" or isinstance(value, str):
+            target.setdefault(key, value)
+        elif isinstance(value, list):
+            current = target.get(key)
+            target[key] = [a + b for a, b in zip(current, value)] if current else list(value)
+        elif isinstance(value, (int, float)):
+            target[key] = target.get(key, 0) + value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _histogram_lines(name: str, labels: str, data: dict) -> List[str]:
+    lines = []
+    cumulative = 0
+    prefix = f"{labels}," if labels else ""
+    for bound, count in zip(data["buckets"], data["counts"]):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {data["count"]}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {data['sum']:.9f}")
+    lines.append(f"{name}_count{suffix} {data['count']}")
+    return lines
+
+
+def render_text(snapshot: dict) -> str:
+    """把 ``snapshot`` 渲染为 Prometheus 文本格式。"""
+
+    lines: List[str] = []
+
+    def header(name: str, kind: str, text: str) -> None:
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    names = snapshot.get("rule_names", {})
+
+    def rule_labels(series: str) -> str:
+        return f'rule_id="{_escape(series)}",rule="{_escape(names.get(series, series))}"'
+
+    header("firewall_rule_hits_total", "counter", "Verdicts by matched rule.")
+    for series, count in sorted(snapshot.get("rule_hits", {}).items()):
+        lines.append(f"firewall_rule_hits_total{{{rule_labels(series)}}} {count}")
+    header("firewall_verdicts_total", "counter", "Verdicts by action.")
+    for action, count in sorted(snapshot.get("actions", {}).items()):
+        lines.append(f'firewall_verdicts_total{{action="{action}"}} {count}')
+    header("firewall_forwarded_bytes_total", "counter", "Bytes forwarded by protocol and direction.")
+    for protocol, counters in sorted(snapshot.get("bytes", {}).items()):
+        for direction, count in sorted(counters.items()):
+            lines.append(f'firewall_forwarded_bytes_total{{protocol="{protocol}",direction="{direction}"}} {count}')
+    connections = snapshot.get("connections", {})
+    header("firewall_active_connections", "gauge", "Forwarded TCP connections currently open.")
+    lines.append(f"firewall_active_connections {connections.get('active', 0)}")
+    header("firewall_connections_total", "counter", "Forwarded TCP connections opened.")
+    lines.append(f"firewall_connections_total {connections.get('total', 0)}")
+    evaluate = snapshot.get("evaluate", {})
+    header("firewall_evaluate_seconds", "histogram", "Verdict latency by matched rule; cache hits use rule=\"(cached)\".")
+    if "cached" in evaluate:
+        lines.extend(_histogram_lines("firewall_evaluate_seconds", rule_labels("(cached)"), evaluate["cached"]))
+    for series, data in sorted(evaluate.get("rules", {}).items()):
+        lines.extend(_histogram_lines("firewall_evaluate_seconds", rule_labels(series), data))
+    # 其余分组（如准入计数）按 firewall_<分组>_<名称> 输出为 gauge
+    known = {"rule_hits", "rule_names", "actions", "bytes", "connections", "evaluate"}
+    for group, counters in sorted(snapshot.items()):
+        if group in known or not isinstance(counters, dict):
+            continue
+        for key, value in sorted(counters.items()):
+            if isinstance(value, (int, float)):
+                name = f"firewall_{group}_{key}"
+                header(name, "gauge", f"{group} {key}.")
+                lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """在后台线程中提供指标的本地 HTTP 接口。
+
+    ``GET /metrics`` 返回 Prometheus 文本格式，``GET /metrics.json`` 返回
+    ``source()`` 的 JSON。``port`` 为 0 时由系统分配端口（见 ``port`` 属性）。
+    """
+
+    def __init__(self, source: Callable[[], dict], host: str = "127.0.0.1", port: int = 9100) -> None:
+        self.source = source
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._server is not None:
+            return
+        source = self.source
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server 的回调命名
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = render_text(source()).encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(source(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # 不把每次抓取写到标准错误
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="firewall-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        server, self._server = self._server, None
+        if server is None:
+            return
+        server.shutdown()
+        server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
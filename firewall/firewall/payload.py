@@ -0,0 +1,97 @@
+"""内容特征的多模式匹配。"""
+from __future__ import annotations
+
+import logging
+import re
+from typing import List, Optional, Pattern, Sequence, Set, Tuple
+
+# 正则元字符；必需字面量前缀在遇到其中任何一个时结束
+_METACHARS = frozenset(".^$*+?{}[]\\|()")
+_QUANTIFIERS = frozenset("*+?{")
+# 字母转义（\s、\w、\d、\u、\N{...} 等）和内联标志在字节与文本正则中的含义不同，
+# 或在字节模式下无法编译；含有它们的特征总是解码后用文本正则匹配
+_TEXT_ONLY = re.compile(r"\\[A-Za-z]|\(\?[aiLmsux-]")
+
+
+def _required_prefix(pattern: str) -> str:
+    """返回任何匹配都必然包含的字面量前缀，无法确定时返回空串。
+
+    只做保守分析：含 ``|`` 的特征不提取（前缀可能只属于某个分支），
+    紧跟量词的最后一个字符不计入前缀。
+    """
+
+    if "|" in pattern:
+        return ""
+    end = 0
+    while end < len(pattern) and pattern[end] not in _METACHARS:
+        end += 1
+    if end < len(pattern) and pattern[end] in _QUANTIFIERS:
+        end -= 1
+    return pattern[:max(end, 0)]
+
+
+class _Entry:
+    __slots__ = ("rule_id", "literal_bytes", "literal_text", "regex_bytes", "regex_text")
+
+    def __init__(self, rule_id: int, pattern: str) -> None:
+        self.rule_id = rule_id
+        self.regex_text: Optional[Pattern[str]] = re.compile(pattern)
+        literal = _required_prefix(pattern)
+        if literal == pattern:
+            # 纯字面量特征只需子串查找
+            self.regex_text = None
+        self.literal_text = literal or None
+        self.literal_bytes = literal.encode("utf-8") if literal else None
+        self.regex_bytes: Optional[Pattern[bytes]] = None
+        if self.regex_text is not None and pattern.isascii() and not _TEXT_ONLY.search(pattern):
+            try:
+                self.regex_bytes = re.compile(pattern.encode("ascii"))
+            except re.error:
+                self.regex_bytes = None
+
+
+class PayloadMatcher:
+    """在规则集编译时构建的内容特征匹配器，``hits`` 返回命中的规则编号集合。
+
+    每条特征预先提取必需的字面量前缀，扫描时先用 C 实现的子串查找过滤，
+    只有前缀出现在负载中的特征才运行正则；纯字面量特征完全不经过正则。
+    负载为纯 ASCII 且特征在字节模式下语义相同（不含字母转义和内联标志）时
+    直接在字节上匹配，省去解码；否则与原实现一样按 UTF-8（忽略无效字节）
+    解码一次后匹配，两种方式的结果一致。
+    """
+
+    def __init__(self, patterns: Sequence[Tuple[int, str]]) -> None:
+        self._entries: List[_Entry] = []
+        for rule_id, pattern in patterns:
+            try:
+                self._entries.append(_Entry(rule_id, pattern))
+            except re.error as exc:
+                # 无效特征永不命中，避免一条坏规则导致所有判决失败
+                logging.getLogger("simple_firewall").warning("invalid pattern %r: %s", pattern, exc)
+
+    def hits(self, payload: bytes) -> Set[int]:
+        """返回特征命中该负载的规则编号。"""
+
+        found: Set[int] = set()
+        if not self._entries:
+            return found
+        ascii_only = payload.isascii()
+        text: Optional[str] = None
+        for entry in self._entries:
+            if ascii_only:
+                if entry.literal_bytes is not None and entry.literal_bytes not in payload:
+                    continue
+                if entry.regex_text is None:
+                    found.add(entry.rule_id)
+                    continue
+                if entry.regex_bytes is not None:
+                    if entry.regex_bytes.search(payload):
+                        found.add(entry.rule_id)
+                    continue
+            if text is None:
+                text = payload.decode("utf-8", "ignore")
+            if entry.literal_text is not None and entry.literal_text not in text:
+                continue
+            if entry.regex_text is None or entry.regex_text.search(text):
+                found.add(entry.rule_id)
+        return found
@@ -3,12 +3,18 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import time
+from collections import OrderedDict
 from asyncio import StreamReader, StreamWriter
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple, cast
 
+from .admission import AdmissionController, ConnectionTimer
 from .engine import FirewallEngine
+from .metrics import MetricsServer
 from .rules import MatchAction, MatchProtocol, PacketInfo
+from .stream import StreamInspector
+from .upstream import Resolver, UpstreamPool, UpstreamTarget
 
 
 @dataclass
@@ -21,6 +27,129 @@ class ProxyConfig:
     target_port: int = 8000
     enable_tcp: bool = True
     enable_udp: bool = False
+    # 跨分片检测时保留的重叠字节数，0 表示逐分片独立检测
+    overlap_bytes: int = 1024
+    # 每个方向只检测前 N 字节，之后直接转发；0 表示检测全部数据
+    inspect_limit: int = 0
+    read_size: int = 4096
+    # 数据分片的日志方式：all 逐片记录；sample 每个流每 N 片记录一次；
+    # flow 不记录放行的分片。sample/flow 在流结束时补一条汇总记录
+    chunk_log: str = "all"
+    chunk_log_sample: int = 100
+    # stream: 基于 StreamReader/StreamWriter 的转发；buffered: 基于 BufferedProtocol，
+    # 复用读缓冲区并以暂停/恢复读取做流控，适合大流量转发（建议配合更大的 read_size）
+    tcp_mode: str = "stream"
+    # 以 SO_REUSEPORT 绑定监听端口，多个工作进程可同时监听（见 workers 模块）
+    reuse_port: bool = False
+    # UDP 会话（每个客户端地址一个上游端点）的空闲超时（秒）与数量上限
+    udp_session_timeout: float = 60.0
+    udp_max_sessions: int = 1024
+    # TCP 后端目标列表，按最少连接/权重分配；为空时使用 target_host:target_port。
+    # UDP 始终使用 target_host:target_port
+    upstreams: List[UpstreamTarget] = field(default_factory=list)
+    # 后端主机名解析结果的缓存时间（秒）
+    dns_ttl: float = 30.0
+    # 每个后端目标保持的预建连接数，0 表示不预建
+    prewarm_connections: int = 0
+    connect_timeout: float = 5.0
+    # 连续连接失败多少次后将目标标记为不可用，以及不可用的时长（秒）
+    upstream_fail_threshold: int = 3
+    upstream_cooldown: float = 10.0
+    # TCP 连接准入：全局与单个源 IP 的并发连接上限，单个源 IP 每秒新建连接数
+    # 及突发上限（默认等于每秒连接数）；0 表示不限制
+    max_connections: int = 0
+    max_connections_per_ip: int = 0
+    connection_rate_per_ip: float = 0.0
+    connection_burst_per_ip: int = 0
+    # TCP 连接两个方向都没有数据超过 idle_timeout 秒、或建立超过 max_connection_time
+    # 秒后关闭；0 表示不限制
+    idle_timeout: float = 0.0
+    max_connection_time: float = 0.0
+    # 大于 0 时在该端口提供指标的 HTTP 接口（/metrics 文本格式，/metrics.json）
+    metrics_port: int = 0
+    metrics_host: str = "127.0.0.1"
+
+    def __post_init__(self) -> None:
+        if self.chunk_log not in _CHUNK_LOG_MODES:
+            raise ValueError(f"unknown chunk_log mode: {self.chunk_log}")
+        if self.tcp_mode not in _TCP_MODES:
+            raise ValueError(f"unknown tcp_mode: {self.tcp_mode}")
+
+    def upstream_targets(self) -> List[UpstreamTarget]:
+        return list(self.upstreams) or [UpstreamTarget(self.target_host, self.target_port)]
+
+
+_CHUNK_LOG_MODES = ("all", "sample", "flow")
+_TCP_MODES = ("stream", "buffered")
+
+
+class _FlowDirection:
+    """单个 TCP 流方向的内容检测、分片计数与日志抽样，两种转发模式共用。"""
+
+    __slots__ = (
+        "engine", "metrics", "direction", "flow", "inspector", "mode", "sample", "chunks", "bytes", "action", "rule_name",
+    )
+
+    def __init__(
+        self, engine: FirewallEngine, config: ProxyConfig, direction: str, flow: Tuple[str, int, str, int]
+    ) -> None:
+        self.engine = engine
+        self.metrics = engine.metrics
+        self.direction = direction
+        self.flow = flow
+        self.inspector = StreamInspector(config.overlap_bytes, config.inspect_limit)
+        self.mode = config.chunk_log
+        self.sample = max(1, config.chunk_log_sample)
+        self.chunks = 0
+        self.bytes = 0
+        self.action = MatchAction.ALLOW
+        self.rule_name = "flow"
+
+    def _count(self, size: int) -> bool:
+        """计入一个放行的分片，返回是否需要为它单独记录日志。"""
+
+        self.chunks += 1
+        self.bytes += size
+        if self.metrics is not None:
+            self.metrics.add_bytes("tcp", self.direction, size)
+        if self.mode == "all":
+            return True
+        return self.mode == "sample" and self.chunks % self.sample == 1 % self.sample
+
+    def allow(self, data) -> bool:
+        """检测一个分片（``bytes`` 或 ``memoryview``），返回是否放行。"""
+
+        inspector = self.inspector
+        if inspector.fast_path:
+            self._count(len(data))
+            return True
+        packet = PacketInfo(MatchProtocol.TCP, *self.flow, inspector.window(bytes(data)))
+        action, rule, source = self.engine.evaluate(packet)
+        rule_name = rule.name if rule else source
+        if action is not MatchAction.ALLOW:
+            # 拒绝总是单独记录
+            self.action, self.rule_name = action, rule_name
+            self.engine.create_log_record(packet, action, rule_name, self.direction)
+            return False
+        self.rule_name = rule_name
+        if inspector.fast_path:
+            self._count(len(data))
+            message = f"{self.direction} fast path after {inspector.inspected} bytes"
+            self.engine.create_log_record(packet, action, rule_name, message)
+        elif self._count(len(data)):
+            self.engine.create_log_record(packet, action, rule_name, self.direction)
+        return True
+
+    def finish(self) -> None:
+        """流结束时为 sample/flow 模式补记汇总记录。"""
+
+        if self.mode != "all" and self.chunks:
+            self.engine.create_log_record(
+                PacketInfo(MatchProtocol.TCP, *self.flow),
+                self.action,
+                self.rule_name,
+                f"{self.direction} closed: {self.chunks} chunks, {self.bytes} bytes",
+            )
 
 
 class FirewallService:
@@ -34,29 +163,69 @@ class FirewallService:
         self._udp_transport: Optional[asyncio.transports.DatagramTransport] = None
         self._udp_protocol: Optional[_UDPProxyProtocol] = None
         self._tasks: set[asyncio.Task] = set()
+        # stream 模式下各连接的处理协程，停止时等待它们关闭连接
+        self._handlers: set[asyncio.Task] = set()
+        # buffered 模式下的客户端连接
+        self._relays: set[_TCPClientProtocol] = set()
+        self.upstreams: Optional[UpstreamPool] = None
+        self.admission: Optional[AdmissionController] = None
+        self.metrics_server: Optional[MetricsServer] = None
 
     # 生命周期
     async def start(self) -> None:
         if self.config.enable_tcp:
-            self.tcp_server = await asyncio.start_server(
-                self._handle_tcp_client,
-                self.config.listen_host,
-                self.config.listen_port,
+            self.admission = AdmissionController(
+                self.config.max_connections,
+                self.config.max_connections_per_ip,
+                self.config.connection_rate_per_ip,
+                self.config.connection_burst_per_ip,
             )
+            self.upstreams = self._create_upstream_pool()
+            self.upstreams.start()
+            if self.config.tcp_mode == "buffered":
+                self.tcp_server = await self.loop.create_server(
+                    lambda: _TCPClientProtocol(self),
+                    self.config.listen_host,
+                    self.config.listen_port,
+                    reuse_port=self.config.reuse_port or None,
+                )
+            else:
+                self.tcp_server = await asyncio.start_server(
+                    self._handle_tcp_client,
+                    self.config.listen_host,
+                    self.config.listen_port,
+                    reuse_port=self.config.reuse_port or None,
+                )
         if self.config.enable_udp:
             await self._start_udp()
+        if self.config.metrics_port:
+            self.metrics_server = MetricsServer(self.metrics_snapshot, self.config.metrics_host, self.config.metrics_port)
+            self.metrics_server.start()
 
     async def stop(self) -> None:
-        if self.tcp_server:
-            self.tcp_server.close()
-            await self.tcp_server.wait_closed()
-            self.tcp_server = None
+        server, self.tcp_server = self.tcp_server, None
+        if server:
+            server.close()
         if self._udp_transport:
             self._udp_transport.close()
             self._udp_transport = None
         for task in list(self._tasks):
             task.cancel()
         self._tasks.clear()
+        if self._handlers:
+            # 转发任务取消后处理协程随即关闭连接并正常结束
+            await asyncio.wait(list(self._handlers), timeout=self.config.connect_timeout)
+        for relay in list(self._relays):
+            relay.close()
+        self._relays.clear()
+        if self.upstreams is not None:
+            self.upstreams.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        # 新版本的 wait_closed 会等待已有连接结束，因此放在关闭连接之后
+        if server:
+            await server.wait_closed()
 
     @property
     def running(self) -> bool:
@@ -65,8 +234,96 @@ class FirewallService:
     def update_config(self, config: ProxyConfig) -> None:
         self.config = config
 
+    def _create_upstream_pool(self) -> UpstreamPool:
+        config = self.config
+        if config.tcp_mode == "buffered":
+
+            async def connect(family: int, sockaddr: tuple) -> Any:
+                _, protocol = await self.loop.create_connection(
+                    lambda: _RelayProtocol(config.read_size), sockaddr[0], sockaddr[1], family=family
+                )
+                return protocol
+
+            def alive(conn: Any) -> bool:
+                return conn.transport is not None and not conn.transport.is_closing()
+
+            def close(conn: Any) -> None:
+                if conn.transport is not None:
+                    conn.transport.close()
+
+        else:
+
+            async def connect(family: int, sockaddr: tuple) -> Any:
+                return await asyncio.open_connection(sockaddr[0], sockaddr[1], family=family)
+
+            def alive(conn: Any) -> bool:
+                return not conn[1].is_closing() and not conn[0].at_eof()
+
+            def close(conn: Any) -> None:
+                conn[1].close()
+
+        return UpstreamPool(
+            config.upstream_targets(),
+            connect,
+            alive,
+            close,
+            resolver=Resolver(config.dns_ttl),
+            prewarm=config.prewarm_connections,
+            connect_timeout=config.connect_timeout,
+            fail_threshold=config.upstream_fail_threshold,
+            cooldown=config.upstream_cooldown,
+        )
+
+    def upstream_stats(self) -> list[dict]:
+        """各后端目标的活动/预建连接数与健康状态。"""
+
+        return self.upstreams.stats() if self.upstreams else []
+
+    def admission_stats(self) -> dict:
+        """活动连接数与各类准入拒绝计数。"""
+
+        return self.admission.stats() if self.admission else {}
+
+    def metrics_snapshot(self) -> dict:
+        """引擎指标（规则命中、判决、字节、连接、判决耗时）加上准入与 UDP 会话计数。"""
+
+        snapshot = self.engine.metrics_snapshot()
+        if self.admission is not None:
+            snapshot["admission"] = self.admission.stats()
+        if self._udp_protocol is not None:
+            snapshot["udp_sessions"] = self._udp_protocol.stats()
+        return snapshot
+
+    def _admit(self, src_ip: str, src_port: int, dst_ip: str, dst_port: int) -> bool:
+        """准入检查，拒绝时记录日志；放行的连接结束时须调用 ``admission.release``。"""
+
+        assert self.admission is not None
+        reason = self.admission.admit(src_ip)
+        if reason is None:
+            return True
+        packet = PacketInfo(MatchProtocol.TCP, src_ip, src_port, dst_ip, dst_port)
+        self.engine.create_log_record(packet, MatchAction.DENY, "admission", reason)
+        return False
+
+    def _start_timer(self, packet: PacketInfo, on_timeout: Callable[[], None]) -> Optional[ConnectionTimer]:
+        """按配置为连接创建超时定时器，超时时记录日志并调用 ``on_timeout()``。"""
+
+        config = self.config
+        if not config.idle_timeout and not config.max_connection_time:
+            return None
+
+        def expired(reason: str) -> None:
+            self.engine.create_log_record(packet, MatchAction.DENY, "admission", reason)
+            on_timeout()
+
+        return ConnectionTimer(self.loop, config.idle_timeout, config.max_connection_time, expired)
+
     # TCP 处理
     async def _handle_tcp_client(self, reader: StreamReader, writer: StreamWriter) -> None:
+        handler = asyncio.current_task()
+        if handler is not None:
+            self._handlers.add(handler)
+            handler.add_done_callback(self._handlers.discard)
         peer = writer.get_extra_info("peername")
         sock = writer.get_extra_info("sockname")
         if peer is None or sock is None:
@@ -76,104 +333,383 @@ class FirewallService:
 
         src_ip, src_port = peer[0], peer[1]
         dst_ip, dst_port = sock[0], sock[1]
-        packet = PacketInfo(MatchProtocol.TCP, src_ip, src_port, dst_ip, dst_port)
-        action, rule, source = self.engine.evaluate(packet)
-        rule_name = rule.name if rule else source
-        self.engine.create_log_record(packet, action, rule_name, "connection request")
-        if action is not MatchAction.ALLOW:
+        if not self._admit(src_ip, src_port, dst_ip, dst_port):
             writer.close()
             await writer.wait_closed()
             return
-
+        admission = self.admission
+        assert admission is not None
         try:
-            target_reader, target_writer = await asyncio.open_connection(
-                self.config.target_host, self.config.target_port
-            )
-        except OSError as exc:
-            self.engine.create_log_record(packet, MatchAction.DENY, "proxy", f"connect failed: {exc}")
-            writer.close()
-            await writer.wait_closed()
-            return
+            packet = self._check_connection(src_ip, src_port, dst_ip, dst_port)
+            if packet is None:
+                writer.close()
+                await writer.wait_closed()
+                return
 
-        async def forward_data(src_reader: StreamReader, dst_writer: StreamWriter, direction: str) -> None:
+            upstreams = self.upstreams
+            assert upstreams is not None
             try:
-                while True:
-                    data = await src_reader.read(4096)
-                    if not data:
-                        break
-                    packet = PacketInfo(
-                        MatchProtocol.TCP,
-                        src_ip if direction == "client_to_server" else self.config.target_host,
-                        src_port if direction == "client_to_server" else self.config.target_port,
-                        dst_ip if direction == "client_to_server" else src_ip,
-                        dst_port if direction == "client_to_server" else src_port,
-                        data,
-                    )
-                    action, rule, source = self.engine.evaluate(packet)
-                    rule_name = rule.name if rule else source
-                    self.engine.create_log_record(packet, action, rule_name, direction)
-                    if action is MatchAction.ALLOW:
+                upstream, (target_reader, target_writer) = await upstreams.acquire()
+            except OSError as exc:
+                self.engine.create_log_record(packet, MatchAction.DENY, "proxy", f"connect failed: {exc}")
+                writer.close()
+                await writer.wait_closed()
+                return
+
+            config = self.config
+            target = upstream.target
+            metrics = self.engine.metrics
+            if metrics is not None:
+                metrics.connection_opened()
+
+            async def forward_data(src_reader: StreamReader, dst_writer: StreamWriter, direction: str) -> None:
+                if direction == "client_to_server":
+                    flow = (src_ip, src_port, dst_ip, dst_port)
+                else:
+                    flow = (target.host, target.port, src_ip, src_port)
+                state = _FlowDirection(self.engine, config, direction, flow)
+                try:
+                    while True:
+                        data = await src_reader.read(config.read_size)
+                        if not data or not state.allow(data):
+                            break
+                        if timer is not None:
+                            timer.touch()
                         dst_writer.write(data)
                         await dst_writer.drain()
-                    else:
-                        break
-            except asyncio.CancelledError:
-                pass
-            finally:
-                dst_writer.close()
-                try:
-                    await dst_writer.wait_closed()
-                except Exception:  # pragma: no cover - 关闭异常忽略
+                except asyncio.CancelledError:
                     pass
+                finally:
+                    state.finish()
+                    dst_writer.close()
+                    try:
+                        await dst_writer.wait_closed()
+                    except Exception:  # pragma: no cover - 关闭异常忽略
+                        pass
 
-        client_to_server = self.loop.create_task(forward_data(reader, target_writer, "client_to_server"))
-        server_to_client = self.loop.create_task(forward_data(target_reader, writer, "server_to_client"))
-        self._tasks.update({client_to_server, server_to_client})
-        try:
-            await asyncio.wait(
-                [client_to_server, server_to_client],
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-        finally:
+            client_to_server = self.loop.create_task(forward_data(reader, target_writer, "client_to_server"))
+            server_to_client = self.loop.create_task(forward_data(target_reader, writer, "server_to_client"))
             for task in (client_to_server, server_to_client):
-                task.cancel()
-                with contextlib.suppress(asyncio.CancelledError):
-                    await task
-            writer.close()
-            await writer.wait_closed()
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            def on_timeout() -> None:
+                client_to_server.cancel()
+                server_to_client.cancel()
+
+            timer = self._start_timer(packet, on_timeout)
+            try:
+                await asyncio.wait(
+                    [client_to_server, server_to_client],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                for task in (client_to_server, server_to_client):
+                    task.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await task
+                if timer is not None:
+                    timer.cancel()
+                if metrics is not None:
+                    metrics.connection_closed()
+                upstreams.release(upstream)
+                writer.close()
+                await writer.wait_closed()
+        finally:
+            admission.release(src_ip)
+
+    def _check_connection(self, src_ip: str, src_port: int, dst_ip: str, dst_port: int) -> Optional[PacketInfo]:
+        """对新连接做判决并记录日志，放行时返回连接的包信息。"""
+
+        packet = PacketInfo(MatchProtocol.TCP, src_ip, src_port, dst_ip, dst_port)
+        action, rule, source = self.engine.evaluate(packet)
+        rule_name = rule.name if rule else source
+        self.engine.create_log_record(packet, action, rule_name, "connection request")
+        return packet if action is MatchAction.ALLOW else None
 
     # UDP 处理
     async def _start_udp(self) -> None:
         transport, protocol = await self.loop.create_datagram_endpoint(
             lambda: _UDPProxyProtocol(self.engine, self.config),
             local_addr=(self.config.listen_host, self.config.listen_port),
+            reuse_port=self.config.reuse_port or None,
         )
         self._udp_transport = transport
         self._udp_protocol = protocol
 
+    def udp_stats(self) -> dict:
+        """UDP 会话数与创建/过期/淘汰/丢弃计数。"""
+
+        return self._udp_protocol.stats() if self._udp_protocol else {}
+
+    def udp_sessions(self) -> list[dict]:
+        """当前各 UDP 会话的计数器。"""
+
+        if not self._udp_protocol:
+            return []
+        return [session.as_dict() for session in self._udp_protocol.sessions.values()]
+
+
+class _RelayProtocol(asyncio.BufferedProtocol):
+    """buffered 模式下 TCP 连接的一端。
+
+    读缓冲区预先分配并在各次读取间复用，快速通道上的数据以 ``memoryview``
+    直接交给对端传输写出，不产生中间 ``bytes``。若对端未能立即发完、仍引用
+    这块缓冲区，则换用新的缓冲区。对端写缓冲超过高水位时暂停本端读取，
+    降到低水位后恢复，代替逐分片 ``drain``。
+    """
+
+    def __init__(self, read_size: int) -> None:
+        self.read_size = read_size
+        self.transport: Optional[asyncio.Transport] = None
+        self.peer: Optional[_RelayProtocol] = None
+        self.state: Optional[_FlowDirection] = None
+        self.timer: Optional[ConnectionTimer] = None
+        self._buffer = memoryview(bytearray(read_size))
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        tcp = cast(asyncio.Transport, transport)
+        self.transport = tcp
+        # 与对端关联之前不读取数据
+        tcp.pause_reading()
+
+    def link(self, peer: "_RelayProtocol", state: _FlowDirection, timer: Optional[ConnectionTimer] = None) -> None:
+        self.peer = peer
+        self.state = state
+        self.timer = timer
+        if self.transport is not None:
+            self.transport.set_write_buffer_limits(high=self.read_size * 4)
+            self.transport.resume_reading()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._buffer
+
+    def buffer_updated(self, nbytes: int) -> None:
+        peer, state = self.peer, self.state
+        if peer is None or state is None or peer.transport is None:
+            return
+        data = self._buffer[:nbytes]
+        if not state.allow(data):
+            self.close()
+            return
+        if self.timer is not None:
+            self.timer.touch()
+        peer.transport.write(data)
+        if peer.transport.get_write_buffer_size():
+            self._buffer = memoryview(bytearray(self.read_size))
+
+    def eof_received(self) -> bool:
+        # 任一方向结束即关闭整个连接，与 stream 模式一致
+        return False
+
+    def pause_writing(self) -> None:
+        if self.peer is not None and self.peer.transport is not None:
+            self.peer.transport.pause_reading()
+
+    def resume_writing(self) -> None:
+        if self.peer is not None and self.peer.transport is not None:
+            self.peer.transport.resume_reading()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self.state is not None:
+            self.state.finish()
+            self.state = None
+        peer, self.peer = self.peer, None
+        if peer is not None:
+            peer.peer = None
+            peer.close()
+
+    def close(self) -> None:
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.close()
+        if self.peer is not None and self.peer.transport is not None and not self.peer.transport.is_closing():
+            self.peer.transport.close()
+
+
+class _TCPClientProtocol(_RelayProtocol):
+    """buffered 模式下客户端一侧的连接，负责连接判决与建立到后端的连接。"""
+
+    def __init__(self, service: FirewallService) -> None:
+        super().__init__(service.config.read_size)
+        self.service = service
+        self._upstream_state: Any = None
+        self._admission: Optional[AdmissionController] = None
+        self._src_ip = ""
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+        peer = transport.get_extra_info("peername")
+        sock = transport.get_extra_info("sockname")
+        if peer is None or sock is None:
+            transport.close()
+            return
+        if not self.service._admit(peer[0], peer[1], sock[0], sock[1]):
+            transport.close()
+            return
+        self._admission, self._src_ip = self.service.admission, peer[0]
+        packet = self.service._check_connection(peer[0], peer[1], sock[0], sock[1])
+        if packet is None:
+            transport.close()
+            return
+        self.transport.pause_reading()  # type: ignore[union-attr]
+        self.service._relays.add(self)
+        task = self.service.loop.create_task(self._connect_upstream(packet))
+        self.service._tasks.add(task)
+        task.add_done_callback(self.service._tasks.discard)
+
+    async def _connect_upstream(self, packet: PacketInfo) -> None:
+        service = self.service
+        config = service.config
+        upstreams = service.upstreams
+        assert upstreams is not None
+        try:
+            state, upstream = await upstreams.acquire()
+        except OSError as exc:
+            service.engine.create_log_record(packet, MatchAction.DENY, "proxy", f"connect failed: {exc}")
+            self.close()
+            return
+        if self.transport is None or self.transport.is_closing():
+            upstreams.release(state)
+            upstream.transport.close()
+            return
+        self._upstream_state = state
+        if service.engine.metrics is not None:
+            service.engine.metrics.connection_opened()
+        target = state.target
+        client_flow = (packet.src_ip, packet.src_port, packet.dst_ip, packet.dst_port)
+        server_flow = (target.host, target.port, packet.src_ip, packet.src_port)
+        timer = service._start_timer(packet, self.close)
+        self.link(upstream, _FlowDirection(service.engine, config, "client_to_server", client_flow), timer)
+        upstream.link(self, _FlowDirection(service.engine, config, "server_to_client", server_flow), timer)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.service._relays.discard(self)
+        if self.timer is not None:
+            self.timer.cancel()
+        if self._admission is not None:
+            self._admission.release(self._src_ip)
+            self._admission = None
+        if self._upstream_state is not None:
+            if self.service.engine.metrics is not None:
+                self.service.engine.metrics.connection_closed()
+            if self.service.upstreams is not None:
+                self.service.upstreams.release(self._upstream_state)
+            self._upstream_state = None
+        super().connection_lost(exc)
+
+
+class _UDPSession:
+    """一个 UDP 客户端地址对应的会话：独占一个到后端的上游端点。"""
+
+    __slots__ = ("client", "transport", "pending", "last_seen", "packets_in", "packets_out", "bytes_in", "bytes_out")
+
+    def __init__(self, client: tuple[str, int]) -> None:
+        self.client = client
+        self.transport: Optional[asyncio.transports.DatagramTransport] = None
+        # 上游端点建立前收到的数据报
+        self.pending: list[bytes] = []
+        self.last_seen = time.monotonic()
+        self.packets_in = 0
+        self.packets_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "client": f"{self.client[0]}:{self.client[1]}",
+            "idle": round(time.monotonic() - self.last_seen, 3),
+            "packets_in": self.packets_in,
+            "packets_out": self.packets_out,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
 
 class _UDPProxyProtocol(asyncio.DatagramProtocol):
-    """UDP 代理协议实现。"""
+    """UDP 代理协议实现。
+
+    按客户端地址维护 NAT 式会话表：每个客户端一个上游端点，后端的回复只
+    发回对应的客户端。会话按最近活动时间排序，超过 ``udp_session_timeout``
+    秒无数据的会话被回收；会话数达到 ``udp_max_sessions`` 时淘汰最久未
+    活动的会话。
+    """
+
+    # 上游端点建立前最多缓存的数据报数
+    PENDING_LIMIT = 32
 
     def __init__(self, engine: FirewallEngine, config: ProxyConfig) -> None:
         self.engine = engine
         self.config = config
         self.transport: Optional[asyncio.transports.DatagramTransport] = None
-        self._upstream_transport: Optional[asyncio.transports.DatagramTransport] = None
-        self._client_addresses: set[tuple[str, int]] = set()
+        self.sessions: "OrderedDict[tuple[str, int], _UDPSession]" = OrderedDict()
+        self.counters = {"created": 0, "expired": 0, "evicted": 0, "closed": 0, "dropped": 0}
+        self._sweeper: Optional[asyncio.TimerHandle] = None
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         self.transport = transport  # type: ignore[assignment]
-        loop = asyncio.get_running_loop()
-        loop.create_task(self._setup_upstream())
+        self._schedule_sweep()
 
-    async def _setup_upstream(self) -> None:
-        loop = asyncio.get_running_loop()
-        transport, _ = await loop.create_datagram_endpoint(
-            lambda: _UDPUpstreamProtocol(self),
-            remote_addr=(self.config.target_host, self.config.target_port),
+    def _schedule_sweep(self) -> None:
+        interval = max(1.0, min(self.config.udp_session_timeout / 2, 30.0))
+        self._sweeper = asyncio.get_running_loop().call_later(interval, self._sweep)
+
+    def _sweep(self) -> None:
+        self.expire_idle()
+        self._schedule_sweep()
+
+    def expire_idle(self) -> None:
+        deadline = time.monotonic() - self.config.udp_session_timeout
+        sessions = self.sessions
+        while sessions:
+            session = next(iter(sessions.values()))
+            if session.last_seen > deadline:
+                break
+            self._close_session(session, "expired")
+
+    def _close_session(self, session: _UDPSession, reason: str) -> None:
+        if self.sessions.get(session.client) is session:
+            del self.sessions[session.client]
+        self.counters[reason] += 1
+        if session.transport is not None:
+            session.transport.close()
+            session.transport = None
+        self.engine.create_log_record(
+            PacketInfo(MatchProtocol.UDP, *session.client, self.config.target_host, self.config.target_port),
+            MatchAction.ALLOW,
+            "udp session",
+            f"udp session {reason}: {session.packets_in} in / {session.packets_out} out, "
+            f"{session.bytes_in} / {session.bytes_out} bytes",
         )
-        self._upstream_transport = transport
+
+    def _open_session(self, addr: tuple[str, int]) -> _UDPSession:
+        self.expire_idle()
+        while len(self.sessions) >= self.config.udp_max_sessions:
+            self._close_session(next(iter(self.sessions.values())), "evicted")
+        session = self.sessions[addr] = _UDPSession(addr)
+        self.counters["created"] += 1
+        asyncio.get_running_loop().create_task(self._setup_upstream(session))
+        return session
+
+    async def _setup_upstream(self, session: _UDPSession) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _UDPUpstreamProtocol(self, session),
+                remote_addr=(self.config.target_host, self.config.target_port),
+            )
+        except OSError as exc:
+            self.engine.logger.error("UDP upstream for %s:%s failed: %s", *session.client, exc)
+            if self.sessions.get(session.client) is session:
+                del self.sessions[session.client]
+            return
+        if self.sessions.get(session.client) is not session:
+            # 建立期间会话已被回收
+            transport.close()
+            return
+        session.transport = transport
+        for data in session.pending:
+            transport.sendto(data)
+        session.pending = []
 
     def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
         packet = PacketInfo(
@@ -187,9 +723,38 @@ class _UDPProxyProtocol(asyncio.DatagramProtocol):
         action, rule, source = self.engine.evaluate(packet)
         rule_name = rule.name if rule else source
         self.engine.create_log_record(packet, action, rule_name, "udp inbound")
-        if action is MatchAction.ALLOW and self._upstream_transport:
-            self._client_addresses.add(addr)
-            self._upstream_transport.sendto(data)
+        if action is not MatchAction.ALLOW:
+            return
+        session = self.sessions.get(addr)
+        if session is None:
+            session = self._open_session(addr)
+        else:
+            self.sessions.move_to_end(addr)
+        session.last_seen = time.monotonic()
+        session.packets_in += 1
+        session.bytes_in += len(data)
+        if self.engine.metrics is not None:
+            self.engine.metrics.add_bytes("udp", "client_to_server", len(data))
+        if session.transport is not None:
+            session.transport.sendto(data)
+        elif len(session.pending) < self.PENDING_LIMIT:
+            session.pending.append(data)
+        else:
+            self.counters["dropped"] += 1
+
+    def handle_upstream(self, session: _UDPSession, data: bytes) -> None:
+        if not self.transport or self.sessions.get(session.client) is not session:
+            return
+        self.sessions.move_to_end(session.client)
+        session.last_seen = time.monotonic()
+        session.packets_out += 1
+        session.bytes_out += len(data)
+        if self.engine.metrics is not None:
+            self.engine.metrics.add_bytes("udp", "server_to_client", len(data))
+        self.transport.sendto(data, session.client)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self.sessions), **self.counters}
 
     def error_received(self, exc: Exception) -> None:  # pragma: no cover - 框架回调
         self.engine.logger.error("UDP error: %s", exc)
@@ -197,20 +762,19 @@ class _UDPProxyProtocol(asyncio.DatagramProtocol):
     def connection_lost(self, exc: Optional[Exception]) -> None:  # pragma: no cover - 框架回调
         if exc:
             self.engine.logger.error("UDP connection lost: %s", exc)
-        self._client_addresses.clear()
-
-    def handle_upstream(self, data: bytes) -> None:
-        if not self.transport:
-            return
-        for client in self._client_addresses:
-            self.transport.sendto(data, client)
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for session in list(self.sessions.values()):
+            self._close_session(session, "closed")
 
 
 class _UDPUpstreamProtocol(asyncio.DatagramProtocol):
-    """接收来自后端服务器的 UDP 响应。"""
+    """接收来自后端服务器的 UDP 响应，转发给所属会话的客户端。"""
 
-    def __init__(self, parent: _UDPProxyProtocol) -> None:
+    def __init__(self, parent: _UDPProxyProtocol, session: _UDPSession) -> None:
         self.parent = parent
+        self.session = session
 
     def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:  # pragma: no cover - 简单转发
-        self.parent.handle_upstream(data)
+        self.parent.handle_upstream(self.session, data)
@@ -1,11 +1,13 @@
 """防火墙规则定义与匹配工具。"""
 from __future__ import annotations
 
+from bisect import bisect_right
 from dataclasses import dataclass, field
 from enum import Enum
+from functools import lru_cache
 from ipaddress import ip_address, ip_network
 import re
-from typing import Optional, Pattern
+from typing import List, Optional, Pattern, Tuple
 
 
 class MatchProtocol(str, Enum):
@@ -42,20 +44,137 @@ class PacketInfo:
         return self.payload.decode(encoding, errors)
 
 
+# 条件字段被修改时需要重新编译
+_IP_FIELDS = frozenset({"ip", "src_ip", "dst_ip"})
+_PORT_FIELDS = frozenset({"port", "src_port", "dst_port"})
+_ANY_TOKENS = frozenset({"*", "any", "ANY"})
+
+
+@dataclass(frozen=True, slots=True)
+class IPCondition:
+    """预编译的 IP 条件。
+
+    CIDR 条件编译为 ``(version, network, mask)`` 整数，匹配时只做按位与比较；
+    非 CIDR 条件保持原有语义，按字符串相等比较；无效 CIDR 永不匹配。
+    """
+
+    text: Optional[str] = None
+    version: int = 0
+    network: int = 0
+    mask: int = 0
+    valid: bool = True
+
+    def matches(self, value: str) -> bool:
+        if self.text is not None:
+            return value == self.text
+        if not self.valid:
+            return False
+        key = _ip_key(value)
+        return key is not None and key[0] == self.version and key[1] & self.mask == self.network
+
+
+@dataclass(frozen=True, slots=True)
+class PortCondition:
+    """预编译的端口条件：按起点排序、合并后的闭区间。"""
+
+    starts: Tuple[int, ...]
+    ends: Tuple[int, ...]
+
+    def matches(self, value: int) -> bool:
+        index = bisect_right(self.starts, value) - 1
+        return index >= 0 and value <= self.ends[index]
+
+
+def compile_ip_condition(condition: Optional[str]) -> Optional[IPCondition]:
+    """编译 IP 条件，``None`` 表示任意地址。"""
+
+    if not condition or condition in _ANY_TOKENS:
+        return None
+    condition = condition.strip()
+    if "/" not in condition:
+        return IPCondition(text=condition)
+    try:
+        network = ip_network(condition, strict=False)
+    except ValueError:
+        return IPCondition(valid=False)
+    return IPCondition(
+        version=network.version,
+        network=int(network.network_address),
+        mask=int(network.netmask),
+    )
+
+
+def compile_port_condition(condition: Optional[str]) -> Optional[PortCondition]:
+    """编译端口条件，``None`` 表示任意端口；无法解析的片段被忽略。"""
+
+    if not condition or condition in _ANY_TOKENS:
+        return None
+    ranges: List[Tuple[int, int]] = []
+    for token in (part.strip() for part in condition.split(",")):
+        if "-" in token:
+            low, _, high = token.partition("-")
+            if low.isdigit() and high.isdigit() and int(low) <= int(high):
+                ranges.append((int(low), int(high)))
+        elif token.isdigit():
+            ranges.append((int(token), int(token)))
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return PortCondition(tuple(r[0] for r in merged), tuple(r[1] for r in merged))
+
+
+@lru_cache(maxsize=4096)
+def _ip_key(value: str) -> Optional[Tuple[int, int]]:
+    """将 IP 字符串解析为 ``(version, int)``，结果缓存以避免逐包解析。"""
+
+    try:
+        address = ip_address(value)
+    except ValueError:
+        return None
+    return address.version, int(address)
+
+
 @dataclass(slots=True)
 class AddressPattern:
     """白名单/黑名单中使用的地址描述。"""
 
     ip: Optional[str] = None
     port: Optional[str] = None
+    _ip_cond: Optional[IPCondition] = field(default=None, init=False, repr=False, compare=False)
+    _port_cond: Optional[PortCondition] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._ip_cond = compile_ip_condition(self.ip)
+        self._port_cond = compile_port_condition(self.port)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        object.__setattr__(self, name, value)
+        if name == "ip":
+            object.__setattr__(self, "_ip_cond", compile_ip_condition(value))  # type: ignore[arg-type]
+        elif name == "port":
+            object.__setattr__(self, "_port_cond", compile_port_condition(value))  # type: ignore[arg-type]
+
+    def as_dict(self) -> dict:
+        return {"ip": self.ip, "port": self.port}
 
     def matches(self, packet: PacketInfo) -> bool:
-        return _match_ip(packet.src_ip, self.ip) and _match_port(packet.src_port, self.port)
+        ip_cond = self._ip_cond
+        if ip_cond is not None and not ip_cond.matches(packet.src_ip):
+            return False
+        port_cond = self._port_cond
+        return port_cond is None or port_cond.matches(packet.src_port)
 
 
 @dataclass(slots=True)
 class FirewallRule:
-    """防火墙规则定义。"""
+    """防火墙规则定义。
+
+    IP 与端口条件在构造及字段被修改时编译，``matches`` 只做整数比较。
+    """
 
     name: str
     action: MatchAction
@@ -67,19 +186,57 @@ class FirewallRule:
     pattern: Optional[str] = None
     description: str = ""
     _compiled_pattern: Optional[Pattern[str]] = field(default=None, init=False, repr=False)
+    _src_ip_cond: Optional[IPCondition] = field(default=None, init=False, repr=False, compare=False)
+    _dst_ip_cond: Optional[IPCondition] = field(default=None, init=False, repr=False, compare=False)
+    _src_port_cond: Optional[PortCondition] = field(default=None, init=False, repr=False, compare=False)
+    _dst_port_cond: Optional[PortCondition] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._src_ip_cond = compile_ip_condition(self.src_ip)
+        self._dst_ip_cond = compile_ip_condition(self.dst_ip)
+        self._src_port_cond = compile_port_condition(self.src_port)
+        self._dst_port_cond = compile_port_condition(self.dst_port)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        object.__setattr__(self, name, value)
+        if name in _IP_FIELDS:
+            object.__setattr__(self, f"_{name}_cond", compile_ip_condition(value))  # type: ignore[arg-type]
+        elif name in _PORT_FIELDS:
+            object.__setattr__(self, f"_{name}_cond", compile_port_condition(value))  # type: ignore[arg-type]
+        elif name == "pattern":
+            object.__setattr__(self, "_compiled_pattern", None)
+
+    def as_dict(self) -> dict:
+        """与 ``FirewallEngine.load_rules_from_dicts`` 的输入格式一致。"""
+
+        return {
+            "name": self.name,
+            "action": self.action.value,
+            "protocol": self.protocol.value,
+            "src_ip": self.src_ip,
+            "src_port": self.src_port,
+            "dst_ip": self.dst_ip,
+            "dst_port": self.dst_port,
+            "pattern": self.pattern,
+            "description": self.description,
+        }
 
     def matches(self, packet: PacketInfo) -> bool:
         """判断规则是否命中。"""
 
         if self.protocol is not MatchProtocol.ANY and packet.protocol is not self.protocol:
             return False
-        if not _match_ip(packet.src_ip, self.src_ip):
+        cond = self._src_ip_cond
+        if cond is not None and not cond.matches(packet.src_ip):
             return False
-        if not _match_ip(packet.dst_ip, self.dst_ip):
+        cond = self._dst_ip_cond
+        if cond is not None and not cond.matches(packet.dst_ip):
             return False
-        if not _match_port(packet.src_port, self.src_port):
+        port_cond = self._src_port_cond
+        if port_cond is not None and not port_cond.matches(packet.src_port):
             return False
-        if not _match_port(packet.dst_port, self.dst_port):
+        port_cond = self._dst_port_cond
+        if port_cond is not None and not port_cond.matches(packet.dst_port):
             return False
         if self.pattern:
             pattern = self._compiled_pattern or re.compile(self.pattern)
@@ -93,19 +250,8 @@ class FirewallRule:
 def _match_ip(value: str, condition: Optional[str]) -> bool:
     """根据条件匹配 IP 地址。"""
 
-    if not condition or condition in {"*", "any", "ANY"}:
-        return True
-    condition = condition.strip()
-    if "/" in condition:
-        try:
-            network = ip_network(condition, strict=False)
-        except ValueError:
-            return False
-        try:
-            return ip_address(value) in network
-        except ValueError:
-            return False
-    return value == condition
+    compiled = compile_ip_condition(condition)
+    return compiled is None or compiled.matches(value)
 
 
 def _match_port(value: int, condition: Optional[str]) -> bool:
@@ -118,15 +264,5 @@ def _match_port(value: int, condition: Optional[str]) -> bool:
     - 多个端口使用逗号分隔 ``"80,443"``。
     """
 
-    if not condition or condition in {"*", "any", "ANY"}:
-        return True
-    for token in (part.strip() for part in condition.split(",")):
-        if "-" in token:
-            start, _, end = token.partition("-")
-            if start.isdigit() and end.isdigit():
-                if int(start) <= value <= int(end):
-                    return True
-        elif token.isdigit():
-            if value == int(token):
-                return True
-    return False
+    compiled = compile_port_condition(condition)
+    return compiled is None or compiled.matches(value)
@@ -0,0 +1,38 @@
+"""TCP 流的逐方向检测状态。"""
+from __future__ import annotations
+
+
+class StreamInspector:
+    """单个 TCP 流、单个方向的内容检测状态。
+
+    ``reader.read`` 返回的分片边界是任意的，内容特征可能被切在两次读取之间。
+    检测器保留上一次检测窗口末尾最多 ``overlap`` 字节，与新分片拼接后再交给
+    规则引擎，因此长度不超过 ``overlap + 1`` 字节的特征在任何切分下都能命中。
+
+    ``inspect_limit`` 大于 0 时，流的前 ``inspect_limit`` 字节检测完毕后进入
+    快速通道，后续数据不再经过规则引擎直接转发，适合握手后长期存在的流量
+    （如聊天 WebSocket）；为 0 时检测全部数据。
+    """
+
+    __slots__ = ("overlap", "inspect_limit", "inspected", "_tail")
+
+    def __init__(self, overlap: int = 0, inspect_limit: int = 0) -> None:
+        self.overlap = max(0, overlap)
+        self.inspect_limit = max(0, inspect_limit)
+        self.inspected = 0
+        self._tail = b""
+
+    @property
+    def fast_path(self) -> bool:
+        return bool(self.inspect_limit) and self.inspected >= self.inspect_limit
+
+    def window(self, data: bytes) -> bytes:
+        """返回本次需要检测的数据（上次的重叠部分 + 新分片），并更新状态。"""
+
+        self.inspected += len(data)
+        window = self._tail + data if self._tail else data
+        if self.overlap and not self.fast_path:
+            self._tail = window[-self.overlap:]
+        else:
+            self._tail = b""
+        return window
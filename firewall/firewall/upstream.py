@@ -0,0 +1,228 @@
+"""后端（上游）目标的地址解析缓存、预建连接与负载均衡。"""
+from __future__ import annotations
+
+import asyncio
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass
+from ipaddress import ip_address
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class UpstreamTarget:
+    """一个后端目标；``weight`` 越大分到的连接越多。"""
+
+    host: str
+    port: int
+    weight: int = 1
+
+
+class Resolver:
+    """带 TTL 的地址解析缓存，IP 字面量不经过解析。"""
+
+    def __init__(self, ttl: float = 30.0) -> None:
+        self.ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[Tuple[int, tuple]]]] = {}
+
+    async def resolve(self, host: str, port: int) -> List[Tuple[int, tuple]]:
+        """返回 ``[(family, sockaddr), ...]``。"""
+
+        try:
+            address = ip_address(host)
+        except ValueError:
+            pass
+        else:
+            family = socket.AF_INET if address.version == 4 else socket.AF_INET6
+            return [(family, (host, port))]
+        key = (host, port)
+        cached = self._cache.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses: List[Tuple[int, tuple]] = [(int(family), sockaddr) for family, _, _, _, sockaddr in infos]
+        self._cache[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host: str, port: int) -> None:
+        self._cache.pop((host, port), None)
+
+
+class _TargetState:
+    __slots__ = ("target", "active", "failures", "down_until", "idle", "refilling", "connects", "errors")
+
+    def __init__(self, target: UpstreamTarget) -> None:
+        self.target = target
+        self.active = 0
+        self.failures = 0
+        self.down_until = 0.0
+        # 预建连接：(建立时间, 连接)
+        self.idle: Deque[Tuple[float, Any]] = deque()
+        self.refilling = False
+        self.connects = 0
+        self.errors = 0
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+
+class UpstreamPool:
+    """在多个后端目标之间按“最少连接 / 权重”分配连接。
+
+    ``connect(family, sockaddr)`` 建立一条连接（stream 模式为 reader/writer，
+    buffered 模式为协议对象），``alive(conn)`` 判断预建连接是否仍可用。
+    连续连接失败 ``fail_threshold`` 次的目标在 ``cooldown`` 秒内不参与分配
+    （所有目标都不可用时仍会尝试最早恢复的那个）。``prewarm`` 大于 0 时
+    为每个目标保持若干条预建连接，超过 ``prewarm_max_age`` 秒未被使用的
+    预建连接会被关闭并重建。
+    """
+
+    def __init__(
+        self,
+        targets: Sequence[UpstreamTarget],
+        connect: Callable[[int, tuple], Awaitable[Any]],
+        alive: Callable[[Any], bool],
+        close: Callable[[Any], None],
+        resolver: Optional[Resolver] = None,
+        prewarm: int = 0,
+        prewarm_max_age: float = 30.0,
+        connect_timeout: float = 5.0,
+        fail_threshold: int = 3,
+        cooldown: float = 10.0,
+    ) -> None:
+        if not targets:
+            raise ValueError("at least one upstream target is required")
+        self.states = [_TargetState(target) for target in targets]
+        self._connect = connect
+        self._alive = alive
+        self._close = close
+        self.resolver = resolver or Resolver()
+        self.prewarm = prewarm
+        self.prewarm_max_age = prewarm_max_age
+        self.connect_timeout = connect_timeout
+        self.fail_threshold = fail_threshold
+        self.cooldown = cooldown
+        self._closed = False
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        for state in self.states:
+            self._refill(state)
+
+    def close(self) -> None:
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        for state in self.states:
+            while state.idle:
+                self._close(state.idle.popleft()[1])
+
+    def _choose(self, exclude: Sequence[_TargetState] = ()) -> _TargetState:
+        now = time.monotonic()
+        candidates = [state for state in self.states if state not in exclude]
+        healthy = [state for state in candidates if state.healthy(now)]
+        if healthy:
+            return min(healthy, key=lambda state: (state.active + 1) / max(1, state.target.weight))
+        return min(candidates, key=lambda state: state.down_until)
+
+    async def acquire(self) -> Tuple[_TargetState, Any]:
+        """选择目标并取得一条连接；调用方在连接结束后须调用 ``release``。
+
+        所有目标都连接失败时抛出最后一个 ``OSError``。
+        """
+
+        tried: List[_TargetState] = []
+        error: Optional[OSError] = None
+        while len(tried) < len(self.states):
+            state = self._choose(tried)
+            tried.append(state)
+            state.active += 1
+            conn = self._take_idle(state)
+            if conn is None:
+                try:
+                    conn = await self._open(state)
+                except OSError as exc:
+                    state.active -= 1
+                    error = exc
+                    continue
+            self._refill(state)
+            return state, conn
+        assert error is not None
+        raise error
+
+    def release(self, state: _TargetState) -> None:
+        state.active -= 1
+
+    def _take_idle(self, state: _TargetState) -> Optional[Any]:
+        deadline = time.monotonic() - self.prewarm_max_age
+        while state.idle:
+            created, conn = state.idle.popleft()
+            if created >= deadline and self._alive(conn):
+                return conn
+            self._close(conn)
+        return None
+
+    async def _open(self, state: _TargetState) -> Any:
+        target = state.target
+        state.connects += 1
+        try:
+            addresses = await self.resolver.resolve(target.host, target.port)
+            error: Optional[OSError] = None
+            for family, sockaddr in addresses:
+                try:
+                    conn = await asyncio.wait_for(self._connect(family, sockaddr), self.connect_timeout)
+                except (OSError, asyncio.TimeoutError) as exc:
+                    error = exc if isinstance(exc, OSError) else OSError(f"connect to {sockaddr} timed out")
+                    continue
+                state.failures = 0
+                state.down_until = 0.0
+                return conn
+            raise error or OSError(f"no address for {target.host}")
+        except OSError:
+            state.errors += 1
+            state.failures += 1
+            # 解析结果可能已过时
+            self.resolver.invalidate(target.host, target.port)
+            if state.failures >= self.fail_threshold:
+                state.down_until = time.monotonic() + self.cooldown
+            raise
+
+    def _refill(self, state: _TargetState) -> None:
+        if self.prewarm <= 0 or self._closed or state.refilling or len(state.idle) >= self.prewarm:
+            return
+        state.refilling = True
+        task = asyncio.get_running_loop().create_task(self._refill_task(state))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill_task(self, state: _TargetState) -> None:
+        try:
+            while not self._closed and len(state.idle) < self.prewarm and state.healthy(time.monotonic()):
+                try:
+                    conn = await self._open(state)
+                except OSError:
+                    return
+                if self._closed:
+                    self._close(conn)
+                    return
+                state.idle.append((time.monotonic(), conn))
+        finally:
+            state.refilling = False
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "target": f"{state.target.host}:{state.target.port}",
+                "weight": state.target.weight,
+                "active": state.active,
+                "idle": len(state.idle),
+                "healthy": state.healthy(now),
+                "failures": state.failures,
+                "connects": state.connects,
+                "errors": state.errors,
+            }
+            for state in self.states
+        ]
@@ -0,0 +1,57 @@
+"""按五元组缓存判决结果。"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .rules import FirewallRule, MatchAction, MatchProtocol, PacketInfo
+
+FlowKey = Tuple[MatchProtocol, str, int, str, int]
+Verdict = Tuple[MatchAction, Optional[FirewallRule], str]
+
+
+class VerdictCache:
+    """有界 LRU 判决缓存。
+
+    只缓存与负载无关的判决；规则集代数（generation）变化时整体失效。
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[FlowKey, Verdict]" = OrderedDict()
+
+    @staticmethod
+    def key(packet: PacketInfo) -> FlowKey:
+        return (packet.protocol, packet.src_ip, packet.src_port, packet.dst_ip, packet.dst_port)
+
+    def get(self, key: FlowKey, generation: int) -> Optional[Verdict]:
+        if generation != self.generation:
+            self._entries.clear()
+            self.generation = generation
+        verdict = self._entries.get(key)
+        if verdict is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return verdict
+
+    def put(self, key: FlowKey, verdict: Verdict, generation: int) -> None:
+        if generation != self.generation or self.maxsize <= 0:
+            return
+        self._entries[key] = verdict
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,247 @@
+"""多进程运行代理：各工作进程以 SO_REUSEPORT 监听同一端口。"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .engine import FirewallEngine, FirewallLogRecord
+from .metrics import MetricsServer, merge_snapshots
+from .proxy import FirewallService, ProxyConfig
+from .rules import MatchAction, MatchProtocol, PacketInfo
+
+# 工作进程上报计数器的间隔（秒）
+STATS_INTERVAL = 1.0
+# 规则变化后等待多久再推送快照，合并连续的修改
+PUSH_DELAY = 0.1
+
+
+def _pack_records(records: List[FirewallLogRecord]) -> List[tuple]:
+    return [
+        (
+            record.timestamp.timestamp(),
+            record.packet.protocol.value,
+            record.packet.src_ip,
+            record.packet.src_port,
+            record.packet.dst_ip,
+            record.packet.dst_port,
+            record.action.value,
+            record.rule_name,
+            record.message,
+        )
+        for record in records
+    ]
+
+
+def _unpack_record(row: tuple) -> FirewallLogRecord:
+    timestamp, protocol, src_ip, src_port, dst_ip, dst_port, action, rule_name, message = row
+    return FirewallLogRecord(
+        datetime.fromtimestamp(timestamp),
+        PacketInfo(MatchProtocol(protocol), src_ip, src_port, dst_ip, dst_port),
+        MatchAction(action),
+        rule_name,
+        message,
+    )
+
+
+def _worker_main(worker_id: int, config: ProxyConfig, snapshot: dict, control: Any, events: Any) -> None:
+    """工作进程入口：运行自己的引擎与 ``FirewallService``，日志与计数器经 ``events`` 上报。"""
+
+    engine = FirewallEngine(log_limit=1)
+    engine.restore(snapshot)
+    # 日志只由父进程输出
+    engine.log_pipeline.remove_sink(engine._write_log_batch)
+    engine.log_pipeline.add_sink(lambda records: events.put(("logs", worker_id, _pack_records(records))))
+
+    services: List[FirewallService] = []
+
+    def report() -> None:
+        metrics = services[0].metrics_snapshot() if services else engine.metrics_snapshot()
+        events.put(("stats", worker_id, {"cache": engine.cache_stats(), "log": engine.log_stats(), "metrics": metrics}))
+
+    async def run() -> None:
+        loop = asyncio.get_running_loop()
+        service = FirewallService(engine, config, loop)
+        services.append(service)
+        await service.start()
+        stopped = loop.create_future()
+
+        def on_control() -> None:
+            try:
+                message = control.recv()
+            except EOFError:
+                message = ("stop",)
+            if message[0] == "rules":
+                engine.restore(message[1])
+            elif message[0] == "stop" and not stopped.done():
+                stopped.set_result(None)
+
+        loop.add_reader(control.fileno(), on_control)
+        try:
+            while not stopped.done():
+                await asyncio.wait([stopped], timeout=STATS_INTERVAL)
+                report()
+        finally:
+            loop.remove_reader(control.fileno())
+            await service.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:  # pragma: no cover - 由父进程统一处理中断
+        pass
+    finally:
+        engine.log_pipeline.close()
+        report()
+
+
+class WorkerPool:
+    """以多个工作进程运行代理，规则集以父进程的 ``engine`` 为准。
+
+    每个工作进程持有一个由快照恢复的引擎和一个 ``reuse_port=True`` 的
+    ``FirewallService``，由内核在各进程间分配新连接。父进程引擎的规则集
+    变化后（稍作合并）把新快照推送给所有工作进程；工作进程的日志批量送回
+    父进程，写入父进程引擎的日志（内存缓冲、控制台、导出器），各进程的
+    计数器由 ``stats`` 汇总，指标由 ``metrics_snapshot`` 合并；配置了
+    ``metrics_port`` 时指标接口由父进程提供。
+    """
+
+    def __init__(self, engine: FirewallEngine, config: ProxyConfig, workers: Optional[int] = None) -> None:
+        self.engine = engine
+        self.config = replace(config, reuse_port=True, metrics_port=0)
+        self.metrics_server: Optional[MetricsServer] = None
+        if config.metrics_port:
+            self.metrics_server = MetricsServer(self.metrics_snapshot, config.metrics_host, config.metrics_port)
+        self.workers = workers or os.cpu_count() or 1
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Any] = []
+        self._controls: List[Any] = []
+        self._events: Any = None
+        self._collector: Optional[threading.Thread] = None
+        self._pusher: Optional[threading.Thread] = None
+        self._dirty = threading.Event()
+        self._send_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._worker_stats: Dict[int, dict] = {}
+        self.log_records = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._processes)
+
+    def start(self) -> None:
+        if self._processes:
+            return
+        self._stopping.clear()
+        self._events = self._context.Queue()
+        snapshot = self.engine.snapshot()
+        for worker_id in range(self.workers):
+            parent_end, child_end = self._context.Pipe()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(worker_id, self.config, snapshot, child_end, self._events),
+                name=f"firewall-worker-{worker_id}",
+                daemon=True,
+            )
+            process.start()
+            child_end.close()
+            self._processes.append(process)
+            self._controls.append(parent_end)
+        self._collector = threading.Thread(target=self._collect, name="firewall-worker-events", daemon=True)
+        self._collector.start()
+        self._pusher = threading.Thread(target=self._push_loop, name="firewall-worker-rules", daemon=True)
+        self._pusher.start()
+        self.engine.add_change_listener(self._dirty.set)
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if not self._processes:
+            return
+        self.engine.remove_change_listener(self._dirty.set)
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self._stopping.set()
+        self._dirty.set()
+        self._broadcast(("stop",))
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._events.put(None)
+        if self._collector is not None:
+            self._collector.join()
+        if self._pusher is not None:
+            self._pusher.join()
+        for control in self._controls:
+            control.close()
+        self._processes.clear()
+        self._controls.clear()
+        self._collector = self._pusher = None
+
+    def push_rules(self) -> None:
+        """立即把父进程引擎的当前规则集推送给所有工作进程。"""
+
+        self._broadcast(("rules", self.engine.snapshot()))
+
+    def _broadcast(self, message: tuple) -> None:
+        with self._send_lock:
+            for control in self._controls:
+                try:
+                    control.send(message)
+                except (BrokenPipeError, OSError):
+                    # 工作进程已退出
+                    pass
+
+    def _push_loop(self) -> None:
+        while True:
+            self._dirty.wait()
+            if self._stopping.is_set():
+                return
+            time.sleep(PUSH_DELAY)
+            self._dirty.clear()
+            self.push_rules()
+
+    def _collect(self) -> None:
+        while True:
+            item = self._events.get()
+            if item is None:
+                return
+            kind, worker_id, payload = item
+            if kind == "logs":
+                for row in payload:
+                    self.engine.log_packet(_unpack_record(row))
+                self.log_records += len(payload)
+            elif kind == "stats":
+                self._worker_stats[worker_id] = payload
+
+    def stats(self) -> dict:
+        """各工作进程最近一次上报的计数器及其合计。"""
+
+        workers = dict(self._worker_stats)
+        total: Dict[str, Dict[str, float]] = {}
+        for values in workers.values():
+            for group, counters in values.items():
+                if group == "metrics":
+                    continue
+                merged = total.setdefault(group, {})
+                for name, value in counters.items():
+                    if isinstance(value, (int, float)) and not name.endswith("_rate"):
+                        merged[name] = merged.get(name, 0) + value
+        cache = total.get("cache")
+        if cache is not None:
+            lookups = cache.get("hits", 0) + cache.get("misses", 0)
+            cache["hit_rate"] = cache.get("hits", 0) / lookups if lookups else 0.0
+        return {"workers": workers, "total": total, "log_records": self.log_records}
+
+    def metrics_snapshot(self) -> dict:
+        """各工作进程最近一次上报的指标之和。"""
+
+        return merge_snapshots(values.get("metrics", {}) for values in list(self._worker_stats.values()))
+
@@ -1,8 +1,108 @@
-"""程序入口。"""
+"""程序入口。
+
+不带参数时打开图形界面；``--headless`` 时无界面运行，例如::
+
+    python main.py --headless --rules rules.json --listen-port 9000 --target-port 8000
+"""
 from __future__ import annotations
 
-from firewall.gui import launch_gui
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional
 
+from firewall.proxy import ProxyConfig
+from firewall.upstream import UpstreamTarget
+
+
+def _parse_upstream(value: str) -> UpstreamTarget:
+    """``host:port`` 或 ``host:port:weight``。"""
+
+    parts = value.split(":")
+    try:
+        if len(parts) == 2:
+            return UpstreamTarget(parts[0], int(parts[1]))
+        if len(parts) == 3:
+            return UpstreamTarget(parts[0], int(parts[1]), int(parts[2]))
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"invalid upstream: {value}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="简易防火墙")
+    parser.add_argument("--headless", action="store_true", help="不打开图形界面，直接运行代理")
+    parser.add_argument("--rules", type=Path, help="规则文件（JSON，或安装 PyYAML 后使用 YAML）")
+    parser.add_argument("--default-action", choices=["ALLOW", "DENY"], default="DENY", help="规则文件未指定时的默认动作")
+    parser.add_argument("--listen-host", default="0.0.0.0")
+    parser.add_argument("--listen-port", type=int, default=9000)
+    parser.add_argument("--target-host", default="127.0.0.1")
+    parser.add_argument("--target-port", type=int, default=8000)
+    parser.add_argument(
+        "--upstream", type=_parse_upstream, action="append", default=[], metavar="HOST:PORT[:WEIGHT]",
+        help="TCP 后端目标，可重复指定；未指定时使用 --target-host/--target-port",
+    )
+    parser.add_argument("--no-tcp", action="store_true", help="不转发 TCP")
+    parser.add_argument("--udp", action="store_true", help="同时转发 UDP")
+    parser.add_argument("--tcp-mode", choices=["stream", "buffered"], default="stream")
+    parser.add_argument("--chunk-log", choices=["all", "sample", "flow"], default="all")
+    parser.add_argument("--workers", type=int, default=0, help="工作进程数，0 表示在当前进程中运行")
+    parser.add_argument("--metrics-port", type=int, default=0, help="指标 HTTP 接口端口，0 表示不提供")
+    parser.add_argument("--watch-interval", type=float, default=2.0, help="检查规则文件变化的间隔（秒），0 表示只在 SIGHUP 时重新加载")
+    parser.add_argument("--export-dir", type=Path, help="把日志持续导出为 JSON Lines 分段文件的目录")
+    return parser
+
+
+def run_headless(args: argparse.Namespace) -> int:
+    from firewall.daemon import FirewallDaemon
+    from firewall.engine import FirewallEngine
+    from firewall.export import JsonlExporter
+    from firewall.rules import MatchAction
+
+    config = ProxyConfig(
+        listen_host=args.listen_host,
+        listen_port=args.listen_port,
+        target_host=args.target_host,
+        target_port=args.target_port,
+        enable_tcp=not args.no_tcp,
+        enable_udp=args.udp,
+        tcp_mode=args.tcp_mode,
+        chunk_log=args.chunk_log,
+        upstreams=args.upstream,
+        metrics_port=args.metrics_port,
+    )
+    engine = FirewallEngine(default_action=MatchAction(args.default_action))
+    exporter = None
+    if args.export_dir is not None:
+        exporter = JsonlExporter(args.export_dir)
+        engine.attach_exporter(exporter)
+    daemon = FirewallDaemon(engine, config, args.rules, workers=args.workers, watch_interval=args.watch_interval)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:  # 启动失败时给出简短错误信息
+        logging.getLogger("simple_firewall").error("firewall stopped: %s", exc)
+        return 1
+    finally:
+        if exporter is not None:
+            engine.detach_exporter(exporter)
+        engine.log_pipeline.close()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.headless:
+        return run_headless(args)
+    # 图形界面依赖 Tkinter，只在需要时导入
+    from firewall.gui import launch_gui
 
-if __name__ == "__main__":
     launch_gui()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""连接准入与连接超时测试。"""
+from __future__ import annotations
+
+import asyncio
+import unittest
+from typing import List
+from unittest import mock
+
+from firewall import admission
+from firewall.admission import AdmissionController, ConnectionTimer
+
+
+class AdmissionControllerTest(unittest.TestCase):
+    def test_global_limit(self) -> None:
+        controller = AdmissionController(max_connections=2)
+        self.assertIsNone(controller.admit("10.0.0.1"))
+        self.assertIsNone(controller.admit("10.0.0.2"))
+        self.assertEqual(controller.admit("10.0.0.3"), "global_limit")
+
+        controller.release("10.0.0.1")
+        self.assertIsNone(controller.admit("10.0.0.3"))
+        self.assertEqual(controller.stats()["global_limit"], 1)
+
+    def test_per_ip_limit(self) -> None:
+        controller = AdmissionController(max_per_ip=1)
+        self.assertIsNone(controller.admit("10.0.0.1"))
+        self.assertEqual(controller.admit("10.0.0.1"), "ip_limit")
+        self.assertIsNone(controller.admit("10.0.0.2"))
+        self.assertEqual(controller.stats()["sources"], 2)
+
+        controller.release("10.0.0.1")
+        self.assertEqual(controller.stats()["sources"], 1)
+        self.assertIsNone(controller.admit("10.0.0.1"))
+
+    def test_rate_limit_refills(self) -> None:
+        now = [100.0]
+        with mock.patch.object(admission.time, "monotonic", lambda: now[0]):
+            controller = AdmissionController(rate_per_ip=2, burst_per_ip=3)
+            results = [controller.admit("10.0.0.1") for _ in range(4)]
+            self.assertEqual(results, [None, None, None, "rate_limit"])
+            # 其他源地址有自己的令牌桶
+            self.assertIsNone(controller.admit("10.0.0.2"))
+
+            now[0] += 0.5
+            self.assertIsNone(controller.admit("10.0.0.1"))
+            self.assertEqual(controller.admit("10.0.0.1"), "rate_limit")
+
+    def test_prune_keeps_bucket_table_bounded(self) -> None:
+        controller = AdmissionController(rate_per_ip=1, burst_per_ip=5)
+        controller.PRUNE_THRESHOLD = 10
+        for n in range(50):
+            controller.admit(f"10.0.0.{n}")
+        self.assertLessEqual(len(controller._buckets), 10)
+
+
+class ConnectionTimerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_idle_timeout(self) -> None:
+        reasons: List[str] = []
+        timer = ConnectionTimer(asyncio.get_running_loop(), 0.1, 0, reasons.append)
+        for _ in range(3):
+            await asyncio.sleep(0.05)
+            timer.touch()
+        self.assertEqual(reasons, [])
+
+        await asyncio.sleep(0.2)
+        self.assertEqual(reasons, ["idle timeout"])
+
+    async def test_total_time_limit(self) -> None:
+        reasons: List[str] = []
+        timer = ConnectionTimer(asyncio.get_running_loop(), 0.1, 0.2, reasons.append)
+        for _ in range(6):
+            await asyncio.sleep(0.05)
+            timer.touch()
+        self.assertEqual(reasons, ["connection time limit"])
+
+    async def test_cancel(self) -> None:
+        reasons: List[str] = []
+        timer = ConnectionTimer(asyncio.get_running_loop(), 0.05, 0, reasons.append)
+        timer.cancel()
+        await asyncio.sleep(0.1)
+        self.assertEqual(reasons, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
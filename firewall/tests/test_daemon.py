@@ -0,0 +1,112 @@
+"""无界面运行与规则热加载测试。"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from firewall.daemon import FirewallDaemon, load_rule_file
+from firewall.engine import FirewallEngine
+from firewall.proxy import ProxyConfig
+from firewall.rules import MatchAction
+
+RULES = [{"name": "web", "action": "DENY", "dst_port": "80"}]
+
+
+class DaemonTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = Path(self._tmp.name) / "rules.json"
+        self.engine = FirewallEngine(default_action=MatchAction.ALLOW, log_limit=1)
+        self.engine.logger.setLevel(logging.CRITICAL)
+        self.addCleanup(self.engine.log_pipeline.close)
+
+    def write(self, content: object) -> None:
+        text = content if isinstance(content, str) else json.dumps(content)
+        self.path.write_text(text, encoding="utf-8")
+        # 保证文件状态（mtime, size）与上一次不同
+        stat = self.path.stat()
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def daemon(self, **kwargs: object) -> FirewallDaemon:
+        config = ProxyConfig(listen_host="127.0.0.1", listen_port=0)
+        return FirewallDaemon(self.engine, config, self.path, **kwargs)  # type: ignore[arg-type]
+
+
+class LoadRuleFileTest(DaemonTestCase):
+    def test_list_and_mapping_formats(self) -> None:
+        self.write(RULES)
+        self.assertEqual(load_rule_file(self.path), {"rules": RULES, "whitelist": [], "blacklist": []})
+
+        self.write({"rules": RULES, "blacklist": [{"ip": "10.0.0.0/8"}], "default_action": "DENY"})
+        snapshot = load_rule_file(self.path)
+        self.assertEqual(snapshot["blacklist"], [{"ip": "10.0.0.0/8"}])
+        self.assertEqual(snapshot["default_action"], "DENY")
+
+    def test_invalid_top_level_value(self) -> None:
+        self.write("42")
+        with self.assertRaises(ValueError):
+            load_rule_file(self.path)
+
+
+class ReloadTest(DaemonTestCase):
+    def test_malformed_file_keeps_old_rules(self) -> None:
+        self.write(RULES)
+        daemon = self.daemon()
+        daemon.load_rules()
+        generation = self.engine.generation
+
+        for content in ("[{not json", [{"name": "bad", "action": "MAYBE"}]):
+            with self.subTest(content=content):
+                self.write(content)
+                self.assertFalse(daemon.reload())
+                self.assertEqual([rule.name for rule in self.engine.rules], ["web"])
+        self.assertEqual(self.engine.generation, generation)
+        self.assertEqual((daemon.reloads, daemon.reload_errors), (0, 2))
+
+        self.write(RULES + [{"name": "ssh", "action": "DENY", "dst_port": "22"}])
+        self.assertTrue(daemon.reload())
+        self.assertEqual([rule.name for rule in self.engine.rules], ["web", "ssh"])
+        self.assertEqual(daemon.reloads, 1)
+
+    def test_default_action_falls_back_to_startup_value(self) -> None:
+        self.write({"rules": [], "default_action": "DENY"})
+        daemon = self.daemon()
+        daemon.load_rules()
+        self.assertEqual(self.engine.default_action, MatchAction.DENY)
+
+        self.write([])
+        daemon.reload()
+        self.assertEqual(self.engine.default_action, MatchAction.ALLOW)
+
+
+class WatchTest(DaemonTestCase):
+    def test_changed_file_is_reloaded_while_running(self) -> None:
+        self.write(RULES)
+        daemon = self.daemon(watch_interval=0.05)
+
+        async def scenario() -> None:
+            task = asyncio.create_task(daemon.run())
+            await asyncio.sleep(0.1)
+            self.write("oops")
+            await asyncio.sleep(0.2)
+            self.assertEqual(daemon.reload_errors, 1)
+            self.write([])
+            await asyncio.sleep(0.2)
+            daemon.stop()
+            await asyncio.wait_for(task, 5)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(daemon.reload_errors, 1)
+        self.assertEqual(daemon.reloads, 1)
+        self.assertEqual(self.engine.rules, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""日志 JSON Lines 导出测试。"""
+from __future__ import annotations
+
+import gzip
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from firewall.engine import FirewallEngine, FirewallLogRecord
+from firewall.export import JsonlExporter, list_segments, read_exported_logs
+from firewall.rules import MatchAction, MatchProtocol, PacketInfo
+
+T0 = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def record(seconds: int) -> FirewallLogRecord:
+    packet = PacketInfo(MatchProtocol.TCP, "10.0.0.1", 1000, "10.0.0.2", 80)
+    return FirewallLogRecord(T0 + timedelta(seconds=seconds), packet, MatchAction.ALLOW, "web", f"m{seconds}")
+
+
+class JsonlExporterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp.name)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def messages(self, **kwargs) -> list:
+        return [item["message"] for item in read_exported_logs(self.directory, **kwargs)]
+
+    def test_size_rotation_compresses_segments(self) -> None:
+        exporter = JsonlExporter(self.directory, max_bytes=1)
+        for seconds in range(3):
+            exporter.write_batch([record(seconds)])
+        exporter.close()
+
+        paths = [path for _, path in list_segments(self.directory)]
+        self.assertEqual(len(paths), 3)
+        self.assertTrue(all(path.name.endswith(".jsonl.gz") for path in paths))
+        self.assertEqual(paths[0].name, "firewall-20240601T120000-0000.jsonl.gz")
+        with gzip.open(paths[1], "rt", encoding="utf-8") as f:
+            self.assertIn('"message": "m1"', f.read())
+        self.assertEqual(self.messages(), ["m0", "m1", "m2"])
+
+    def test_time_rotation_without_compression(self) -> None:
+        exporter = JsonlExporter(self.directory, max_seconds=60, compress=False)
+        exporter.write_batch([record(0), record(30)])
+        exporter.write_batch([record(45)])
+        exporter.write_batch([record(90)])
+        exporter.close()
+
+        self.assertEqual([path.suffix for _, path in list_segments(self.directory)], [".jsonl", ".jsonl"])
+        self.assertEqual(exporter.segments, 2)
+        self.assertEqual(exporter.records, 4)
+
+    def test_read_filters_each_record(self) -> None:
+        exporter = JsonlExporter(self.directory, max_seconds=60)
+        # 批次之间可能交错，分段内的记录不保证有序
+        exporter.write_batch([record(0), record(50), record(10)])
+        exporter.write_batch([record(120), record(100)])
+        exporter.close()
+
+        self.assertEqual(self.messages(start=T0 + timedelta(seconds=5), end=T0 + timedelta(seconds=60)), ["m50", "m10"])
+        self.assertEqual(self.messages(start=T0 + timedelta(seconds=110)), ["m120"])
+        self.assertEqual(self.messages(end=T0 + timedelta(seconds=30)), ["m0", "m10"])
+
+    def test_batches_after_close_are_dropped(self) -> None:
+        exporter = JsonlExporter(self.directory, compress=False)
+        exporter.write_batch([record(0)])
+        exporter.close()
+        exporter.write_batch([record(1)])
+
+        self.assertEqual(self.messages(), ["m0"])
+        self.assertEqual(len(list_segments(self.directory)), 1)
+
+    def test_detach_writes_pending_records(self) -> None:
+        engine = FirewallEngine(log_limit=10, metrics=False)
+        engine.log_pipeline.remove_sink(engine._write_log_batch)
+        exporter = JsonlExporter(self.directory)
+        engine.attach_exporter(exporter)
+        for seconds in range(5):
+            engine.log_packet(record(seconds))
+        engine.detach_exporter(exporter)
+        engine.log_packet(record(5))
+        engine.log_pipeline.close()
+
+        self.assertEqual(self.messages(), [f"m{seconds}" for seconds in range(5)])
+        self.assertEqual(list(self.directory.glob("*.jsonl")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
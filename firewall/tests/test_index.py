@@ -0,0 +1,179 @@
+"""规则索引与判决缓存的差分测试。
+
+对随机规则集反复做随机修改（增删规则、清空、名单、默认动作、直接修改规则
+字段、整体恢复快照），每次修改后用同一批流量比较 ``FirewallEngine.evaluate``
+（索引 + 判决缓存）与 ``FirewallEngine.evaluate_linear``（线性扫描）的判决。
+"""
+from __future__ import annotations
+
+import random
+import unittest
+from unittest import mock
+from typing import List, Optional
+
+from firewall import engine as engine_module
+from firewall.engine import FirewallEngine
+from firewall.rules import AddressPattern, FirewallRule, MatchAction, MatchProtocol, PacketInfo
+
+# 含字母转义和内联标志的特征在字节与文本正则中含义不同，必须与线性匹配一致
+_PATTERNS = [None, None, None, "GET", "evil", r"(?u)secret", r"\u0041", r"x\sy", r"\N{LATIN SMALL LETTER E}vil", r"(?i)get"]
+_PAYLOADS = [b"", b"GET / HTTP/1.1", b"some evil payload", b"x\x1cy", b"x y", b"A secret", "caf\u00e9 evil".encode()]
+
+_IPS = ["10.0.0.1", "10.0.1.7", "10.1.2.3", "192.168.1.20", "172.16.5.4", "::1", "fe80::1", "localhost"]
+
+
+def random_ip_condition(rng: random.Random) -> Optional[str]:
+    return rng.choice([
+        None,
+        "*",
+        "10.0.0.0/24",
+        "10.0.0.0/8",
+        f"10.{rng.randrange(3)}.{rng.randrange(3)}.0/24",
+        f"192.168.{rng.randrange(3)}.0/24",
+        rng.choice(_IPS),
+        "::/0",
+        "fe80::/10",
+        "bad/99",
+        "0.0.0.0/0",
+    ])
+
+
+def random_port_condition(rng: random.Random) -> Optional[str]:
+    a, b = sorted((rng.randrange(0, 2000), rng.randrange(0, 2000)))
+    return rng.choice([
+        None,
+        "*",
+        str(rng.randrange(0, 2000)),
+        f"{a}-{b}",
+        f"{rng.randrange(0, 2000)},{a}-{b}",
+        f"{b}-{a}",
+        "x",
+    ])
+
+
+def random_pattern(rng: random.Random) -> AddressPattern:
+    return AddressPattern(random_ip_condition(rng), random_port_condition(rng))
+
+
+def random_rule(rng: random.Random, name: str) -> FirewallRule:
+    return FirewallRule(
+        name=name,
+        action=rng.choice(list(MatchAction)),
+        protocol=rng.choice(list(MatchProtocol)),
+        src_ip=random_ip_condition(rng),
+        src_port=random_port_condition(rng),
+        dst_ip=random_ip_condition(rng),
+        dst_port=random_port_condition(rng),
+        pattern=rng.choice(_PATTERNS),
+    )
+
+
+def random_packets(rng: random.Random, count: int) -> List[PacketInfo]:
+    # 端口范围较小，同一五元组会重复出现，从而命中判决缓存
+    return [
+        PacketInfo(
+            rng.choice([MatchProtocol.TCP, MatchProtocol.UDP, MatchProtocol.ANY]),
+            rng.choice(_IPS),
+            rng.randrange(0, 2000, 97),
+            rng.choice(_IPS),
+            rng.randrange(0, 2000, 97),
+            rng.choice(_PAYLOADS),
+        )
+        for _ in range(count)
+    ]
+
+
+class IndexDifferentialTest(unittest.TestCase):
+    ROUNDS = 30
+    STEPS = 25
+
+    def mutate(self, rng: random.Random, engine: FirewallEngine, serial: int) -> str:
+        """对规则集做一次随机修改，返回操作名。"""
+
+        op = rng.choice([
+            "add_rule", "add_rule", "remove_rule", "edit_rule", "clear_rules", "add_whitelist",
+            "add_blacklist", "clear_whitelist", "clear_blacklist", "set_default_action", "restore",
+        ])
+        if op == "add_rule":
+            index = rng.randrange(len(engine.rules) + 1) if engine.rules and rng.random() < 0.5 else None
+            engine.add_rule(random_rule(rng, f"rule-{serial}"), index)
+        elif op == "remove_rule" and engine.rules:
+            engine.remove_rule(rng.choice(engine.rules).name)
+        elif op == "edit_rule" and engine.rules:
+            # 直接修改规则字段后需手动使索引失效
+            rule = rng.choice(engine.rules)
+            field = rng.choice(["action", "protocol", "src_ip", "src_port", "dst_ip", "dst_port", "pattern"])
+            if field == "action":
+                rule.action = rng.choice(list(MatchAction))
+            elif field == "protocol":
+                rule.protocol = rng.choice(list(MatchProtocol))
+            elif field.endswith("_ip"):
+                setattr(rule, field, random_ip_condition(rng))
+            elif field.endswith("_port"):
+                setattr(rule, field, random_port_condition(rng))
+            else:
+                rule.pattern = rng.choice(_PATTERNS)
+            engine.invalidate_index()
+        elif op == "clear_rules":
+            engine.clear_rules()
+        elif op == "add_whitelist":
+            engine.add_whitelist(random_pattern(rng))
+        elif op == "add_blacklist":
+            engine.add_blacklist(random_pattern(rng))
+        elif op == "clear_whitelist":
+            engine.clear_whitelist()
+        elif op == "clear_blacklist":
+            engine.clear_blacklist()
+        elif op == "set_default_action":
+            engine.set_default_action(rng.choice(list(MatchAction)))
+        elif op == "restore":
+            engine.restore(engine.snapshot())
+        return op
+
+    def assert_same_verdicts(self, engine: FirewallEngine, packets: List[PacketInfo], context: str) -> None:
+        # 每个包判决两次：第一次可能建索引并写缓存，第二次可能命中缓存
+        for packet in packets:
+            expected = engine.evaluate_linear(packet)
+            for attempt in range(2):
+                actual = engine.evaluate(packet)
+                self.assertEqual(actual, expected, f"{context}, attempt {attempt}, packet {packet}")
+
+    def test_indexed_matches_linear_under_mutation(self) -> None:
+        rng = random.Random(20240601)
+        serial = 0
+        for round_no in range(self.ROUNDS):
+            engine = FirewallEngine(log_limit=1, verdict_cache_size=64, metrics=False)
+            for _ in range(rng.randrange(0, 40)):
+                engine.add_rule(random_rule(rng, f"rule-{serial}"))
+                serial += 1
+            packets = random_packets(rng, 60)
+            self.assert_same_verdicts(engine, packets, f"round {round_no} initial")
+            for step in range(self.STEPS):
+                op = self.mutate(rng, engine, serial)
+                serial += 1
+                self.assert_same_verdicts(engine, packets, f"round {round_no} step {step} after {op}")
+            self.assertGreater(engine.verdict_cache.hits, 0)
+
+
+class IndexPublicationTest(unittest.TestCase):
+    def test_index_built_during_a_change_is_not_reused(self) -> None:
+        engine = FirewallEngine(default_action=MatchAction.ALLOW, log_limit=1, metrics=False)
+        packet = PacketInfo(MatchProtocol.TCP, "10.0.0.1", 1000, "10.0.0.2", 80)
+        real_index = engine_module.RuleIndex
+        changed = []
+
+        def build_then_change(*args):
+            index = real_index(*args)
+            if not changed:
+                # 模拟 GUI 线程在索引构建期间添加规则
+                changed.append(True)
+                engine.add_rule(FirewallRule(name="block", action=MatchAction.DENY))
+            return index
+
+        with mock.patch.object(engine_module, "RuleIndex", side_effect=build_then_change):
+            self.assertEqual(engine.evaluate(packet)[0], MatchAction.ALLOW)
+            self.assertEqual(engine.evaluate(packet)[0], MatchAction.DENY)
+
+
+if __name__ == "__main__":
+    unittest.main()
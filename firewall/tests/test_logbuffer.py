@@ -0,0 +1,86 @@
+"""列式日志环形缓冲区测试。"""
+from __future__ import annotations
+
+import unittest
+from datetime import datetime
+
+from firewall.engine import FirewallLogRecord
+from firewall.logbuffer import LogRingBuffer
+from firewall.rules import MatchAction, MatchProtocol, PacketInfo
+
+
+def append(buffer: LogRingBuffer, n: int, src_ip: str = "10.0.0.1", rule: str = "rule", message: str = "") -> None:
+    packet = PacketInfo(MatchProtocol.TCP, src_ip, 1000 + n, "10.0.0.2", 80, b"payload-%d" % n)
+    buffer.append(datetime.fromtimestamp(1_700_000_000 + n), packet, MatchAction.DENY, rule, message or f"m{n}")
+
+
+class LogRingBufferTest(unittest.TestCase):
+    def test_wraparound_keeps_newest_records(self) -> None:
+        buffer = LogRingBuffer(4, FirewallLogRecord, payload_bytes=4)
+        for n in range(10):
+            append(buffer, n)
+
+        self.assertEqual(len(buffer), 4)
+        records = list(buffer)
+        self.assertEqual([record.packet.src_port for record in records], [1006, 1007, 1008, 1009])
+        self.assertEqual([record.message for record in records], ["m6", "m7", "m8", "m9"])
+        self.assertEqual(records[0].packet.payload, b"payl")
+        self.assertEqual(records[0].timestamp, datetime.fromtimestamp(1_700_000_006))
+        with self.assertRaises(IndexError):
+            buffer.record(5)
+
+    def test_view_is_a_snapshot(self) -> None:
+        buffer = LogRingBuffer(4, FirewallLogRecord)
+        for n in range(3):
+            append(buffer, n)
+        view = buffer.view()
+        append(buffer, 3)
+
+        self.assertEqual(len(view), 3)
+        self.assertEqual(view[-1].message, "m2")
+        self.assertEqual([record.message for record in view[1:]], ["m1", "m2"])
+
+    def test_overwritten_strings_are_released(self) -> None:
+        buffer = LogRingBuffer(3, FirewallLogRecord)
+        for n in range(100):
+            # IPv6 地址与规则名、消息一样进入字符串表
+            append(buffer, n, src_ip=f"fe80::{n}", rule="shared")
+
+        # 3 条存活记录：各自的地址和消息，加上共用的规则名
+        self.assertEqual(len(buffer._string_ids), 3 * 2 + 1)
+        self.assertEqual(buffer._string_refs[buffer._string_ids["shared"]], 3)
+        self.assertLessEqual(len(buffer._strings), 3 * 2 + 1 + 2)
+        self.assertEqual([record.packet.src_ip for record in buffer], ["fe80::97", "fe80::98", "fe80::99"])
+
+    def test_string_shared_with_overwritten_record_survives(self) -> None:
+        buffer = LogRingBuffer(2, FirewallLogRecord)
+        append(buffer, 0, message="same")
+        append(buffer, 1, message="same")
+        append(buffer, 2, message="same")
+
+        self.assertEqual(buffer._string_refs[buffer._string_ids["same"]], 2)
+        self.assertEqual([record.message for record in buffer], ["same", "same"])
+
+    def test_slot_being_written_is_not_read(self) -> None:
+        buffer = LogRingBuffer(2, FirewallLogRecord)
+        append(buffer, 0)
+        append(buffer, 1)
+        view = buffer.view()
+        # 模拟写线程正在覆盖序号 0 所在的槽位
+        buffer._seq[0] = -1
+
+        with self.assertRaises(IndexError):
+            view[0]
+        self.assertEqual([record.message for record in view], ["m1"])
+
+    def test_clear(self) -> None:
+        buffer = LogRingBuffer(2, FirewallLogRecord)
+        append(buffer, 0)
+        buffer.clear()
+        self.assertEqual(list(buffer), [])
+        append(buffer, 1)
+        self.assertEqual([record.message for record in buffer], ["m1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
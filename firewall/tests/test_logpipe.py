@@ -0,0 +1,60 @@
+"""日志输出管线测试。"""
+from __future__ import annotations
+
+import unittest
+from typing import Any, List
+
+from firewall.logpipe import LogPipeline
+
+
+class LogPipelineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.batches: List[List[Any]] = []
+        self.pipeline = LogPipeline(capacity=100, batch_size=4, flush_interval=10)
+        self.pipeline.add_sink(self.batches.append)
+
+    def tearDown(self) -> None:
+        self.pipeline.close()
+
+    def test_records_are_written_in_batches(self) -> None:
+        for item in range(10):
+            self.assertTrue(self.pipeline.submit(item))
+        self.pipeline.flush(timeout=5)
+
+        self.assertEqual([item for batch in self.batches for item in batch], list(range(10)))
+        self.assertTrue(all(len(batch) <= 4 for batch in self.batches))
+        self.assertEqual(self.pipeline.stats()["written"], 10)
+
+    def test_full_buffer_drops_new_records(self) -> None:
+        # 未攒满一批且未到刷新间隔，后台线程不会取走缓冲区中的记录
+        pipeline = LogPipeline(capacity=3, batch_size=8, flush_interval=10)
+        pipeline.add_sink(self.batches.append)
+        accepted = [pipeline.submit(item) for item in range(5)]
+        stats = pipeline.stats()
+        pipeline.close()
+
+        self.assertEqual(accepted, [True, True, True, False, False])
+        self.assertEqual((stats["queued"], stats["dropped"]), (3, 2))
+        self.assertEqual(self.batches, [[0, 1, 2]])
+
+    def test_close_writes_remaining_records(self) -> None:
+        self.pipeline.submit("a")
+        self.pipeline.close()
+        self.assertEqual(self.batches, [["a"]])
+        # 关闭后的记录同步写出
+        self.pipeline.submit("b")
+        self.assertEqual(self.batches, [["a"], ["b"]])
+
+    def test_failing_sink_does_not_block_others(self) -> None:
+        def broken(batch: List[Any]) -> None:
+            raise RuntimeError("disk full")
+
+        self.pipeline.add_sink(broken)
+        self.pipeline.submit("a")
+        self.pipeline.flush(timeout=5)
+        self.assertEqual(self.batches, [["a"]])
+        self.assertEqual(self.pipeline.stats()["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""运行指标测试：按规则标识计数、快照合并与 Prometheus 文本输出。"""
+from __future__ import annotations
+
+import json
+import unittest
+import urllib.request
+
+from firewall.engine import FirewallEngine
+from firewall.metrics import MetricsRegistry, MetricsServer, merge_snapshots, render_text, rule_series_id
+from firewall.rules import FirewallRule, MatchAction, MatchProtocol, PacketInfo
+
+
+def packet(dst_port: int) -> PacketInfo:
+    return PacketInfo(MatchProtocol.TCP, "10.0.0.1", 1000, "10.0.0.2", dst_port)
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = FirewallEngine(default_action=MatchAction.ALLOW, log_limit=1, verdict_cache_size=0)
+        self.engine.metrics = MetricsRegistry(latency_sample=1)
+        # 两条规则都使用默认名
+        self.web = FirewallRule("rule", MatchAction.DENY, dst_port="80")
+        self.ssh = FirewallRule("rule", MatchAction.DENY, dst_port="22")
+        self.engine.extend_rules([self.web, self.ssh])
+
+    def snapshot(self) -> dict:
+        for port in (80, 80, 22, 443):
+            self.engine.evaluate(packet(port))
+        return self.engine.metrics_snapshot()
+
+    def test_rules_with_the_same_name_are_separate_series(self) -> None:
+        snapshot = self.snapshot()
+        web, ssh = rule_series_id(self.web), rule_series_id(self.ssh)
+
+        self.assertEqual(snapshot["rule_hits"], {web: 2, ssh: 1, "default": 1})
+        self.assertEqual(snapshot["rule_names"], {web: "rule", ssh: "rule", "default": "default"})
+        self.assertEqual(snapshot["actions"], {"DENY": 3, "ALLOW": 1})
+        self.assertEqual(snapshot["evaluate"]["rules"][web]["count"], 2)
+        self.assertEqual(len(self.engine.metrics.slowest_rules()), 3)
+
+    def test_series_id_is_stable_across_engines(self) -> None:
+        copy = FirewallEngine(log_limit=1)
+        copy.restore(self.engine.snapshot())
+        self.assertEqual([rule_series_id(rule) for rule in copy.rules], [rule_series_id(self.web), rule_series_id(self.ssh)])
+        self.assertNotEqual(rule_series_id(self.web), rule_series_id(self.ssh))
+
+    def test_merge_snapshots_sums_counters_and_keeps_labels(self) -> None:
+        snapshot = self.snapshot()
+        merged = merge_snapshots([snapshot, json.loads(json.dumps(snapshot))])
+        web = rule_series_id(self.web)
+
+        self.assertEqual(merged["rule_hits"][web], 4)
+        self.assertEqual(merged["rule_names"][web], "rule")
+        self.assertEqual(merged["actions"], {"DENY": 6, "ALLOW": 2})
+        histogram = merged["evaluate"]["rules"][web]
+        self.assertEqual(histogram["count"], 4)
+        self.assertEqual(sum(histogram["counts"]), 4)
+        self.assertEqual(histogram["buckets"], snapshot["evaluate"]["rules"][web]["buckets"])
+
+    def test_render_text(self) -> None:
+        snapshot = self.snapshot()
+        snapshot["admission"] = {"active": 3, "ip_limit": 1}
+        text = render_text(snapshot)
+        web = rule_series_id(self.web)
+
+        self.assertIn(f'firewall_rule_hits_total{{rule_id="{web}",rule="rule"}} 2', text)
+        self.assertIn('firewall_rule_hits_total{rule_id="default",rule="default"} 1', text)
+        self.assertIn('firewall_verdicts_total{action="DENY"} 3', text)
+        self.assertIn(f'firewall_evaluate_seconds_bucket{{rule_id="{web}",rule="rule",le="+Inf"}} 2', text)
+        self.assertIn(f'firewall_evaluate_seconds_count{{rule_id="{web}",rule="rule"}} 2', text)
+        self.assertIn("# TYPE firewall_admission_active gauge", text)
+        self.assertIn("firewall_admission_ip_limit 1", text)
+        self.assertNotIn("rule_names", text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        registry = MetricsRegistry(latency_sample=1, buckets=(1e-3, 1e-2))
+        verdict = (MatchAction.DENY, self.web, "rule")
+        for seconds in (1e-4, 5e-3, 5e-3, 1.0):
+            registry.observe_latency(verdict, seconds, cached=False)
+        text = render_text(registry.snapshot())
+        labels = f'rule_id="{rule_series_id(self.web)}",rule="rule"'
+
+        self.assertIn(f'firewall_evaluate_seconds_bucket{{{labels},le="0.001"}} 1', text)
+        self.assertIn(f'firewall_evaluate_seconds_bucket{{{labels},le="0.01"}} 3', text)
+        self.assertIn(f'firewall_evaluate_seconds_bucket{{{labels},le="+Inf"}} 4', text)
+
+    def test_label_values_are_escaped(self) -> None:
+        text = render_text({"rule_hits": {"x": 1}, "rule_names": {"x": 'say "hi"\n'}})
+        self.assertIn('rule="say \\"hi\\"\\n"', text)
+
+
+class MetricsServerTest(unittest.TestCase):
+    def test_endpoints(self) -> None:
+        server = MetricsServer(lambda: {"rule_hits": {"default": 1}}, port=0)
+        server.start()
+        self.addCleanup(server.stop)
+        base = f"http://127.0.0.1:{server.port}"
+
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            self.assertIn('firewall_rule_hits_total{rule_id="default",rule="default"} 1', response.read().decode())
+        with urllib.request.urlopen(f"{base}/metrics.json", timeout=5) as response:
+            self.assertEqual(json.loads(response.read()), {"rule_hits": {"default": 1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
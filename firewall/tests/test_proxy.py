@@ -0,0 +1,77 @@
+"""TCP 转发测试，stream 与 buffered 两种模式行为一致。"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import unittest
+
+from firewall.engine import FirewallEngine
+from firewall.proxy import FirewallService, ProxyConfig
+from firewall.rules import FirewallRule, MatchAction
+
+
+async def echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    while data := await reader.read(65536):
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+
+
+class TCPForwardingTest(unittest.IsolatedAsyncioTestCase):
+    MODE = "stream"
+
+    async def asyncSetUp(self) -> None:
+        self.backend = await asyncio.start_server(echo, "127.0.0.1", 0)
+        self.engine = FirewallEngine(default_action=MatchAction.ALLOW, log_limit=100)
+        self.engine.logger.setLevel(logging.WARNING)
+        self.engine.add_rule(FirewallRule(name="evil", action=MatchAction.DENY, pattern="evil"))
+        config = ProxyConfig(
+            listen_host="127.0.0.1",
+            listen_port=0,
+            target_port=self.backend.sockets[0].getsockname()[1],
+            tcp_mode=self.MODE,
+            read_size=16384,
+        )
+        self.service = FirewallService(self.engine, config, asyncio.get_running_loop())
+        await self.service.start()
+        assert self.service.tcp_server is not None
+        self.port = self.service.tcp_server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self) -> None:
+        await self.service.stop()
+        # 让后端连接先读到 EOF 自行结束
+        await asyncio.sleep(0.05)
+        self.backend.close()
+        await self.backend.wait_closed()
+        self.engine.log_pipeline.close()
+
+    async def test_large_transfer_round_trips(self) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        data = bytes(range(256)) * 4096
+        writer.write(data)
+        await writer.drain()
+        received = await asyncio.wait_for(reader.readexactly(len(data)), 10)
+        writer.close()
+
+        self.assertEqual(received, data)
+        snapshot = self.engine.metrics_snapshot()
+        self.assertEqual(snapshot["bytes"]["tcp"]["client_to_server"], len(data))
+
+    async def test_denied_payload_closes_connection(self) -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"hello ")
+        self.assertEqual(await asyncio.wait_for(reader.readexactly(6), 5), b"hello ")
+        writer.write(b"something evil")
+        self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+        writer.close()
+
+        self.engine.flush_logs()
+        self.assertIn("evil", [record.rule_name for record in self.engine.recent_logs()])
+
+
+class BufferedTCPForwardingTest(TCPForwardingTest):
+    MODE = "buffered"
+
+
+if __name__ == "__main__":
+    unittest.main()
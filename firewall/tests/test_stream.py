@@ -0,0 +1,56 @@
+"""TCP 流内容检测测试。"""
+from __future__ import annotations
+
+import unittest
+
+from firewall.engine import FirewallEngine
+from firewall.rules import FirewallRule, MatchAction, MatchProtocol, PacketInfo
+from firewall.stream import StreamInspector
+
+
+class StreamInspectorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = FirewallEngine(default_action=MatchAction.ALLOW, log_limit=1, metrics=False)
+        self.engine.add_rule(FirewallRule(name="attack", action=MatchAction.DENY, pattern="attack"))
+
+    def verdicts(self, inspector: StreamInspector, chunks: list) -> list:
+        return [
+            self.engine.evaluate(
+                PacketInfo(MatchProtocol.TCP, "10.0.0.1", 1000, "10.0.0.2", 80, inspector.window(chunk))
+            )[0]
+            for chunk in chunks
+        ]
+
+    def test_pattern_split_across_chunks_is_detected(self) -> None:
+        chunks = [b"GET /?q=att", b"ack HTTP/1.1"]
+        self.assertEqual(self.verdicts(StreamInspector(), chunks), [MatchAction.ALLOW, MatchAction.ALLOW])
+        self.assertEqual(
+            self.verdicts(StreamInspector(overlap=len("attack") - 1), chunks),
+            [MatchAction.ALLOW, MatchAction.DENY],
+        )
+
+    def test_every_split_point_is_covered(self) -> None:
+        data = b"xxxxattackxxxx"
+        for cut in range(1, len(data)):
+            with self.subTest(cut=cut):
+                verdicts = self.verdicts(StreamInspector(overlap=5), [data[:cut], data[cut:]])
+                self.assertIn(MatchAction.DENY, verdicts)
+
+    def test_window_keeps_only_overlap_bytes(self) -> None:
+        inspector = StreamInspector(overlap=3)
+        self.assertEqual(inspector.window(b"abcdef"), b"abcdef")
+        self.assertEqual(inspector.window(b"gh"), b"defgh")
+        self.assertEqual(inspector.window(b"i"), b"fghi")
+
+    def test_fast_path_after_inspect_limit(self) -> None:
+        inspector = StreamInspector(overlap=3, inspect_limit=8)
+        inspector.window(b"hello")
+        self.assertFalse(inspector.fast_path)
+        inspector.window(b"world")
+        self.assertTrue(inspector.fast_path)
+        # 进入快速通道后不再保留重叠部分
+        self.assertEqual(inspector.window(b"!"), b"!")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""UDP 会话表测试。"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import unittest
+from dataclasses import replace
+from typing import List
+
+from firewall.engine import FirewallEngine
+from firewall.proxy import FirewallService, ProxyConfig
+from firewall.rules import MatchAction
+
+
+class Echo(asyncio.DatagramProtocol):
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        self.transport.sendto(b"re:" + data, addr)  # type: ignore[attr-defined]
+
+
+class Client(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        self.received: List[bytes] = []
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        self.received.append(data)
+
+
+class UDPSessionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.backend, _ = await loop.create_datagram_endpoint(Echo, local_addr=("127.0.0.1", 0))
+        self.engine = FirewallEngine(default_action=MatchAction.ALLOW, log_limit=100)
+        self.engine.logger.setLevel(logging.WARNING)
+        config = ProxyConfig(
+            listen_host="127.0.0.1",
+            listen_port=0,
+            target_port=self.backend.get_extra_info("sockname")[1],
+            enable_tcp=False,
+            enable_udp=True,
+            udp_max_sessions=2,
+            udp_session_timeout=60,
+        )
+        self.service = FirewallService(self.engine, config, loop)
+        await self.service.start()
+        assert self.service._udp_transport is not None and self.service._udp_protocol is not None
+        self.protocol = self.service._udp_protocol
+        self.address = self.service._udp_transport.get_extra_info("sockname")
+        self.clients: List[asyncio.DatagramTransport] = []
+
+    async def asyncTearDown(self) -> None:
+        for transport in self.clients:
+            transport.close()
+        await self.service.stop()
+        self.backend.close()
+        self.engine.log_pipeline.close()
+
+    async def client(self) -> Client:
+        transport, protocol = await asyncio.get_running_loop().create_datagram_endpoint(
+            Client, remote_addr=self.address
+        )
+        self.clients.append(transport)
+        return protocol
+
+    async def settle(self) -> None:
+        await asyncio.sleep(0.1)
+
+    async def test_replies_go_back_to_their_client(self) -> None:
+        first, second = await self.client(), await self.client()
+        self.clients[0].sendto(b"a1")
+        self.clients[1].sendto(b"b1")
+        self.clients[0].sendto(b"a2")
+        await self.settle()
+
+        self.assertEqual(first.received, [b"re:a1", b"re:a2"])
+        self.assertEqual(second.received, [b"re:b1"])
+        self.assertEqual(self.service.udp_stats()["sessions"], 2)
+        self.assertEqual(sorted(s["packets_out"] for s in self.service.udp_sessions()), [1, 2])
+
+    async def test_least_recently_active_session_is_evicted(self) -> None:
+        clients = [await self.client() for _ in range(3)]
+        self.clients[0].sendto(b"a")
+        self.clients[1].sendto(b"b")
+        await self.settle()
+        # 客户端 0 再次活动后，客户端 1 成为最久未活动的会话
+        self.clients[0].sendto(b"a")
+        await self.settle()
+        self.clients[2].sendto(b"c")
+        await self.settle()
+
+        stats = self.service.udp_stats()
+        self.assertEqual((stats["sessions"], stats["evicted"]), (2, 1))
+        remaining = {session["client"] for session in self.service.udp_sessions()}
+        self.assertNotIn("%s:%s" % self.clients[1].get_extra_info("sockname")[:2], remaining)
+        self.assertEqual(clients[2].received, [b"re:c"])
+
+    async def test_idle_sessions_expire(self) -> None:
+        await self.client()
+        self.clients[0].sendto(b"a")
+        await self.settle()
+        self.protocol.config = replace(self.protocol.config, udp_session_timeout=0.05)
+        await asyncio.sleep(0.1)
+        self.protocol.expire_idle()
+
+        self.assertEqual(self.service.udp_stats()["expired"], 1)
+        self.assertEqual(self.service.udp_sessions(), [])
+        self.engine.flush_logs()
+        self.assertTrue(any("udp session expired" in record.message for record in self.engine.recent_logs()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""后端连接池测试：最少连接分配、故障切换与冷却。"""
+from __future__ import annotations
+
+import asyncio
+import unittest
+from typing import Any, List, Set
+
+from firewall.upstream import UpstreamPool, UpstreamTarget
+
+
+class FakeBackends:
+    """按端口模拟后端，``down`` 中的端口连接失败。"""
+
+    def __init__(self) -> None:
+        self.down: Set[int] = set()
+        self.attempts: List[int] = []
+        self.closed: List[Any] = []
+
+    async def connect(self, family: int, sockaddr: tuple) -> Any:
+        port = sockaddr[1]
+        self.attempts.append(port)
+        if port in self.down:
+            raise ConnectionRefusedError(f"port {port} refused")
+        return ("conn", port, len(self.attempts))
+
+    def alive(self, conn: Any) -> bool:
+        return conn not in self.closed
+
+    def close(self, conn: Any) -> None:
+        self.closed.append(conn)
+
+
+class UpstreamPoolTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.backends = FakeBackends()
+
+    def pool(self, *targets: UpstreamTarget, **kwargs: Any) -> UpstreamPool:
+        pool = UpstreamPool(list(targets), self.backends.connect, self.backends.alive, self.backends.close, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    async def test_least_connections_by_weight(self) -> None:
+        pool = self.pool(UpstreamTarget("127.0.0.1", 1, 1), UpstreamTarget("127.0.0.1", 2, 2))
+        chosen = [(await pool.acquire())[0] for _ in range(3)]
+        self.assertEqual([state.target.port for state in chosen], [2, 1, 2])
+        self.assertEqual([s["active"] for s in pool.stats()], [1, 2])
+
+        pool.release(chosen[1])
+        state, _ = await pool.acquire()
+        self.assertEqual(state.target.port, 1)
+
+    async def test_failover_to_next_target(self) -> None:
+        self.backends.down.add(1)
+        pool = self.pool(UpstreamTarget("127.0.0.1", 1), UpstreamTarget("127.0.0.1", 2))
+        state, conn = await pool.acquire()
+
+        self.assertEqual(conn[1], 2)
+        self.assertEqual(self.backends.attempts, [1, 2])
+        stats = pool.stats()
+        self.assertEqual((stats[0]["active"], stats[0]["failures"], stats[0]["errors"]), (0, 1, 1))
+
+    async def test_all_targets_failing_raises(self) -> None:
+        self.backends.down.update({1, 2})
+        pool = self.pool(UpstreamTarget("127.0.0.1", 1), UpstreamTarget("127.0.0.1", 2))
+        with self.assertRaises(OSError):
+            await pool.acquire()
+        self.assertEqual([s["active"] for s in pool.stats()], [0, 0])
+
+    async def test_failing_target_cools_down(self) -> None:
+        self.backends.down.add(1)
+        pool = self.pool(
+            UpstreamTarget("127.0.0.1", 1), UpstreamTarget("127.0.0.1", 2), fail_threshold=2, cooldown=0.1,
+        )
+        for _ in range(2):
+            state, _ = await pool.acquire()
+            pool.release(state)
+        self.assertFalse(pool.stats()[0]["healthy"])
+
+        self.backends.attempts.clear()
+        state, _ = await pool.acquire()
+        pool.release(state)
+        # 冷却期间不再尝试故障目标
+        self.assertEqual(self.backends.attempts, [2])
+
+        self.backends.down.clear()
+        await asyncio.sleep(0.15)
+        state, _ = await pool.acquire()
+        self.assertEqual(state.target.port, 1)
+        self.assertTrue(pool.stats()[0]["healthy"])
+        self.assertEqual(pool.stats()[0]["failures"], 0)
+
+    async def test_prewarmed_connections_are_used(self) -> None:
+        pool = self.pool(UpstreamTarget("127.0.0.1", 1), prewarm=2)
+        pool.start()
+        await asyncio.sleep(0.05)
+        self.assertEqual(pool.stats()[0]["idle"], 2)
+
+        _, conn = await pool.acquire()
+        self.assertEqual(conn, ("conn", 1, 1))
+        # 取走后补足预建连接
+        await asyncio.sleep(0.05)
+        self.assertEqual(pool.stats()[0]["idle"], 2)
+
+    async def test_dead_prewarmed_connection_is_replaced(self) -> None:
+        pool = self.pool(UpstreamTarget("127.0.0.1", 1), prewarm=1)
+        pool.start()
+        await asyncio.sleep(0.05)
+        stale = pool.states[0].idle[0][1]
+        self.backends.closed.append(stale)
+
+        _, conn = await pool.acquire()
+        self.assertNotEqual(conn, stale)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""判决缓存测试。"""
+from __future__ import annotations
+
+import unittest
+
+from firewall.engine import FirewallEngine
+from firewall.rules import FirewallRule, MatchAction, MatchProtocol, PacketInfo
+from firewall.verdict import VerdictCache
+
+
+def packet(src_port: int = 1000, payload: bytes = b"") -> PacketInfo:
+    return PacketInfo(MatchProtocol.TCP, "10.0.0.1", src_port, "10.0.0.2", 80, payload)
+
+
+class VerdictCacheTest(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self) -> None:
+        cache = VerdictCache(maxsize=2)
+        verdict = (MatchAction.ALLOW, None, "default")
+        keys = [VerdictCache.key(packet(port)) for port in (1, 2, 3)]
+        cache.put(keys[0], verdict, 0)
+        cache.put(keys[1], verdict, 0)
+        self.assertIsNotNone(cache.get(keys[0], 0))
+        cache.put(keys[2], verdict, 0)
+
+        self.assertIsNone(cache.get(keys[1], 0))
+        self.assertIsNotNone(cache.get(keys[0], 0))
+        self.assertIsNotNone(cache.get(keys[2], 0))
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_generation_change_clears_entries(self) -> None:
+        cache = VerdictCache()
+        key = VerdictCache.key(packet())
+        cache.put(key, (MatchAction.DENY, None, "blacklist"), 0)
+
+        self.assertIsNone(cache.get(key, 1))
+        # 旧代数的结果不再写入
+        cache.put(key, (MatchAction.DENY, None, "blacklist"), 0)
+        self.assertIsNone(cache.get(key, 1))
+
+    def test_zero_size_disables_cache(self) -> None:
+        cache = VerdictCache(maxsize=0)
+        key = VerdictCache.key(packet())
+        cache.put(key, (MatchAction.ALLOW, None, "default"), 0)
+        self.assertIsNone(cache.get(key, 0))
+
+
+class EngineCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = FirewallEngine(default_action=MatchAction.ALLOW, log_limit=1, metrics=False)
+
+    def test_repeated_flow_hits_cache(self) -> None:
+        self.engine.add_rule(FirewallRule(name="web", action=MatchAction.DENY, dst_port="80"))
+        for _ in range(3):
+            self.assertEqual(self.engine.evaluate(packet())[0], MatchAction.DENY)
+        self.assertEqual(self.engine.cache_stats()["hits"], 2)
+
+    def test_payload_dependent_verdict_is_not_cached(self) -> None:
+        self.engine.add_rule(FirewallRule(name="evil", action=MatchAction.DENY, pattern="evil"))
+
+        self.assertEqual(self.engine.evaluate(packet(payload=b"evil"))[0], MatchAction.DENY)
+        self.assertEqual(self.engine.evaluate(packet(payload=b"fine"))[0], MatchAction.ALLOW)
+        self.assertEqual(self.engine.evaluate(packet(payload=b"evil"))[0], MatchAction.DENY)
+
+    def test_rule_change_invalidates_cached_verdict(self) -> None:
+        self.assertEqual(self.engine.evaluate(packet())[0], MatchAction.ALLOW)
+        self.engine.add_rule(FirewallRule(name="web", action=MatchAction.DENY, dst_port="80"))
+        self.assertEqual(self.engine.evaluate(packet())[0], MatchAction.DENY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""多进程运行测试：规则变化推送到工作进程，日志与指标汇总到父进程。"""
+from __future__ import annotations
+
+import logging
+import socket
+import threading
+import time
+import unittest
+from typing import Callable
+
+from firewall.engine import FirewallEngine
+from firewall.proxy import ProxyConfig
+from firewall.rules import FirewallRule, MatchAction, MatchProtocol
+from firewall.workers import WorkerPool
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 15.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.backend = socket.create_server(("127.0.0.1", 0))
+        threading.Thread(target=self._serve, daemon=True).start()
+        self.engine = FirewallEngine(default_action=MatchAction.ALLOW, log_limit=100)
+        self.engine.logger.setLevel(logging.WARNING)
+        self.port = free_port()
+        config = ProxyConfig(
+            listen_host="127.0.0.1",
+            listen_port=self.port,
+            target_port=self.backend.getsockname()[1],
+        )
+        self.pool = WorkerPool(self.engine, config, workers=2)
+        self.pool.start()
+
+    def tearDown(self) -> None:
+        self.pool.stop()
+        self.backend.close()
+        self.engine.log_pipeline.close()
+
+    def _serve(self) -> None:
+        def echo(conn: socket.socket) -> None:
+            with conn:
+                while data := conn.recv(4096):
+                    conn.sendall(data)
+
+        while True:
+            try:
+                conn, _ = self.backend.accept()
+            except OSError:
+                return
+            threading.Thread(target=echo, args=(conn,), daemon=True).start()
+
+    def request(self, data: bytes) -> bytes:
+        try:
+            with socket.create_connection(("127.0.0.1", self.port), timeout=2) as conn:
+                conn.sendall(data)
+                return conn.recv(4096)
+        except OSError:
+            return b""
+
+    def test_rule_changes_reach_workers(self) -> None:
+        self.assertTrue(wait_until(lambda: self.request(b"hello") == b"hello"), "workers did not start")
+
+        self.engine.add_rule(FirewallRule("no-evil", MatchAction.DENY, MatchProtocol.TCP, pattern="evil"))
+        self.assertTrue(wait_until(lambda: self.request(b"evil") == b""), "rule was not pushed")
+        # 不含特征的数据仍然放行
+        self.assertEqual(self.request(b"fine"), b"fine")
+
+        self.assertTrue(wait_until(lambda: "no-evil" in {r.rule_name for r in self.engine.recent_logs()}))
+        # 各工作进程的指标合并后按规则标识汇总
+        self.assertTrue(wait_until(lambda: "no-evil" in self.pool.metrics_snapshot().get("rule_names", {}).values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
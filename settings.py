@@ -59,6 +59,62 @@ CHANNEL_LAYERS = {
     }
 }
 
+# 聊天消息持久化：
+#   "sync"    每条消息单独写入数据库（默认）
+#   "batched" 消息进入队列，累计 BATCH_SIZE 条或等待 FLUSH_INTERVAL 秒后批量写入；
+#             队列最多 MAX_QUEUE 条（0 表示不限制），满时发送方等待写入腾出空间
+CHAT_MESSAGE_PERSISTENCE = {
+    "MODE": "sync",
+    "BATCH_SIZE": 100,
+    "FLUSH_INTERVAL": 0.5,
+    "MAX_QUEUE": 10000,
+}
+
+# WebSocket 热路径日志：LEVEL 为 chat.ws 日志级别（逐条消息事件为 DEBUG），
+# SAMPLE_RATE 为逐条消息事件的采样比例
+CHAT_WS_LOGGING = {
+    "LEVEL": "INFO",
+    "SAMPLE_RATE": 0.01,
+}
+
+# WebSocket 帧的 JSON 后端："auto"（已安装 orjson 时使用）、"json" 或 "orjson"
+CHAT_JSON_BACKEND = "auto"
+
+# 聊天室在线状态："auto" 在 Channel Layer 为 Redis 时使用 Redis，否则使用进程内存储；
+# TTL 为最后一次心跳后的存活时间，HEARTBEAT_INTERVAL 为客户端心跳间隔（秒）
+CHAT_PRESENCE = {
+    "BACKEND": "auto",
+    "TTL": 90,
+    "HEARTBEAT_INTERVAL": 30,
+}
+
+# 聊天室列表：每页数量与分页缓存时间（秒），统计变化时缓存按版本号失效
+CHAT_ROOM_INDEX = {
+    "PER_PAGE": 20,
+    "CACHE_TIMEOUT": 300,
+}
+
+# WebSocket 入站限流与出站背压：
+#   MAX_MESSAGE_BYTES           单条入站消息的最大字节数
+#   CONNECTION_RATE/BURST       每个连接的令牌桶（每秒令牌数/突发上限）
+#   USER_RATE/BURST             每个用户的令牌桶（同一进程内跨连接）
+#   OUTBOUND_QUEUE_LIMIT        每个连接待发送帧的上限
+#   OUTBOUND_MAX_BYTES          每个连接待发送数据的上限，超过时丢弃最旧帧
+#   OUTBOUND_RATE/BURST         每个连接的发送速率（每秒字节数/突发上限），0 表示不限速
+#   OUTBOUND_POLICY             超过上限时 "drop" 丢弃最旧帧，"coalesce" 合并为 batch 帧
+CHAT_RATE_LIMIT = {
+    "MAX_MESSAGE_BYTES": 4096,
+    "CONNECTION_RATE": 5,
+    "CONNECTION_BURST": 10,
+    "USER_RATE": 10,
+    "USER_BURST": 20,
+    "OUTBOUND_QUEUE_LIMIT": 100,
+    "OUTBOUND_MAX_BYTES": 1024 * 1024,
+    "OUTBOUND_RATE": 256 * 1024,
+    "OUTBOUND_BURST": 512 * 1024,
+    "OUTBOUND_POLICY": "drop",
+}
+
 DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3",
                          "NAME": BASE_DIR / "db.sqlite3"}}
 
@@ -99,4 +155,8 @@ LOGGING = {
             'propagate': False,
         },
     },
-} 
\ No newline at end of file
+} 
+
+
+# 项目根目录带有 __init__.py，测试发现需从项目目录开始
+TEST_RUNNER = "chat.testrunner.ProjectTestRunner"